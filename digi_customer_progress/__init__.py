@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from . import controllers
 from . import models
 from . import reports
 from . import wizard
\ No newline at end of file
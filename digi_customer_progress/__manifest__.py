@@ -44,7 +44,10 @@
         'data/visa_types.xml',
         'data/job_categories.xml',
         'data/customer_tags.xml',
+        'data/visa_document_types.xml',
         'data/sequences.xml',
+        'data/progress_scoring.xml',
+        'data/dataset_generator.xml',
         
         # Views
         'views/customer_record_views.xml',
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from odoo import http
+from odoo.http import request
+from odoo.tools import date_utils
+
+
+class DashboardController(http.Controller):
+
+    @http.route('/digi_customer_progress/dashboard/data', type='http', auth='user', methods=['GET'])
+    def dashboard_data(self, **kwargs):
+        """Every dashboard dataset in one JSON response, revalidated by ETag"""
+        Dashboard = request.env['digi.dashboard']
+        etag = Dashboard.get_etag()
+        headers = [('ETag', '"%s"' % etag), ('Cache-Control', 'private, no-cache')]
+        if request.httprequest.if_none_match.contains(etag):
+            return http.Response(status=304, headers=headers)
+        payload = json.dumps(Dashboard.get_data(), default=date_utils.json_default)
+        return request.make_response(payload, headers=headers + [('Content-Type', 'application/json')])
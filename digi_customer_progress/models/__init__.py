@@ -1,9 +1,33 @@
 # -*- coding: utf-8 -*-
 
+from . import attachment_mixin
+from . import timeline_mixin
+from . import report_cache
+from . import bulk_tracking
+from . import dashboard
+from . import ir_attachment
+from . import ir_actions_report
+from . import date_refresh
+from . import progress_scoring
+from . import code_allocator
 from . import visa_type
+from . import visa_type_stat
+from . import visa_document_type
 from . import customer_tag
 from . import job_category
+from . import job_category_analytics
 from . import customer_record
+from . import customer_access
+from . import hr_employee
 from . import training_progress
 from . import english_training
-from . import visa_process
\ No newline at end of file
+from . import visa_process
+from . import visa_step_forecast
+from . import expiry_calendar
+from . import notification
+from . import customer_import
+from . import report_batch
+from . import dashboard_kpi
+from . import progress_snapshot
+from . import query_plan_check
+from . import dataset_generator
\ No newline at end of file
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class AttachmentMixin(models.AbstractModel):
+    _name = 'digi.attachment.mixin'
+    _description = 'Đếm Tài Liệu Đính Kèm'
+
+    attachment_count = fields.Integer(string='Số Tài Liệu', compute='_compute_attachment_count')
+
+    def _get_attachment_counts(self):
+        """Return {res_id: count} for the whole recordset in one grouped query"""
+        ids = [record_id for record_id in self.ids if isinstance(record_id, int)]
+        if not ids:
+            return {}
+        self.env['ir.attachment'].flush(['res_model', 'res_id', 'res_field'])
+        self.env.cr.execute("""
+            SELECT res_id, COUNT(*)
+              FROM ir_attachment
+             WHERE res_model = %s
+               AND res_id IN %s
+               AND res_field IS NULL
+          GROUP BY res_id
+        """, (self._name, tuple(ids)))
+        return dict(self.env.cr.fetchall())
+
+    def _compute_attachment_count(self):
+        counts = self._get_attachment_counts()
+        for record in self:
+            record.attachment_count = counts.get(record.id, 0)
+
+
+class AttachmentCounterMixin(models.AbstractModel):
+    _name = 'digi.attachment.counter.mixin'
+    _inherit = 'digi.attachment.mixin'
+    _description = 'Bộ Đếm Tài Liệu Lưu Trữ'
+
+    # Kept up to date by ir.attachment create/write/unlink, so list and
+    # kanban views read a plain column instead of counting on every page.
+    attachment_stored_count = fields.Integer(string='Số Tài Liệu (Lưu)', default=0, readonly=True, copy=False)
+
+    def init(self):
+        if self._abstract:
+            return
+        self._attachment_counter_resync()
+
+    def _compute_attachment_count(self):
+        for record in self:
+            record.attachment_count = record.attachment_stored_count
+
+    @api.model
+    def _attachment_counter_adjust(self, deltas):
+        """Apply {res_id: delta} to the stored counter with one UPDATE per delta"""
+        by_delta = {}
+        for res_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(res_id)
+        if not by_delta:
+            return
+        for delta, res_ids in by_delta.items():
+            self.env.cr.execute(
+                f'UPDATE "{self._table}" SET attachment_stored_count = '
+                f'GREATEST(COALESCE(attachment_stored_count, 0) + %s, 0) WHERE id IN %s',
+                (delta, tuple(res_ids))
+            )
+        self.invalidate_cache(['attachment_stored_count', 'attachment_count'])
+
+    @api.model
+    def _attachment_counter_resync(self):
+        """Rebuild the stored counter from ir_attachment for every row"""
+        self.env.cr.execute(f"""
+            UPDATE "{self._table}" AS rec
+               SET attachment_stored_count = COALESCE(cnt.total, 0)
+              FROM "{self._table}" AS src
+         LEFT JOIN (
+                SELECT res_id, COUNT(*) AS total
+                  FROM ir_attachment
+                 WHERE res_model = %s AND res_field IS NULL
+              GROUP BY res_id
+              ) AS cnt ON cnt.res_id = src.id
+             WHERE rec.id = src.id
+               AND rec.attachment_stored_count IS DISTINCT FROM COALESCE(cnt.total, 0)
+        """, (self._name,))
+        self.invalidate_cache(['attachment_stored_count', 'attachment_count'])
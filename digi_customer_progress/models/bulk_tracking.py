@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+from collections import defaultdict
+
+from markupsafe import Markup
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 20
+DEFAULT_COMPACT_AFTER_DAYS = 180
+COMPACT_BATCH_SIZE = 5000
+TRACKED_MODELS = ['digi.customer.record', 'digi.training.progress', 'digi.english.training',
+                  'digi.english.test.score', 'digi.visa.process']
+
+# Display value of a tracking row, whatever its column type
+TRACKING_VALUE_SQL = """
+    COALESCE(t.{side}_value_char, t.{side}_value_text, t.{side}_value_datetime::date::text,
+             NULLIF(t.{side}_value_float, 0)::text, NULLIF(t.{side}_value_monetary, 0)::text,
+             NULLIF(t.{side}_value_integer, 0)::text, '')
+"""
+
+
+class BulkTrackingMixin(models.AbstractModel):
+    """Coalesce the chatter tracking of bulk writes.
+
+    With ``digi_bulk_tracking='summary'`` in the context, or when one write
+    touches more records than the ``bulk_tracking_threshold`` parameter, the
+    tracked changes of the customers and of their children are collected
+    and posted at commit as one note per customer. With ``'skip'`` they are
+    not tracked at all and the batch leaves one ``digi.bulk.audit`` row per
+    model, labelled with ``digi_bulk_label``.
+    """
+    _name = 'digi.bulk.tracking.mixin'
+    _description = 'Gộp Theo Dõi Thay Đổi Hàng Loạt'
+
+    # Field pointing to the customer; False on the customer model itself
+    _bulk_tracking_customer_field = 'customer_id'
+
+    def _bulk_tracking_mode(self):
+        mode = self.env.context.get('digi_bulk_tracking')
+        if mode or self.env.context.get('tracking_disable') or self.env.context.get('mail_notrack'):
+            return mode
+        threshold = self.env['ir.config_parameter'].sudo().get_param('digi_customer_progress.bulk_tracking_threshold')
+        return 'summary' if len(self) > int(threshold or DEFAULT_THRESHOLD) else False
+
+    def _bulk_tracking_customer(self, record):
+        return record if not self._bulk_tracking_customer_field else record[self._bulk_tracking_customer_field]
+
+    def _bulk_tracking_data(self, key):
+        """Per-transaction buffer, flushed by one precommit hook"""
+        data = self.env.cr.precommit.data
+        if key not in data:
+            data[key] = defaultdict(list) if key == 'digi.bulk.summary' else defaultdict(lambda: [set(), set()])
+            flush = self._bulk_tracking_post_summaries if key == 'digi.bulk.summary' else self._bulk_tracking_audit
+            env = self.env
+            self.env.cr.precommit.add(lambda: flush(env, data.pop(key)))
+        return data[key]
+
+    def write(self, vals):
+        mode = self._bulk_tracking_mode()
+        tracked = mode and (self._get_tracked_fields() or set()) & set(vals)
+        if not tracked:
+            return super(BulkTrackingMixin, self).write(vals)
+        if mode == 'summary':
+            before = {record.id: {name: record[name] for name in tracked} for record in self}
+        # mail_notrack only drops the tracking values: followers are still auto-subscribed
+        result = super(BulkTrackingMixin, self.with_context(mail_notrack=True)).write(vals)
+        if mode == 'summary':
+            summary = self._bulk_tracking_data('digi.bulk.summary')
+            for record in self:
+                for name in sorted(tracked):
+                    field = self._fields[name]
+                    old = field.convert_to_export(before[record.id][name], record)
+                    new = field.convert_to_export(record[name], record)
+                    if old != new:
+                        summary[self._bulk_tracking_customer(record).id].append(
+                            (record.display_name, field.string, str(old or ''), str(new or '')))
+        else:
+            audit = self._bulk_tracking_data('digi.bulk.audit')
+            ids, names = audit[(self.env.context.get('digi_bulk_label') or '', self._name)]
+            ids.update(self.ids)
+            names.update(tracked)
+        return result
+
+    @api.model
+    def _bulk_tracking_post_summaries(self, env, summary):
+        customers = env['digi.customer.record'].with_context(digi_bulk_tracking=False).browse(list(summary))
+        for customer in customers.exists():
+            lines = Markup('').join(
+                Markup('<li>%s - %s: %s &#8594; %s</li>') % (label, field, old, new)
+                for label, field, old, new in summary[customer.id])
+            customer.message_post(body=Markup('<p>%s</p><ul>%s</ul>') % (_('Cập nhật hàng loạt'), lines),
+                                  subtype_xmlid='mail.mt_note')
+
+    @api.model
+    def _bulk_tracking_audit(self, env, audit):
+        env['digi.bulk.audit'].sudo().create([{
+            'name': label or _('Thao tác hàng loạt'),
+            'model': model,
+            'record_count': len(ids),
+            'field_names': ', '.join(sorted(names)),
+            'record_ids': ','.join(str(record_id) for record_id in sorted(ids)),
+        } for (label, model), (ids, names) in audit.items()])
+
+
+class BulkAudit(models.Model):
+    _name = 'digi.bulk.audit'
+    _description = 'Nhật Ký Thao Tác Hàng Loạt'
+    _order = 'create_date desc'
+
+    name = fields.Char(string='Thao Tác', required=True, readonly=True)
+    model = fields.Char(string='Mô Hình', required=True, readonly=True)
+    record_count = fields.Integer(string='Số Bản Ghi', readonly=True)
+    field_names = fields.Char(string='Trường Thay Đổi', readonly=True)
+    record_ids = fields.Text(string='Mã Bản Ghi', readonly=True)
+
+
+class TrackingCompactor(models.AbstractModel):
+    _name = 'digi.tracking.compactor'
+    _description = 'Nén Lịch Sử Theo Dõi'
+
+    @api.model
+    def _commit(self):
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.model
+    def _compact_batch(self, cutoff):
+        """Fold the old pure-tracking messages of up to COMPACT_BATCH_SIZE records; return the records done"""
+        self.env['mail.message'].flush()
+        self.env.cr.execute("""
+            SELECT model, res_id
+              FROM mail_message m
+             WHERE m.model IN %s AND m.date < %s AND m.message_type = 'notification'
+               AND COALESCE(m.body, '') = ''
+               AND EXISTS (SELECT 1 FROM mail_tracking_value t WHERE t.mail_message_id = m.id)
+          GROUP BY model, res_id
+             LIMIT %s
+        """, (tuple(TRACKED_MODELS), cutoff, COMPACT_BATCH_SIZE))
+        records = self.env.cr.fetchall()
+        if not records:
+            return 0
+        self.env.cr.execute(f"""
+            SELECT m.model, m.res_id, m.id, m.date, t.field_desc,
+                   {TRACKING_VALUE_SQL.format(side='old')}, {TRACKING_VALUE_SQL.format(side='new')}
+              FROM mail_message m
+              JOIN mail_tracking_value t ON t.mail_message_id = m.id
+             WHERE (m.model, m.res_id) IN %s AND m.date < %s AND m.message_type = 'notification'
+               AND COALESCE(m.body, '') = ''
+          ORDER BY m.model, m.res_id, m.date, t.tracking_sequence
+        """, (tuple(records), cutoff))
+        changes = defaultdict(list)
+        message_ids = set()
+        for model, res_id, message_id, date, field, old, new in self.env.cr.fetchall():
+            changes[(model, res_id)].append((date, field, old, new))
+            message_ids.add(message_id)
+
+        subtype = self.env.ref('mail.mt_note')
+        self.env['mail.message'].sudo().create([{
+            'model': model,
+            'res_id': res_id,
+            'message_type': 'notification',
+            'subtype_id': subtype.id,
+            'date': rows[-1][0],
+            'body': Markup('<p>%s</p><ul>%s</ul>') % (
+                _('Lịch sử thay đổi (đã nén)'),
+                Markup('').join(Markup('<li>%s %s: %s &#8594; %s</li>') % (
+                    fields.Date.to_string(date), field, old, new) for date, field, old, new in rows)),
+        } for (model, res_id), rows in changes.items()])
+        # Tracking values, notifications and stars go with their message
+        self.env.cr.execute('DELETE FROM mail_message WHERE id IN %s', (tuple(message_ids),))
+        self.env['mail.message'].invalidate_cache()
+        return len(records)
+
+    @api.model
+    def compact(self, days=None):
+        """Collapse the tracking messages older than ``days`` into one summary note per record"""
+        days = days or int(self.env['ir.config_parameter'].sudo().get_param(
+            'digi_customer_progress.tracking_compact_after_days') or DEFAULT_COMPACT_AFTER_DAYS)
+        cutoff = fields.Datetime.subtract(fields.Datetime.now(), days=days)
+        total = 0
+        while True:
+            done = self._compact_batch(cutoff)
+            if not done:
+                break
+            total += done
+            self._commit()
+            _logger.info('Tracking compaction: %d records compacted', total)
+        return total
+
+    @api.model
+    def _cron_compact(self):
+        self.compact()
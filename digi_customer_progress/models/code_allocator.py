@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from collections import deque
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Numbers reserved by this process, keyed by (dbname, sequence id, sequence write_date)
+# so that editing a sequence drops the blocks taken under its old settings.
+_reserved_blocks = {}
+_reserved_blocks_lock = threading.Lock()
+
+DEFAULT_BLOCK_SIZE = 50
+
+
+class CodeAllocator(models.AbstractModel):
+    _name = 'digi.code.allocator'
+    _description = 'Cấp Phát Mã Theo Khối'
+
+    @api.model
+    def _get_sequence(self, sequence_code):
+        return self.env['ir.sequence'].sudo().search([
+            ('code', '=', sequence_code),
+            ('company_id', 'in', [self.env.company.id, False])
+        ], order='company_id', limit=1)
+
+    @api.model
+    def _get_block_size(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('digi_customer_progress.code_block_size')
+        return max(int(value or DEFAULT_BLOCK_SIZE), 1)
+
+    @api.model
+    def _fetch_standard_block(self, sequence, size):
+        """Take ``size`` values from the PostgreSQL sequence; nextval never waits on other workers"""
+        self.env.cr.execute("SELECT nextval(%s) FROM generate_series(1, %s)",
+                            ('ir_sequence_%03d' % sequence.id, size))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _take_standard_numbers(self, sequence, count):
+        """Hand out numbers from this process's block, refilling it when needed.
+
+        Unused numbers are lost when the process stops, which is acceptable
+        for standard sequences: they already allow gaps.
+        """
+        key = (self.env.cr.dbname, sequence.id, sequence.write_date)
+        with _reserved_blocks_lock:
+            for stale_key in [k for k in _reserved_blocks if k[:2] == key[:2] and k != key]:
+                del _reserved_blocks[stale_key]
+            block = _reserved_blocks.setdefault(key, deque())
+            if len(block) < count:
+                block.extend(self._fetch_standard_block(sequence, max(count - len(block), self._get_block_size())))
+            return [block.popleft() for i in range(count)]
+
+    @api.model
+    def _take_gapless_numbers(self, sequence, count):
+        """Move number_next once for the whole batch.
+
+        The row lock is held until commit, so numbers stay gapless. Concurrent
+        creators wait on the lock instead of failing like FOR UPDATE NOWAIT.
+        """
+        self.env.cr.execute("""
+            UPDATE ir_sequence SET number_next = number_next + %s * number_increment
+             WHERE id = %s RETURNING number_next
+        """, (count, sequence.id))
+        number_end = self.env.cr.fetchone()[0]
+        sequence.invalidate_cache(['number_next', 'number_next_actual'])
+        return [number_end - (count - i) * sequence.number_increment for i in range(count)]
+
+    @api.model
+    def next_codes(self, sequence_code, count=1):
+        """Return ``count`` formatted codes of the sequence ``sequence_code``"""
+        if count <= 0:
+            return []
+        sequence = self._get_sequence(sequence_code)
+        if not sequence or sequence.use_date_range:
+            IrSequence = self.env['ir.sequence']
+            return [IrSequence.next_by_code(sequence_code) for i in range(count)]
+        if sequence.implementation == 'no_gap':
+            numbers = self._take_gapless_numbers(sequence, count)
+        else:
+            numbers = self._take_standard_numbers(sequence, count)
+        return [sequence.get_next_char(number) for number in numbers]
+
+    @api.model
+    def next_code(self, sequence_code):
+        return self.next_codes(sequence_code, 1)[0]
+
+    # ========== BENCHMARK ==========
+
+    def _benchmark_worker(self, uid, visa_type_id, count, barrier, results):
+        with self.pool.cursor() as cr:
+            env = api.Environment(cr, uid, {})
+            Customer = env['digi.customer.record'].with_context(
+                tracking_disable=True, digi_skip_provisioning=True)
+            created = []
+            barrier.wait()
+            start = time.perf_counter()
+            for i in range(count):
+                customer = Customer.create({
+                    'name': 'BENCH %s' % i,
+                    'visa_type_id': visa_type_id,
+                    'contract_date': fields.Date.today(),
+                })
+                created.append(customer.id)
+                cr.commit()
+            results.append((time.perf_counter() - start, created))
+
+    @api.model
+    def benchmark_customer_creation(self, worker_counts=(1, 4, 16), per_worker=50):
+        """Measure customer creation throughput with parallel workers.
+
+        Each worker uses its own cursor and commits after every customer, as
+        concurrent advisors would. Created customers are deleted afterwards.
+        Run from ``odoo shell``:
+        ``env['digi.code.allocator'].benchmark_customer_creation()``
+        """
+        visa_type = self.env['digi.visa.type'].search([], limit=1)
+        if not visa_type:
+            raise UserError(_('Cần ít nhất một loại visa để chạy benchmark.'))
+        self.env.cr.commit()
+
+        report = []
+        for workers in worker_counts:
+            barrier = threading.Barrier(workers)
+            results = []
+            threads = [
+                threading.Thread(target=self._benchmark_worker,
+                                 args=(self.env.uid, visa_type.id, per_worker, barrier, results))
+                for i in range(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            elapsed = max((result[0] for result in results), default=0.0)
+            created_ids = [customer_id for result in results for customer_id in result[1]]
+            report.append({
+                'workers': workers,
+                'customers': len(created_ids),
+                'seconds': round(elapsed, 3),
+                'per_second': round(len(created_ids) / elapsed, 1) if elapsed else 0.0,
+            })
+            _logger.info('Customer creation benchmark: %(workers)s workers, %(customers)s customers, '
+                         '%(seconds)ss, %(per_second)s/s', report[-1])
+
+            self.env['digi.customer.record'].browse(created_ids).unlink()
+            self.env.cr.commit()
+        return report
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.osv import expression
+from odoo.tools import split_every
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+# Customer fields whose employee decides who may see the customer
+ACCESS_FIELDS = ['advisor_id', 'responsible_person_id', 'trainer_id', 'teacher_id']
+
+# One row per (customer, key). The record rules look the key up in this table
+# instead of joining hr.employee and res.users on every search:
+#   user:<uid>           advisor or responsible person of the customer
+#   dept:<dept>          department of any assigned employee
+#   advisor_user:<uid>   advisor of the customer (training and visa rules)
+#   advisor_dept:<dept>  department of the advisor
+#   teacher_user:<uid>   English teacher of the customer
+#   teacher_dept:<dept>  department of the English teacher
+ACCESS_KEYS_SQL = """
+    ('user:' || a.user_id), ('user:' || r.user_id),
+    ('dept:' || a.department_id), ('dept:' || r.department_id),
+    ('dept:' || t.department_id), ('dept:' || te.department_id),
+    ('advisor_user:' || a.user_id), ('advisor_dept:' || a.department_id),
+    ('teacher_user:' || te.user_id), ('teacher_dept:' || te.department_id)
+"""
+
+# Customer rule domains before the access table, kept for the benchmark
+LEGACY_RULE_DOMAINS = {
+    'digi_customer_progress.customer_record_rule_user': """[
+        '|',
+        ('advisor_id.user_id', '=', user.id),
+        ('responsible_person_id.user_id', '=', user.id)
+    ]""",
+    'digi_customer_progress.customer_record_rule_advisor': """[
+        '|', '|', '|',
+        ('advisor_id.department_id', '=', user.employee_id.department_id.id),
+        ('responsible_person_id.department_id', '=', user.employee_id.department_id.id),
+        ('trainer_id.department_id', '=', user.employee_id.department_id.id),
+        ('teacher_id.department_id', '=', user.employee_id.department_id.id)
+    ]""",
+}
+BENCHMARK_GROUPS = ['digi_customer_progress.group_dss_user',
+                    'digi_customer_progress.group_dss_advisor',
+                    'digi_customer_progress.group_dss_officer']
+
+LIST_FIELDS = ['customer_code', 'name', 'visa_type_id', 'advisor_id', 'visa_status', 'overall_progress_percentage']
+
+
+class CustomerAccess(models.Model):
+    _name = 'digi.customer.access'
+    _description = 'Phạm Vi Truy Cập Khách Hàng'
+    _log_access = False
+
+    customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True,
+                                  index=True, ondelete='cascade')
+    access_key = fields.Char(string='Khóa Truy Cập', required=True)
+
+    _sql_constraints = [
+        ('customer_key_unique', 'UNIQUE(customer_id, access_key)', 'Khóa truy cập bị trùng!')
+    ]
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_customer_access_key_customer_idx
+                ON "{self._table}" (access_key, customer_id)
+        """)
+        self.env.cr.execute(f'SELECT 1 FROM "{self._table}" LIMIT 1')
+        if not self.env.cr.fetchone():
+            self.rebuild()
+
+    @api.model
+    def _refresh(self, customer_ids):
+        """Recompute the access keys of the given customers with one DELETE and one INSERT per batch"""
+        if not customer_ids:
+            return
+        self.env['digi.customer.record'].flush(ACCESS_FIELDS)
+        self.env['hr.employee'].flush(['user_id', 'department_id'])
+        for ids in split_every(10000, list(set(customer_ids)), tuple):
+            self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE customer_id IN %s', (ids,))
+            self.env.cr.execute(f"""
+                INSERT INTO "{self._table}" (customer_id, access_key)
+                SELECT DISTINCT c.id, k.access_key
+                  FROM digi_customer_record c
+             LEFT JOIN hr_employee a ON a.id = c.advisor_id
+             LEFT JOIN hr_employee r ON r.id = c.responsible_person_id
+             LEFT JOIN hr_employee t ON t.id = c.trainer_id
+             LEFT JOIN hr_employee te ON te.id = c.teacher_id
+            CROSS JOIN LATERAL (VALUES {ACCESS_KEYS_SQL}) AS k(access_key)
+                 WHERE c.id IN %s AND k.access_key IS NOT NULL
+            """, (ids,))
+        self.invalidate_cache()
+        # The customers the dashboard shows to their staff changed
+        self.env['digi.dashboard']._touch()
+
+    @api.model
+    def _refresh_employees(self, employee_ids):
+        """Refresh every customer assigned to one of the employees"""
+        if not employee_ids:
+            return
+        # A new user or department also moves the KPI and calendar rows these employees see
+        self.env['digi.dashboard']._touch()
+        self.env['digi.customer.record'].flush(ACCESS_FIELDS)
+        self.env.cr.execute(f"""
+            SELECT id FROM digi_customer_record
+             WHERE {' OR '.join('%s IN %%(ids)s' % name for name in ACCESS_FIELDS)}
+        """, {'ids': tuple(employee_ids)})
+        self._refresh([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def rebuild(self):
+        self.env.cr.execute('SELECT id FROM digi_customer_record')
+        self._refresh([row[0] for row in self.env.cr.fetchall()])
+        _logger.info('Customer access table rebuilt')
+
+    # ========== BENCHMARK ==========
+
+    @api.model
+    def _time_list_view(self, domain, repeat, limit):
+        Customer = self.env['digi.customer.record'].sudo()
+        timings = []
+        for i in range(repeat):
+            self.invalidate_cache()
+            Customer.invalidate_cache()
+            start = time.perf_counter()
+            Customer.search_read(domain, LIST_FIELDS, limit=limit)
+            Customer.search_count(domain)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return round(timings[len(timings) // 2] * 1000, 2)
+
+    @api.model
+    def _customer_rule_domain(self, user, legacy=False):
+        """Read domain of the customer rules for ``user``, optionally with the legacy rule domains"""
+        Rule = self.env['ir.rule'].with_user(user)
+        eval_context = Rule._eval_context()
+        rules = Rule._get_rules('digi.customer.record').sudo()
+        xmlids = rules.get_external_id()
+        global_domains, group_domains = [], []
+        for rule in rules:
+            domain_force = (legacy and LEGACY_RULE_DOMAINS.get(xmlids.get(rule.id))) or rule.domain_force
+            domain = expression.normalize_domain(safe_eval(domain_force, eval_context) if domain_force else [])
+            (group_domains if rule.groups else global_domains).append(domain)
+        if group_domains:
+            global_domains.append(expression.OR(group_domains))
+        return expression.AND(global_domains) if global_domains else []
+
+    @api.model
+    def benchmark_record_rules(self, repeat=20, limit=80):
+        """Compare list-view latency of the legacy customer rules with the access table.
+
+        For one user whose highest DSS group is User, Advisor and Officer, the
+        customer list (search_read + search_count, as the list view does) is
+        timed with the rule domain built from the legacy rules and from the
+        current ones. Returns the median milliseconds. Run from ``odoo shell``:
+        ``env['digi.customer.access'].benchmark_record_rules()``
+        """
+        report = []
+        for group_xmlid in BENCHMARK_GROUPS:
+            group = self.env.ref(group_xmlid)
+            higher = self.env['res.groups'].search([('implied_ids', 'in', group.ids)])
+            users = group.users.filtered(lambda u: u.id != SUPERUSER_ID and not (u.groups_id & higher))
+            if not users:
+                _logger.info('Record rule benchmark: no user with %s as highest group, skipped', group_xmlid)
+                continue
+            user = users[0]
+            report.append({
+                'group': group.name,
+                'user': user.login,
+                'legacy_ms': self._time_list_view(self._customer_rule_domain(user, legacy=True), repeat, limit),
+                'access_table_ms': self._time_list_view(self._customer_rule_domain(user), repeat, limit),
+            })
+            _logger.info('Record rule benchmark %(group)s (%(user)s): legacy %(legacy_ms)sms, '
+                         'access table %(access_table_ms)sms', report[-1])
+        return report
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import logging
+import threading
+from datetime import date, datetime
+from itertools import islice
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+# Spreadsheet columns copied as-is onto digi.customer.record
+PLAIN_COLUMNS = ['customer_code', 'name', 'phone', 'email', 'address', 'emergency_contact',
+                 'job_contract', 'job_current']
+DATE_COLUMNS = ['date_of_birth', 'contract_date']
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y']
+
+
+class CustomerImportJob(models.Model):
+    _name = 'digi.customer.import.job'
+    _description = 'Tác Vụ Nhập Khách Hàng'
+    _order = 'create_date desc'
+
+    name = fields.Char(string='Tên', required=True)
+    state = fields.Selection([
+        ('draft', 'Nháp'),
+        ('queued', 'Chờ Xử Lý'),
+        ('running', 'Đang Chạy'),
+        ('done', 'Hoàn Thành'),
+        ('failed', 'Thất Bại')
+    ], string='Trạng Thái', default='draft', required=True, readonly=True)
+
+    file_data = fields.Binary(string='Tệp Dữ Liệu', required=True, attachment=True)
+    file_name = fields.Char(string='Tên Tệp')
+    chunk_size = fields.Integer(string='Số Dòng Mỗi Lô', default=500)
+
+    # Checkpoint: number of data rows already consumed, committed with each chunk
+    rows_processed = fields.Integer(string='Số Dòng Đã Xử Lý', readonly=True)
+    rows_imported = fields.Integer(string='Số Dòng Đã Nhập', readonly=True)
+    rows_failed = fields.Integer(string='Số Dòng Lỗi', readonly=True)
+    error_report = fields.Text(string='Báo Cáo Lỗi', readonly=True)
+    last_error = fields.Text(string='Lỗi Gần Nhất', readonly=True)
+
+    date_start = fields.Datetime(string='Bắt Đầu', readonly=True)
+    date_end = fields.Datetime(string='Kết Thúc', readonly=True)
+
+    @api.model
+    def _commit(self):
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    def _iter_rows(self):
+        """Yield (row_number, {column: value}) one row at a time"""
+        self.ensure_one()
+        data = io.BytesIO(base64.b64decode(self.file_data))
+        if (self.file_name or '').lower().endswith(('.xlsx', '.xlsm')):
+            if load_workbook is None:
+                raise UserError(_('Cần cài đặt thư viện openpyxl để nhập tệp Excel.'))
+            workbook = load_workbook(data, read_only=True, data_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+            for number, row in enumerate(rows, start=1):
+                yield number, dict(zip(header, row))
+            workbook.close()
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(data, encoding='utf-8-sig'))
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+            for number, row in enumerate(reader, start=1):
+                yield number, row
+
+    @api.model
+    def _prepare_lookups(self):
+        """Load every many2one target once per run, keyed by the spreadsheet value"""
+        visa_types = self.env['digi.visa.type'].with_context(active_test=False).search_read([], ['code'])
+        job_categories = self.env['digi.job.category'].with_context(active_test=False).search_read([], ['code'])
+        advisors = {}
+        for employee in self.env['hr.employee'].search_read([], ['name', 'work_email']):
+            for key in (employee['name'], employee['work_email']):
+                if key:
+                    advisors.setdefault(key.strip().lower(), employee['id'])
+        return {
+            'visa_type': {vt['code'].strip().lower(): vt['id'] for vt in visa_types},
+            'job_category': {jc['code'].strip().lower(): jc['id'] for jc in job_categories},
+            'advisor': advisors,
+        }
+
+    @api.model
+    def _parse_date(self, value):
+        if not value:
+            return False
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(str(value).strip(), date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(_('Ngày không hợp lệ: %s') % value)
+
+    @api.model
+    def _convert_row(self, row, lookups):
+        """Turn one spreadsheet row into digi.customer.record values"""
+        vals = {}
+        for column in PLAIN_COLUMNS:
+            value = row.get(column)
+            if value not in (None, ''):
+                vals[column] = str(value).strip()
+        for column in DATE_COLUMNS:
+            vals[column] = self._parse_date(row.get(column))
+        for column, field_name in (('visa_type', 'visa_type_id'),
+                                   ('job_category', 'job_category_id'),
+                                   ('advisor', 'advisor_id')):
+            value = str(row.get(column) or '').strip().lower()
+            if not value:
+                continue
+            if value not in lookups[column]:
+                raise ValueError(_('Không tìm thấy %s "%s"') % (column, row.get(column)))
+            vals[field_name] = lookups[column][value]
+        if row.get('gender'):
+            vals['gender'] = str(row['gender']).strip().lower()
+        if row.get('priority') not in (None, ''):
+            vals['priority'] = str(row['priority']).strip()
+        if not vals.get('name'):
+            raise ValueError(_('Thiếu họ tên'))
+        if not vals.get('visa_type_id'):
+            raise ValueError(_('Thiếu loại visa'))
+        if not vals.get('contract_date'):
+            raise ValueError(_('Thiếu ngày ký hợp đồng'))
+        return vals
+
+    def _import_chunk(self, rows, lookups):
+        """Create one chunk of customers; return (imported count, [(row_number, error)])"""
+        errors, prepared = [], []
+        for number, row in rows:
+            try:
+                prepared.append((number, self._convert_row(row, lookups)))
+            except ValueError as e:
+                errors.append((number, str(e)))
+
+        Customer = self.env['digi.customer.record'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True)
+        without_code = [vals for number, vals in prepared if not vals.get('customer_code')]
+        for vals, code in zip(without_code, Customer._reserve_customer_codes(len(without_code))):
+            vals['customer_code'] = code
+
+        try:
+            with self.env.cr.savepoint():
+                Customer.create([vals for number, vals in prepared])
+            return len(prepared), errors
+        except Exception:
+            _logger.info('Customer import %s: chunk failed, retrying row by row', self.id)
+
+        imported = 0
+        for number, vals in prepared:
+            try:
+                with self.env.cr.savepoint():
+                    Customer.create([vals])
+                imported += 1
+            except Exception as e:
+                errors.append((number, str(e)))
+        return imported, errors
+
+    def _run(self):
+        """Import the remaining rows chunk by chunk, committing after each one"""
+        self.ensure_one()
+        self.write({'state': 'running', 'date_start': self.date_start or fields.Datetime.now(), 'last_error': False})
+        self._commit()
+        try:
+            lookups = self._prepare_lookups()
+            rows = islice(self._iter_rows(), self.rows_processed, None)
+            chunk_size = max(self.chunk_size, 1)
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                imported, errors = self._import_chunk(chunk, lookups)
+                report = ''.join('%s,"%s"\n' % (number, message.replace('"', "'")) for number, message in errors)
+                self.write({
+                    'rows_processed': chunk[-1][0],
+                    'rows_imported': self.rows_imported + imported,
+                    'rows_failed': self.rows_failed + len(errors),
+                    'error_report': (self.error_report or '') + report,
+                })
+                self._commit()
+                _logger.info('Customer import %s: %d rows processed', self.id, self.rows_processed)
+        except Exception as e:
+            self.env.cr.rollback()
+            self.invalidate_cache()
+            self.write({'state': 'failed', 'last_error': str(e)})
+            self._commit()
+            _logger.exception('Customer import %s failed at row %d', self.id, self.rows_processed)
+            return False
+        self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+        self._commit()
+        return True
+
+    def action_queue(self):
+        self.filtered(lambda job: job.state in ('draft', 'failed')).write({'state': 'queued'})
+
+    def action_run(self):
+        """Run the import now, resuming from the last committed chunk"""
+        for job in self:
+            if job.state == 'done':
+                continue
+            job._run()
+
+    def action_resume(self):
+        return self.action_run()
+
+    @api.model
+    def _cron_process_queue(self):
+        for job in self.search([('state', '=', 'queued')], order='create_date'):
+            job._run()
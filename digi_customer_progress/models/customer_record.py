@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from collections import defaultdict
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 
+from .customer_access import ACCESS_FIELDS
+from .dashboard_kpi import SOURCE_FIELDS as KPI_SOURCE_FIELDS
+from .job_category_analytics import CUSTOMER_FIELDS as ANALYTICS_FIELDS
+from .progress_scoring import COMPONENT_FIELDS
+
+FACET_FIELDS = ['visa_status', 'priority', 'english_overall_status', 'visa_type_id']
+PROGRESS_BUCKETS = 10
+
 
 class CustomerRecord(models.Model):
     _name = 'digi.customer.record'
     _description = 'Hồ Sơ Khách Hàng DSS'
     _order = 'customer_code desc'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['digi.bulk.tracking.mixin', 'mail.thread', 'mail.activity.mixin', 'digi.attachment.counter.mixin',
+                'digi.report.cache.mixin']
+    _report_cache_customer_field = False
+    _bulk_tracking_customer_field = False
     _rec_name = 'display_name'
     
     # ========== BASIC INFORMATION ==========
@@ -27,7 +39,7 @@ class CustomerRecord(models.Model):
     
     # Personal Information
     date_of_birth = fields.Date(string='Ngày Sinh')
-    age = fields.Integer(string='Tuổi', compute='_compute_age')
+    age = fields.Integer(string='Tuổi', compute='_compute_age', store=True)
     gender = fields.Selection([
         ('male', 'Nam'),
         ('female', 'Nữ'),
@@ -44,6 +56,7 @@ class CustomerRecord(models.Model):
         'digi.visa.type', 
         string='Loại Visa', 
         required=True, 
+        index=True,
         tracking=True
     )
     
@@ -60,6 +73,7 @@ class CustomerRecord(models.Model):
         'hr.employee', 
         string='Cố Vấn Viên', 
         domain=[('department_id.name', 'ilike', 'advisor')],
+        index=True,
         tracking=True
     )
     
@@ -90,11 +104,13 @@ class CustomerRecord(models.Model):
         tracking=True
     )
     
+    access_ids = fields.One2many('digi.customer.access', 'customer_id', string='Phạm Vi Truy Cập')
+    
     # ========== CONTRACT & JOB ==========
-    contract_date = fields.Date(string='Ngày Ký Hợp Đồng', required=True, tracking=True)
+    contract_date = fields.Date(string='Ngày Ký Hợp Đồng', required=True, index=True, tracking=True)
     contract_months = fields.Integer(string='Số Tháng Từ Ký HĐ', compute='_compute_contract_months', store=True)
     
-    job_category_id = fields.Many2one('digi.job.category', string='Ngành Nghề')
+    job_category_id = fields.Many2one('digi.job.category', string='Ngành Nghề', index=True)
     job_contract = fields.Char(string='Nghề Hợp Đồng', tracking=True)
     job_current = fields.Char(string='Nghề Hiện Tại')
     
@@ -252,6 +268,14 @@ class CustomerRecord(models.Model):
         store=True
     )
     
+    visa_process_ids = fields.One2many('digi.visa.process', 'customer_id', string='Quy Trình Visa')
+    projected_visa_completion_date = fields.Date(
+        string='Ngày Dự Kiến Hoàn Thành Visa',
+        compute='_compute_projected_visa_completion',
+        store=True,
+        index=True
+    )
+    
     # ========== COMPUTED FIELDS ==========
     overall_progress_percentage = fields.Float(
         string='Tiến Độ Tổng Thể (%)', 
@@ -264,17 +288,61 @@ class CustomerRecord(models.Model):
     active = fields.Boolean(string='Hoạt Động', default=True)
     color = fields.Integer(string='Màu Sắc', default=0)
     
-    # Attachments
-    attachment_count = fields.Integer(
-        string='Số Tài Liệu', 
-        compute='_compute_attachment_count'
-    )
+    def init(self):
+        super(CustomerRecord, self).init()
+        # Default list order and the status filters only ever look at active customers
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_customer_record_active_code_idx
+                ON "{self._table}" (customer_code DESC) WHERE active
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_customer_record_active_visa_status_idx
+                ON "{self._table}" (visa_status, contract_date) WHERE active
+        """)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        without_code = [vals for vals in vals_list if vals.get('customer_code', _('New')) == _('New')]
+        for vals, code in zip(without_code, self._reserve_customer_codes(len(without_code))):
+            vals['customer_code'] = code
+        records = super(CustomerRecord, self).create(vals_list)
+        self.env['digi.dashboard.kpi']._capture(records.ids, created=True)
+        self.env['digi.job.category.analytics'].invalidate()
+        self.env['digi.customer.access'].sudo()._refresh(records.ids)
+        if not self.env.context.get('digi_skip_provisioning'):
+            self.provision_child_stages(records.ids)
+        return records
+    
+    def write(self, vals):
+        if not KPI_SOURCE_FIELDS.isdisjoint(vals):
+            self.env['digi.dashboard.kpi']._capture(self.ids)
+        result = super(CustomerRecord, self).write(vals)
+        if any(name in vals for name in ACCESS_FIELDS):
+            self.env['digi.customer.access'].sudo()._refresh(self.ids)
+        if any(name in vals for name in ANALYTICS_FIELDS):
+            self.env['digi.job.category.analytics'].invalidate()
+        if any(name in vals for name in FACET_FIELDS + ['tag_ids']):
+            self.env['digi.dashboard']._touch()
+        return result
+    
+    def unlink(self):
+        self.env['digi.dashboard.kpi']._capture(self.ids)
+        return super(CustomerRecord, self).unlink()
+    
+    @api.model
+    def _reserve_customer_codes(self, count):
+        """Reserve ``count`` customer codes from the block allocator"""
+        codes = self.env['digi.code.allocator'].next_codes('digi.customer.record', count)
+        return [code or _('New') for code in codes]
     
     @api.model
-    def create(self, vals):
-        if vals.get('customer_code', _('New')) == _('New'):
-            vals['customer_code'] = self.env['ir.sequence'].next_by_code('digi.customer.record') or _('New')
-        return super(CustomerRecord, self).create(vals)
+    def provision_child_stages(self, customer_ids):
+        """Create the training, English and visa rows of many customers at once"""
+        if not customer_ids:
+            return
+        self.env['digi.training.progress'].create_training_stages_for_customers(customer_ids)
+        self.env['digi.english.training'].create_english_courses_for_customers(customer_ids)
+        self.env['digi.visa.process'].create_visa_steps_for_customers(customer_ids)
     
     @api.depends('name', 'customer_code')
     def _compute_display_name(self):
@@ -304,39 +372,12 @@ class CustomerRecord(models.Model):
             else:
                 record.contract_months = 0
     
-    @api.depends('theory_status', 'practical_status', 'video_status', 'internship_status')
+    @api.depends(*COMPONENT_FIELDS['training'])
     def _compute_training_progress(self):
+        scoring = self.env['digi.progress.scoring']
+        table = scoring._get_scoring_table()
         for record in self:
-            total = 0
-            # Theory: 25%
-            if record.theory_status == 'completed':
-                total += 25
-            elif record.theory_status == 'in_progress':
-                total += 12.5
-            
-            # Practical: 30%
-            if record.practical_status == 'completed':
-                total += 30
-            elif record.practical_status == 'has_skill':
-                total += 30
-            elif record.practical_status == 'in_progress':
-                total += 15
-            
-            # Video: 20%
-            if record.video_status == 'approved':
-                total += 20
-            elif record.video_status == 'completed':
-                total += 15
-            elif record.video_status == 'in_progress':
-                total += 10
-            
-            # Internship: 25%
-            if record.internship_status == 'completed':
-                total += 25
-            elif record.internship_status == 'in_progress':
-                total += 12.5
-            
-            record.training_progress_percentage = total
+            record.training_progress_percentage = scoring._score(record, 'training', table)
     
     @api.depends('pte_1', 'pte_2', 'ielts_1', 'ielts_2')
     def _compute_latest_scores(self):
@@ -373,50 +414,113 @@ class CustomerRecord(models.Model):
             else:
                 record.english_overall_status = 'in_progress'
     
-    @api.depends('beginner_status', 'foundation_status', 'intermediate_status', 
-                 'communication_status', 'interview_status', 'english_overall_status')
+    @api.depends(*COMPONENT_FIELDS['english'])
     def _compute_english_progress(self):
+        scoring = self.env['digi.progress.scoring']
+        table = scoring._get_scoring_table()
         for record in self:
-            total = 0
-            courses = [
-                record.beginner_status, record.foundation_status, record.intermediate_status,
-                record.communication_status, record.interview_status
-            ]
-            
-            for status in courses:
-                if status == 'passed':
-                    total += 20
-                elif status == 'completed':
-                    total += 15
-                elif status == 'in_progress':
-                    total += 10
-            
-            record.english_progress_percentage = min(total, 100)
+            record.english_progress_percentage = scoring._score(record, 'english', table)
     
-    @api.depends('checklist', 'job_offer', 'lmia', 'sa', 'sbs', 'nomination', 'visa')
+    @api.depends(*COMPONENT_FIELDS['visa'])
     def _compute_visa_progress(self):
+        scoring = self.env['digi.progress.scoring']
+        table = scoring._get_scoring_table()
+        for record in self:
+            record.visa_progress_percentage = scoring._score(record, 'visa', table)
+    
+    @api.depends('visa_process_ids.projected_end_date')
+    def _compute_projected_visa_completion(self):
         for record in self:
-            steps = [record.checklist, record.job_offer, record.lmia, 
-                    record.sa, record.sbs, record.nomination, record.visa]
-            completed_steps = sum(1 for step in steps if step)
-            record.visa_progress_percentage = (completed_steps / 7) * 100
+            ends = [date for date in record.visa_process_ids.mapped('projected_end_date') if date]
+            record.projected_visa_completion_date = max(ends) if ends else False
     
     @api.depends('training_progress_percentage', 'english_progress_percentage', 'visa_progress_percentage')
     def _compute_overall_progress(self):
+        scoring = self.env['digi.progress.scoring']
+        table = scoring._get_scoring_table()
         for record in self:
-            # Weighted average: Training 40%, English 30%, Visa 30%
-            record.overall_progress_percentage = (
-                record.training_progress_percentage * 0.4 +
-                record.english_progress_percentage * 0.3 +
-                record.visa_progress_percentage * 0.3
+            # Weighted average, weights come from the active scoring rules
+            record.overall_progress_percentage = scoring._overall(
+                record.training_progress_percentage,
+                record.english_progress_percentage,
+                record.visa_progress_percentage,
+                table
             )
     
-    def _compute_attachment_count(self):
-        for record in self:
-            record.attachment_count = self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', record.id)
-            ])
+    @api.model
+    def _write_grouped(self, vals_by_customer):
+        """Write {customer_id: vals} with one write per distinct set of values.
+
+        These fields mirror the child rows, which carry their own tracking:
+        the customer side is summarised in one note per customer.
+        """
+        customer_ids_by_vals = defaultdict(list)
+        for customer_id, vals in vals_by_customer.items():
+            if vals:
+                customer_ids_by_vals[tuple(sorted(vals.items()))].append(customer_id)
+        customers = self.with_context(digi_bulk_tracking=self.env.context.get('digi_bulk_tracking') or 'summary')
+        for vals, customer_ids in customer_ids_by_vals.items():
+            customers.browse(customer_ids).write(dict(vals))
+    
+    @api.model
+    def get_facet_counts(self, domain=None):
+        """Counts for the filter sidebar, restricted to ``domain`` and the user's record rules
+
+        Returns ``{'total': n, 'visa_status': {value: n}, 'priority': {...},
+        'english_overall_status': {...}, 'visa_type_id': {id: n},
+        'tag_ids': {id: n}, 'overall_progress': [{'from', 'to', 'count'}]}``.
+        All facets come from one statement: a grouping-sets pass over the
+        matching customers plus the tag relation.
+        """
+        self.flush(FACET_FIELDS + ['tag_ids', 'overall_progress_percentage', 'active'])
+        query = self._where_calc(domain or [])
+        self._apply_ir_rules(query, 'read')
+        scope_sql, scope_params = query.select('"%s".id' % self._table)
+
+        self.env.cr.execute(f"""
+            WITH scope AS (
+                SELECT c.id, {', '.join('c.%s' % name for name in FACET_FIELDS)},
+                       LEAST(GREATEST(FLOOR(COALESCE(c.overall_progress_percentage, 0) / %s), 0),
+                             {PROGRESS_BUCKETS - 1})::int AS bucket
+                  FROM digi_customer_record c
+                 WHERE c.id IN ({scope_sql})
+            )
+            SELECT GROUPING({', '.join(FACET_FIELDS)}, bucket),
+                   {', '.join('%s::text' % name for name in FACET_FIELDS)}, bucket, COUNT(*)
+              FROM scope
+          GROUP BY GROUPING SETS ({', '.join('(%s)' % name for name in FACET_FIELDS)}, (bucket), ())
+            UNION ALL
+            SELECT -1, {', '.join(['NULL'] * len(FACET_FIELDS))}, rel.tag_id, COUNT(*)
+              FROM scope
+              JOIN customer_tag_rel rel ON rel.customer_id = scope.id
+          GROUP BY rel.tag_id
+        """, [100 / PROGRESS_BUCKETS] + list(scope_params))
+
+        width = 100 // PROGRESS_BUCKETS
+        result = {name: {} for name in FACET_FIELDS + ['tag_ids']}
+        result['total'] = 0
+        result['overall_progress'] = [
+            {'from': i * width, 'to': (i + 1) * width, 'count': 0} for i in range(PROGRESS_BUCKETS)
+        ]
+        facets = FACET_FIELDS + ['bucket']
+        for row in self.env.cr.fetchall():
+            grouping, values, bucket, count = row[0], row[1:len(FACET_FIELDS) + 1], row[-2], row[-1]
+            if grouping == -1:
+                result['tag_ids'][bucket] = count
+                continue
+            # GROUPING() sets one bit per column left out of the set, the first column being the high bit
+            grouped = [name for i, name in enumerate(facets) if not grouping & (1 << (len(facets) - 1 - i))]
+            if not grouped:
+                result['total'] = count
+            elif grouped[0] == 'bucket':
+                result['overall_progress'][bucket]['count'] = count
+            else:
+                name = grouped[0]
+                value = values[FACET_FIELDS.index(name)]
+                if value is not None and self._fields[name].type == 'many2one':
+                    value = int(value)
+                result[name][value] = count
+        return result
     
     def action_view_attachments(self):
         self.ensure_one()
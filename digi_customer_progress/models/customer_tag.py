@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields
 
 
 class CustomerTag(models.Model):
@@ -26,10 +26,24 @@ class CustomerTag(models.Model):
     # Statistics
     customer_count = fields.Integer(string='Số Khách Hàng', compute='_compute_customer_count')
     
-    @api.depends('customer_ids')
     def _compute_customer_count(self):
+        """Count the tagged customers the user may read, from the tag relation only"""
+        counts = {}
+        if self.ids:
+            Customer = self.env['digi.customer.record']
+            Customer.flush(['tag_ids'])
+            query = Customer._where_calc([])
+            Customer._apply_ir_rules(query, 'read')
+            scope_sql, scope_params = query.select('"%s".id' % Customer._table)
+            self.env.cr.execute(f"""
+                SELECT tag_id, COUNT(*)
+                  FROM customer_tag_rel
+                 WHERE tag_id IN %s AND customer_id IN ({scope_sql})
+              GROUP BY tag_id
+            """, [tuple(self.ids)] + list(scope_params))
+            counts = dict(self.env.cr.fetchall())
         for record in self:
-            record.customer_count = len(record.customer_ids)
+            record.customer_count = counts.get(record.id, 0)
     
     customer_ids = fields.Many2many('digi.customer.record', 'customer_tag_rel', 
                                    'tag_id', 'customer_id', string='Khách Hàng')
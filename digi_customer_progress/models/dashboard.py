@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+COHORT_WEEKS = 12
+TREND_DAYS = 365
+
+# Bumped after each commit that changed dashboard data; a sequence, so writers never wait on each other
+VERSION_SEQUENCE = 'digi_dashboard_version_seq'
+
+
+class DashboardSourceMixin(models.AbstractModel):
+    """Bump the dashboard version when records feeding it are created, deleted or written"""
+    _name = 'digi.dashboard.source.mixin'
+    _description = 'Nguồn Dữ Liệu Dashboard'
+
+    # Fields shown on the dashboard; writing any other field leaves the version alone
+    _dashboard_fields = []
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(DashboardSourceMixin, self).create(vals_list)
+        self.env['digi.dashboard']._touch()
+        return records
+
+    def write(self, vals):
+        if any(name in vals for name in self._dashboard_fields):
+            self.env['digi.dashboard']._touch()
+        return super(DashboardSourceMixin, self).write(vals)
+
+    def unlink(self):
+        self.env['digi.dashboard']._touch()
+        return super(DashboardSourceMixin, self).unlink()
+
+
+class Dashboard(models.AbstractModel):
+    """Every dataset of the progress dashboard, served in one payload"""
+    _name = 'digi.dashboard'
+    _description = 'Dữ Liệu Dashboard Tiến Độ'
+
+    def init(self):
+        self.env.cr.execute(f'CREATE SEQUENCE IF NOT EXISTS {VERSION_SEQUENCE}')
+
+    @api.model
+    def _touch(self):
+        """Bump the dashboard version once the current transaction is committed
+
+        The bump runs after the commit, so a client reading the new version
+        also reads the new data; a rolled back transaction bumps nothing.
+        """
+        data = self.env.cr.postcommit.data
+        if not data.get('digi.dashboard.touched'):
+            data['digi.dashboard.touched'] = True
+            self.env.cr.postcommit.add(self._bump_version)
+
+    @api.model
+    def _bump_version(self):
+        self.env.cr.postcommit.data.pop('digi.dashboard.touched', None)
+        self.env.cr.execute(f"SELECT nextval('{VERSION_SEQUENCE}')")
+
+    @api.model
+    def get_etag(self):
+        """Version of the dashboard payload of the current user
+
+        Reads one sequence value, bumped by the KPI capture, the sources of
+        the expiry calendar, the access key refresh and the jobs rebuilding
+        the aggregates; it also changes on a new day (expiry windows move),
+        with the user, groups, companies and language, and when a record
+        rule is edited (the small ir_rule table).
+        """
+        self.env.cr.execute(f"""
+            SELECT (SELECT last_value FROM {VERSION_SEQUENCE}), (SELECT MAX(write_date) FROM ir_rule)
+        """)
+        data = '|'.join(str(value) for value in (
+            self.env.cr.fetchone(), fields.Date.context_today(self), self.env.uid,
+            sorted(self.env.user.groups_id.ids), sorted(self.env.companies.ids), self.env.lang))
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    @api.model
+    def get_data(self):
+        """Datasets of every dashboard widget, each limited to the user's record rules"""
+        self.env['digi.customer.record'].check_access_rights('read')
+        today = fields.Date.context_today(self)
+        Kpi = self.env['digi.dashboard.kpi']
+        totals = Kpi.get_kpi_summary()
+        return {
+            'kpi': totals[0] if totals else {},
+            'kpi_by_advisor': Kpi.get_kpi_summary(groupby=['advisor_id']),
+            'facets': self.env['digi.customer.record'].get_facet_counts([('active', '=', True)]),
+            'expiries': self.env['digi.expiry.calendar'].get_upcoming(today=today),
+            'visa_trend': self.env['digi.visa.type.stat'].get_trend(date_from=today - timedelta(days=TREND_DAYS)),
+            'cohorts': self.env['digi.progress.snapshot'].get_cohort_curves(
+                today - timedelta(weeks=COHORT_WEEKS), today, step_days=7, domain=[('active', '=', True)]),
+        }
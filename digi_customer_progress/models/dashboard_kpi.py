@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+VISA_STATUSES = ['active', 'granted', 'processing', 'cancelled', 'refused']
+ENGLISH_STATUSES = ['not_started', 'in_progress', 'testing', 'passed']
+TRAINING_STAGES = ['theory', 'practical', 'video', 'internship', 'done']
+PROGRESS_COLUMNS = ['training_progress_percentage', 'english_progress_percentage',
+                    'visa_progress_percentage', 'overall_progress_percentage']
+
+# Current training stage of a customer: the first stage that is not finished yet
+TRAINING_STAGE_SQL = """
+    CASE WHEN COALESCE(c.theory_status, '') <> 'completed' THEN 'theory'
+         WHEN COALESCE(c.practical_status, '') NOT IN ('completed', 'has_skill') THEN 'practical'
+         WHEN COALESCE(c.video_status, '') NOT IN ('completed', 'approved') THEN 'video'
+         WHEN COALESCE(c.internship_status, '') <> 'completed' THEN 'internship'
+         ELSE 'done' END
+"""
+
+# Grain of the facts; the record rules scope them through the advisor and department
+DIMENSION_COLUMNS = ['advisor_id', 'department_id', 'visa_type_id', 'job_category_id']
+# Each day holds the state of that day: carried forward from the day before, then updated by deltas
+KEY_COLUMNS = DIMENSION_COLUMNS + ['day']
+KEY_SQL = ', '.join("COALESCE(%s, %s)" % (column, "'1970-01-01'::date" if column == 'day' else 0)
+                    for column in KEY_COLUMNS)
+MEASURE_COLUMNS = (
+    ['customer_count']
+    + ['count_visa_%s' % status for status in VISA_STATUSES]
+    + ['count_english_%s' % status for status in ENGLISH_STATUSES]
+    + ['count_stage_%s' % stage for stage in TRAINING_STAGES]
+    + ['sum_%s' % column for column in PROGRESS_COLUMNS]
+)
+
+# Customer columns a fact row is read from
+CONTRIBUTION_FIELDS = (
+    ['active', 'advisor_id', 'visa_type_id', 'job_category_id', 'visa_status', 'english_overall_status',
+     'theory_status', 'practical_status', 'video_status', 'internship_status']
+    + PROGRESS_COLUMNS
+)
+# Customer fields whose write can change a contribution: the columns above
+# and the stored fields their computed values depend on
+SOURCE_FIELDS = set(CONTRIBUTION_FIELDS + [
+    'beginner_status', 'foundation_status', 'intermediate_status', 'communication_status', 'interview_status',
+    'pte_1', 'pte_2', 'ielts_1', 'ielts_2', 'latest_pte_score', 'latest_ielts_score',
+    'checklist', 'job_offer', 'lmia', 'sa', 'sbs', 'nomination', 'visa',
+])
+
+
+class DashboardKpi(models.Model):
+    _name = 'digi.dashboard.kpi'
+    _description = 'Chỉ Số Dashboard'
+    _order = 'day desc'
+    _log_access = False
+
+    # Keys
+    advisor_id = fields.Many2one('hr.employee', string='Cố Vấn Viên', index=True, readonly=True)
+    department_id = fields.Many2one('hr.department', string='Phòng Ban', index=True, readonly=True)
+    visa_type_id = fields.Many2one('digi.visa.type', string='Loại Visa', index=True, readonly=True)
+    job_category_id = fields.Many2one('digi.job.category', string='Ngành Nghề', index=True, readonly=True)
+    day = fields.Date(string='Ngày', index=True, readonly=True)
+
+    # Counts
+    customer_count = fields.Integer(string='Số Khách Hàng', readonly=True)
+    count_visa_active = fields.Integer(string='Visa Đang Hoạt Động', readonly=True)
+    count_visa_granted = fields.Integer(string='Visa Đã Cấp', readonly=True)
+    count_visa_processing = fields.Integer(string='Visa Đang Xử Lý', readonly=True)
+    count_visa_cancelled = fields.Integer(string='Visa Đã Hủy', readonly=True)
+    count_visa_refused = fields.Integer(string='Visa Bị Từ Chối', readonly=True)
+    count_english_not_started = fields.Integer(string='Tiếng Anh Chưa Bắt Đầu', readonly=True)
+    count_english_in_progress = fields.Integer(string='Tiếng Anh Đang Học', readonly=True)
+    count_english_testing = fields.Integer(string='Tiếng Anh Đang Thi', readonly=True)
+    count_english_passed = fields.Integer(string='Tiếng Anh Đã Đạt', readonly=True)
+    count_stage_theory = fields.Integer(string='Giai Đoạn Lý Thuyết', readonly=True)
+    count_stage_practical = fields.Integer(string='Giai Đoạn Thực Hành', readonly=True)
+    count_stage_video = fields.Integer(string='Giai Đoạn Video', readonly=True)
+    count_stage_internship = fields.Integer(string='Giai Đoạn Thực Tập', readonly=True)
+    count_stage_done = fields.Integer(string='Hoàn Thành Đào Tạo', readonly=True)
+
+    # Sums, so that rows can be updated by deltas; averages are sum / customer_count
+    sum_training_progress_percentage = fields.Float(string='Tổng Tiến Độ Đào Tạo', readonly=True)
+    sum_english_progress_percentage = fields.Float(string='Tổng Tiến Độ Tiếng Anh', readonly=True)
+    sum_visa_progress_percentage = fields.Float(string='Tổng Tiến Độ Visa', readonly=True)
+    sum_overall_progress_percentage = fields.Float(string='Tổng Tiến Độ Tổng Thể', readonly=True)
+
+    avg_training_progress = fields.Float(string='Tiến Độ Đào Tạo TB (%)', compute='_compute_averages')
+    avg_english_progress = fields.Float(string='Tiến Độ Tiếng Anh TB (%)', compute='_compute_averages')
+    avg_visa_progress = fields.Float(string='Tiến Độ Visa TB (%)', compute='_compute_averages')
+    avg_overall_progress = fields.Float(string='Tiến Độ Tổng Thể TB (%)', compute='_compute_averages')
+
+    refreshed_at = fields.Datetime(string='Cập Nhật Lúc', readonly=True)
+
+    def init(self):
+        # Rows keyed by contract date or by staff do not fit the daily grain: rebuild them
+        self.env.cr.execute("""
+            SELECT 1 FROM pg_indexes
+             WHERE indexname IN ('digi_dashboard_kpi_key_uniq', 'digi_dashboard_kpi_scope_key_uniq')
+        """)
+        outdated = self.env.cr.fetchone()
+        if outdated:
+            self.env.cr.execute(f'DELETE FROM "{self._table}"')
+        self.env.cr.execute('DROP INDEX IF EXISTS digi_dashboard_kpi_key_uniq')
+        self.env.cr.execute('DROP INDEX IF EXISTS digi_dashboard_kpi_scope_key_uniq')
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS digi_dashboard_kpi_day_key_uniq ON "{self._table}" ({KEY_SQL})
+        """)
+        if outdated:
+            self.rebuild()
+
+    @api.depends('customer_count', 'sum_training_progress_percentage', 'sum_english_progress_percentage',
+                 'sum_visa_progress_percentage', 'sum_overall_progress_percentage')
+    def _compute_averages(self):
+        for record in self:
+            count = record.customer_count or 1
+            record.avg_training_progress = record.sum_training_progress_percentage / count
+            record.avg_english_progress = record.sum_english_progress_percentage / count
+            record.avg_visa_progress = record.sum_visa_progress_percentage / count
+            record.avg_overall_progress = record.sum_overall_progress_percentage / count
+
+    # ========== INCREMENTAL MAINTENANCE ==========
+
+    @api.model
+    def _select_contributions(self, customer_ids):
+        """Return {customer_id: (dimensions, measures)} for active customers, read straight from the table"""
+        if not customer_ids:
+            return {}
+        self.env.cr.execute(f"""
+            SELECT c.id, c.advisor_id, e.department_id, c.visa_type_id, c.job_category_id,
+                   c.visa_status, c.english_overall_status, {TRAINING_STAGE_SQL},
+                   {', '.join('COALESCE(c.%s, 0)' % column for column in PROGRESS_COLUMNS)}
+              FROM digi_customer_record c
+         LEFT JOIN hr_employee e ON e.id = c.advisor_id
+             WHERE c.id IN %s AND c.active
+        """, (tuple(customer_ids),))
+        contributions = {}
+        for row in self.env.cr.fetchall():
+            customer_id, key, (visa_status, english_status, stage), progress = row[0], row[1:5], row[5:8], row[8:]
+            measures = dict.fromkeys(MEASURE_COLUMNS, 0)
+            measures['customer_count'] = 1
+            if visa_status in VISA_STATUSES:
+                measures['count_visa_%s' % visa_status] = 1
+            if english_status in ENGLISH_STATUSES:
+                measures['count_english_%s' % english_status] = 1
+            measures['count_stage_%s' % stage] = 1
+            for column, value in zip(PROGRESS_COLUMNS, progress):
+                measures['sum_%s' % column] = value
+            contributions[customer_id] = (tuple(key), measures)
+        return contributions
+
+    @api.model
+    def _capture(self, customer_ids, created=False):
+        """Remember the current contribution of customers before the transaction changes them
+
+        Newly created customers had no contribution, pass ``created=True``.
+        """
+        data = self.env.cr.precommit.data
+        captured = data.get('digi.dashboard.kpi.captured')
+        if captured is None:
+            captured = data['digi.dashboard.kpi.captured'] = {}
+            self.env.cr.precommit.add(self._apply_captured)
+        new_ids = [customer_id for customer_id in customer_ids if customer_id not in captured]
+        if not new_ids:
+            return
+        if created:
+            old = {}
+        else:
+            self.env['digi.customer.record'].flush(CONTRIBUTION_FIELDS)
+            old = self._select_contributions(new_ids)
+        for customer_id in new_ids:
+            captured[customer_id] = old.get(customer_id)
+
+    @api.model
+    def _apply_captured(self):
+        """Precommit hook: turn the captured before/after contributions into row deltas"""
+        captured = self.env.cr.precommit.data.pop('digi.dashboard.kpi.captured', {})
+        if not captured:
+            return
+        self.env['digi.customer.record'].flush(CONTRIBUTION_FIELDS)
+        new = self._select_contributions(list(captured))
+        deltas = defaultdict(lambda: defaultdict(float))
+        for customer_id, old_contribution in captured.items():
+            for contribution, sign in ((old_contribution, -1), (new.get(customer_id), 1)):
+                if contribution:
+                    key, measures = contribution
+                    for column, value in measures.items():
+                        deltas[key][column] += sign * value
+        self._apply_deltas(deltas)
+
+    @api.model
+    def _open_day(self, day):
+        """Start the rows of ``day`` from the latest earlier day, unless ``day`` has rows already
+
+        Rows whose count drops to zero are kept until the next rebuild, so
+        that an opened day never looks unopened.
+        """
+        self.env.cr.execute(f'SELECT 1 FROM "{self._table}" WHERE day = %s LIMIT 1', (day,))
+        if self.env.cr.fetchone():
+            return
+        columns = ', '.join(DIMENSION_COLUMNS + MEASURE_COLUMNS)
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" ({columns}, day, refreshed_at)
+            SELECT {columns}, %(day)s, NOW() AT TIME ZONE 'UTC'
+              FROM "{self._table}"
+             WHERE day = (SELECT MAX(day) FROM "{self._table}" WHERE day < %(day)s) AND customer_count > 0
+            ON CONFLICT ({KEY_SQL}) DO NOTHING
+        """, {'day': day})
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Upsert {dimensions: {measure: delta}} into the rows of today"""
+        day = fields.Date.today()
+        rows = [
+            key + (day,) + tuple(measures.get(column, 0) for column in MEASURE_COLUMNS)
+            for key, measures in deltas.items()
+            if any(measures.values())
+        ]
+        if not rows:
+            return
+        self._open_day(day)
+        columns = KEY_COLUMNS + MEASURE_COLUMNS
+        placeholders = ', '.join(['%s'] * len(columns))
+        updates = ', '.join(f'{column} = "{self._table}".{column} + EXCLUDED.{column}' for column in MEASURE_COLUMNS)
+        for row in rows:
+            self.env.cr.execute(f"""
+                INSERT INTO "{self._table}" ({', '.join(columns)}, refreshed_at)
+                VALUES ({placeholders}, NOW() AT TIME ZONE 'UTC')
+                ON CONFLICT ({KEY_SQL})
+                DO UPDATE SET {updates}, refreshed_at = EXCLUDED.refreshed_at
+            """, row)
+        self.invalidate_cache()
+        self.env['digi.dashboard']._touch()
+
+    @api.model
+    def rebuild(self):
+        """Rebuild the rows of today from digi_customer_record; earlier days are kept as history"""
+        day = fields.Date.today()
+        self.env['digi.customer.record'].flush()
+        self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE day = %s', (day,))
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" ({', '.join(KEY_COLUMNS + MEASURE_COLUMNS)}, refreshed_at)
+            SELECT c.advisor_id, e.department_id, c.visa_type_id, c.job_category_id, %s,
+                   COUNT(*),
+                   {', '.join("COUNT(*) FILTER (WHERE c.visa_status = '%s')" % s for s in VISA_STATUSES)},
+                   {', '.join("COUNT(*) FILTER (WHERE c.english_overall_status = '%s')" % s for s in ENGLISH_STATUSES)},
+                   {', '.join("COUNT(*) FILTER (WHERE %s = '%s')" % (TRAINING_STAGE_SQL, s) for s in TRAINING_STAGES)},
+                   {', '.join('SUM(COALESCE(c.%s, 0))' % column for column in PROGRESS_COLUMNS)},
+                   NOW() AT TIME ZONE 'UTC'
+              FROM digi_customer_record c
+         LEFT JOIN hr_employee e ON e.id = c.advisor_id
+             WHERE c.active
+          GROUP BY c.advisor_id, e.department_id, c.visa_type_id, c.job_category_id
+        """, (day,))
+        self.invalidate_cache()
+        self.env['digi.dashboard']._touch()
+        _logger.info('Dashboard KPI table rebuilt')
+
+    @api.model
+    def _cron_rebuild(self):
+        self.rebuild()
+
+    # ========== READ API ==========
+
+    @api.model
+    def get_kpi_summary(self, domain=None, groupby=None, day=None):
+        """Aggregate the fact rows of ``day`` (the latest one) visible to the user, optionally grouped
+
+        Returns one dict per group with every count plus the four average
+        progress percentages.
+        """
+        groupby = groupby or []
+        if not day:
+            self.env.cr.execute(f'SELECT MAX(day) FROM "{self._table}"')
+            day = self.env.cr.fetchone()[0]
+            if not day:
+                return []
+        groups = self.read_group((domain or []) + [('day', '=', day)], MEASURE_COLUMNS, groupby, lazy=False)
+        result = []
+        for group in groups:
+            count = group.get('customer_count') or 0
+            values = {column: group.get(column) or 0 for column in MEASURE_COLUMNS}
+            for column in PROGRESS_COLUMNS:
+                values['avg_%s' % column] = (values['sum_%s' % column] / count) if count else 0.0
+            for name in groupby:
+                values[name] = group.get(name)
+            result.append(values)
+        return result
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import threading
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .english_training import COURSE_STATUS_FIELDS
+from .training_progress import STAGE_STATUS_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+FAMILY_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
+                'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Hữu', 'Đức', 'Minh', 'Ngọc', 'Thanh', 'Quốc', 'Thu', 'Gia']
+GIVEN_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hòa', 'Hùng', 'Khoa',
+               'Lan', 'Linh', 'Long', 'Mai', 'Nam', 'Nga', 'Phong', 'Phúc', 'Quân', 'Sơn', 'Tâm',
+               'Thảo', 'Trang', 'Trung', 'Tuấn', 'Vy', 'Yến']
+PRIORITY_WEIGHTS = {'0': 20, '1': 55, '2': 20, '3': 5}
+
+# Staff created when the database has fewer employees per department
+STAFF_DEPARTMENTS = {
+    'advisor_id': ('Advisor', 'Cố Vấn Mẫu %02d', 20),
+    'trainer_id': ('Training', 'Giảng Viên Mẫu %02d', 10),
+    'teacher_id': ('English', 'Giáo Viên Mẫu %02d', 10),
+}
+
+COURSE_ORDER = ['beginner', 'foundation', 'intermediate', 'communication', 'interview']
+STAGE_ORDER = ['theory', 'practical', 'video', 'internship']
+VISA_STEP_ORDER = ['checklist', 'job_offer', 'lmia', 'sa', 'sbs', 'nomination', 'visa']
+
+
+def _zipf_weights(count, exponent=1.0):
+    return [1.0 / (rank + 1) ** exponent for rank in range(count)]
+
+
+class DatasetGenerator(models.AbstractModel):
+    _name = 'digi.dataset.generator'
+    _description = 'Sinh Dữ Liệu Mẫu'
+
+    @api.model
+    def _commit(self, commit):
+        if commit and not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.model
+    def _ensure_staff(self):
+        """Return {customer field: [employee ids]}, creating sample staff where a department has none"""
+        Department = self.env['hr.department']
+        Employee = self.env['hr.employee'].with_context(tracking_disable=True)
+        staff = {}
+        for field_name, (department_name, name_pattern, count) in STAFF_DEPARTMENTS.items():
+            department = Department.search([('name', 'ilike', department_name)], order='id', limit=1)
+            if not department:
+                department = Department.create({'name': department_name})
+            employees = Employee.search([('department_id', '=', department.id)], order='id')
+            if not employees:
+                employees = Employee.create([
+                    {'name': name_pattern % (i + 1), 'department_id': department.id} for i in range(count)
+                ])
+            staff[field_name] = employees.ids
+        return staff
+
+    @api.model
+    def _prepare_pools(self):
+        pools = {
+            'visa_type_id': self.env['digi.visa.type'].search([], order='id').ids,
+            'job_category_id': self.env['digi.job.category'].search([], order='id').ids,
+            'tag_ids': self.env['digi.customer.tag'].search([], order='id').ids,
+        }
+        if not pools['visa_type_id']:
+            raise UserError(_('Cần ít nhất một loại visa để sinh dữ liệu.'))
+        pools.update(self._ensure_staff())
+        return pools
+
+    @api.model
+    def _draw_customer(self, rng, pools, tag_rates, today, index):
+        """Values of one customer and the progress levels applied after creation"""
+        contract_date = today - timedelta(days=rng.randint(0, 3 * 365))
+        months = (today - contract_date).days / 30.0
+        # Older contracts are further along; visa steps wait for most of the training
+        training = max(0, min(4, int(months / 3 + rng.gauss(0, 1))))
+        english = max(0, min(5, int(months / 2.5 + rng.gauss(0, 1))))
+        visa = max(0, min(7, int((months - 6) / 3 + rng.gauss(0, 1)))) if training >= 3 else 0
+        outcome = 'active'
+        if visa == 7:
+            outcome = rng.choices(['granted', 'refused'], weights=[88, 12])[0]
+        elif visa >= 4:
+            outcome = 'processing'
+        elif rng.random() < 0.03:
+            outcome = 'cancelled'
+        pte_1 = round(rng.uniform(35, 70), 1) if english >= 4 else 0.0
+        pte_2 = round(min(90.0, pte_1 + rng.uniform(-3, 12)), 1) if pte_1 and pte_1 < 50 and rng.random() < 0.6 else 0.0
+
+        gender = rng.choice(['male', 'female'])
+        vals = {
+            'name': '%s %s %s' % (rng.choice(FAMILY_NAMES), rng.choice(MIDDLE_NAMES), rng.choice(GIVEN_NAMES)),
+            'gender': gender,
+            'date_of_birth': contract_date - timedelta(days=rng.randint(20 * 365, 40 * 365)),
+            'phone': '09%08d' % rng.randint(0, 10 ** 8 - 1),
+            'email': 'customer%06d@example.com' % index,
+            'contract_date': contract_date,
+            'priority': rng.choices(list(PRIORITY_WEIGHTS), weights=list(PRIORITY_WEIGHTS.values()))[0],
+            'visa_type_id': rng.choices(pools['visa_type_id'], weights=pools['visa_type_weights'])[0],
+            'job_category_id': pools['job_category_id'] and rng.choices(
+                pools['job_category_id'], weights=pools['job_category_weights'])[0] or False,
+            'advisor_id': rng.choices(pools['advisor_id'], weights=pools['advisor_weights'])[0],
+            'trainer_id': rng.choice(pools['trainer_id']),
+            'teacher_id': rng.choice(pools['teacher_id']),
+            'tag_ids': [(6, 0, [tag_id for tag_id, rate in tag_rates if rng.random() < rate])],
+        }
+        levels = (training, english, visa, outcome, pte_1, pte_2, rng.randint(0, 20))
+        return vals, levels
+
+    @api.model
+    def _apply_levels(self, customer_ids, levels, today):
+        """Spread the drawn progress over the child rows and the customers with set-based updates, as of ``today``"""
+        cr = self.env.cr
+        columns = list(zip(*levels))
+        params = {
+            'ids': list(customer_ids),
+            'training': list(columns[0]),
+            'english': list(columns[1]),
+            'visa': list(columns[2]),
+            'outcome': list(columns[3]),
+            'pte_1': list(columns[4]),
+            'pte_2': list(columns[5]),
+            'jitter': list(columns[6]),
+            'uid': self.env.uid,
+            'today': today,
+        }
+        levels_sql = """
+            SELECT * FROM UNNEST(%(ids)s::int[], %(training)s::int[], %(english)s::int[], %(visa)s::int[],
+                                 %(outcome)s::varchar[], %(pte_1)s::float[], %(pte_2)s::float[], %(jitter)s::int[])
+                AS lv(customer_id, training, english, visa, outcome, pte_1, pte_2, jitter)
+        """
+        self.env['digi.customer.record'].flush()
+        self.env['digi.training.progress'].flush()
+        self.env['digi.english.training'].flush()
+        self.env['digi.visa.process'].flush()
+        self.env['digi.visa.document'].flush()
+
+        cr.execute(f"""
+            WITH lv AS ({levels_sql})
+            UPDATE digi_training_progress t
+               SET status = CASE WHEN t.stage_sequence <= lv.training THEN 'completed'
+                                 WHEN t.stage_sequence = lv.training + 1 THEN 'in_progress'
+                                 ELSE 'not_started' END,
+                   progress_percentage = CASE WHEN t.stage_sequence <= lv.training THEN 100
+                                              WHEN t.stage_sequence = lv.training + 1 THEN 10 + lv.jitter * 4
+                                              ELSE 0 END,
+                   start_date = CASE WHEN t.stage_sequence <= lv.training + 1
+                                     THEN c.contract_date + (t.stage_sequence - 1) * (75 + lv.jitter) END,
+                   actual_end_date = CASE WHEN t.stage_sequence <= lv.training
+                                          THEN c.contract_date + t.stage_sequence * (75 + lv.jitter) - 1 END,
+                   score = CASE WHEN t.stage_sequence <= lv.training THEN LEAST(10, 6 + lv.jitter / 5.0) END
+              FROM lv, digi_customer_record c
+             WHERE t.customer_id = lv.customer_id AND c.id = lv.customer_id
+        """, params)
+
+        cr.execute(f"""
+            WITH lv AS ({levels_sql})
+            UPDATE digi_english_training e
+               SET status = CASE WHEN e.level_sequence <= lv.english THEN 'passed'
+                                 WHEN e.level_sequence = lv.english + 1 THEN 'in_progress'
+                                 ELSE 'not_started' END,
+                   progress_percentage = CASE WHEN e.level_sequence <= lv.english THEN 100
+                                              WHEN e.level_sequence = lv.english + 1 THEN 10 + lv.jitter * 4
+                                              ELSE 0 END,
+                   start_date = CASE WHEN e.level_sequence <= lv.english + 1
+                                     THEN c.contract_date + (e.level_sequence - 1) * (60 + lv.jitter) END
+              FROM lv, digi_customer_record c
+             WHERE e.customer_id = lv.customer_id AND c.id = lv.customer_id
+        """, params)
+
+        cr.execute(f"""
+            WITH lv AS ({levels_sql})
+            UPDATE digi_visa_process v
+               SET status = CASE WHEN lv.outcome = 'refused' AND v.step_sequence = 7 THEN 'rejected'
+                                 WHEN v.step_sequence <= lv.visa THEN 'completed'
+                                 WHEN v.step_sequence = lv.visa + 1 AND lv.visa > 0 THEN 'in_progress'
+                                 ELSE 'not_started' END,
+                   start_date = CASE WHEN v.step_sequence <= lv.visa + 1 AND lv.visa > 0
+                                     THEN c.contract_date + 180 + (v.step_sequence - 1) * (40 + lv.jitter) END,
+                   actual_completion_date = CASE WHEN v.step_sequence <= lv.visa
+                                                 THEN c.contract_date + 180 + v.step_sequence * (40 + lv.jitter) - 1 END
+              FROM lv, digi_customer_record c
+             WHERE v.customer_id = lv.customer_id AND c.id = lv.customer_id
+        """, params)
+
+        stage_sets = ', '.join(
+            f"""{STAGE_STATUS_FIELDS[stage]} = CASE WHEN lv.training >= {n} THEN 'completed'
+                    WHEN lv.training = {n - 1} THEN 'in_progress' ELSE 'not_started' END"""
+            for n, stage in enumerate(STAGE_ORDER, start=1))
+        course_sets = ', '.join(
+            f"""{COURSE_STATUS_FIELDS[course]} = CASE WHEN lv.english >= {n} THEN 'passed'
+                    WHEN lv.english = {n - 1} THEN 'in_progress' ELSE 'not_started' END"""
+            for n, course in enumerate(COURSE_ORDER, start=1))
+        step_sets = ', '.join(f'{step} = lv.visa >= {n}' for n, step in enumerate(VISA_STEP_ORDER, start=1))
+        cr.execute(f"""
+            WITH lv AS ({levels_sql})
+            UPDATE digi_customer_record c
+               SET {stage_sets}, {course_sets}, {step_sets},
+                   training_start_date = c.contract_date,
+                   training_completion_date = CASE WHEN lv.training = 4 THEN c.contract_date + 4 * (75 + lv.jitter) - 1 END,
+                   pte_1 = NULLIF(lv.pte_1, 0), pte_2 = NULLIF(lv.pte_2, 0),
+                   visa_status = lv.outcome,
+                   visa_result = CASE WHEN lv.outcome IN ('granted', 'refused') THEN lv.outcome ELSE 'processing' END,
+                   visa_submit_date = CASE WHEN lv.visa >= 6 THEN c.contract_date + 180 + 6 * (40 + lv.jitter) END,
+                   visa_grant_date = CASE WHEN lv.outcome = 'granted' THEN c.contract_date + 180 + 7 * (40 + lv.jitter) END
+              FROM lv
+             WHERE c.id = lv.customer_id
+        """, params)
+
+        # Test scores do not exist yet, insert them directly
+        cr.execute(f"""
+            WITH lv AS ({levels_sql})
+            INSERT INTO digi_english_test_score
+                   (customer_id, test_type, test_date, overall_score, target_score, is_target_achieved,
+                    valid_until, is_valid, create_uid, create_date, write_uid, write_date)
+            SELECT lv.customer_id, 'pte', c.contract_date + 240 + s.attempt * 45, s.score, 50, s.score >= 50,
+                   c.contract_date + 240 + s.attempt * 45 + 730, c.contract_date + 240 + s.attempt * 45 + 730 >= %(today)s::date,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM lv
+              JOIN digi_customer_record c ON c.id = lv.customer_id
+        CROSS JOIN LATERAL (VALUES (0, lv.pte_1), (1, lv.pte_2)) AS s(attempt, score)
+             WHERE s.score > 0
+        """, params)
+        cr.execute("""
+            UPDATE digi_visa_document d
+               SET is_submitted = TRUE, submission_date = v.start_date
+              FROM digi_visa_process v
+             WHERE d.visa_process_id = v.id AND v.customer_id = ANY(%(ids)s)
+               AND v.status IN ('completed', 'in_progress', 'rejected')
+        """, params)
+
+        # Recompute the stored fields that depend on the columns written above
+        self.env['base'].invalidate_cache()
+        customers = self.env['digi.customer.record'].browse(customer_ids)
+        customers.modified(list(STAGE_STATUS_FIELDS.values()) + list(COURSE_STATUS_FIELDS.values())
+                           + VISA_STEP_ORDER + ['pte_1', 'pte_2', 'visa_status'])
+        for model, fnames in (('digi.training.progress', ['status', 'score', 'start_date', 'actual_end_date']),
+                              ('digi.english.training', ['status', 'start_date']),
+                              ('digi.visa.process', ['status', 'start_date', 'actual_completion_date'])):
+            self.env[model].search([('customer_id', 'in', customer_ids)]).modified(fnames)
+        self.env['digi.visa.document'].search(
+            [('visa_process_id.customer_id', 'in', customer_ids)]).modified(['is_submitted', 'submission_date'])
+        customers.flush()
+        # Cached reports of these customers would not notice the SQL writes
+        self.env['digi.report.cache'].sudo().invalidate(customer_ids)
+
+    @api.model
+    def generate(self, count=1000, seed=42, chunk_size=1000, commit=True, today=None):
+        """Create ``count`` customers with realistic, seed-deterministic data.
+
+        Customers go through the bulk create path, so codes, child stages and
+        access keys are set as in production; progress, test scores and visa
+        document submissions are then spread over each chunk with set-based
+        SQL. One transaction per chunk when ``commit`` is set. Run from ``odoo shell``:
+        ``env['digi.dataset.generator'].generate(100000, seed=42)``
+        """
+        rng = random.Random(seed)
+        today = fields.Date.to_date(today) or fields.Date.today()
+        pools = self._prepare_pools()
+        pools['visa_type_weights'] = _zipf_weights(len(pools['visa_type_id']))
+        pools['job_category_weights'] = _zipf_weights(len(pools['job_category_id']))
+        pools['advisor_weights'] = _zipf_weights(len(pools['advisor_id']), 0.5)
+        tag_rates = [(tag_id, rng.uniform(0.02, 0.3)) for tag_id in pools['tag_ids']]
+
+        Customer = self.env['digi.customer.record'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_create_nosubscribe=True, mail_notrack=True)
+        start = time.perf_counter()
+        created = 0
+        while created < count:
+            size = min(chunk_size, count - created)
+            drawn = [self._draw_customer(rng, pools, tag_rates, today, created + i) for i in range(size)]
+            customers = Customer.create([vals for vals, levels in drawn])
+            self._apply_levels(customers.ids, [levels for vals, levels in drawn], today)
+            created += size
+            self._commit(commit)
+            _logger.info('Dataset generator: %d/%d customers (%.1fs)', created, count, time.perf_counter() - start)
+
+        self.env['digi.visa.type.stat'].refresh()
+        self.env['digi.visa.step.forecast'].rebuild()
+        self.env['digi.job.category.analytics'].invalidate()
+        self._commit(commit)
+        return created
+
+    @api.model
+    def action_generate(self):
+        """Server action entry point, size and seed taken from system parameters"""
+        params = self.env['ir.config_parameter'].sudo()
+        count = int(params.get_param('digi_customer_progress.dataset_size') or 1000)
+        seed = int(params.get_param('digi_customer_progress.dataset_seed') or 42)
+        self.generate(count, seed=seed)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+from .report_cache import PRINTED_FIELDS
+
+_logger = logging.getLogger(__name__)
+
+# Calendar month difference between {col} and the refresh date
+_MONTH_DIFF_SQL = ("((EXTRACT(YEAR FROM %(today)s::date) - EXTRACT(YEAR FROM {col})) * 12"
+                   " + EXTRACT(MONTH FROM %(today)s::date) - EXTRACT(MONTH FROM {col}))::int")
+# Whole months as relativedelta counts them in _compute_contract_months: the month difference,
+# less one when {col} moved by it overshoots the refresh date. Adding months to a date clamps to
+# the month end in PostgreSQL as in relativedelta, where AGE() would not (31/01 -> 28/02 is 1 month).
+CONTRACT_MONTHS_SQL = (
+    "(" + _MONTH_DIFF_SQL + " - CASE"
+    " WHEN {col} <= %(today)s::date AND {col} + " + _MONTH_DIFF_SQL + " * INTERVAL '1 month' > %(today)s::date THEN 1"
+    " WHEN {col} > %(today)s::date AND {col} + " + _MONTH_DIFF_SQL + " * INTERVAL '1 month' < %(today)s::date THEN -1"
+    " ELSE 0 END)"
+)
+
+
+class DateRefresh(models.AbstractModel):
+    _name = 'digi.date.refresh'
+    _description = 'Làm Mới Trường Phụ Thuộc Ngày'
+
+    # One parameter per rule, suffixed with model.field: a rule added later
+    # gets a full scan on its first run
+    _last_run_param = 'digi_customer_progress.date_refresh_last_run'
+
+    @api.model
+    def _get_refresh_rules(self):
+        """Stored fields whose value depends on today.
+
+        ``expression`` is evaluated in SQL with ``{col}`` replaced by the date
+        column and ``%(today)s`` bound to the refresh date. ``period`` tells the
+        engine on which days the value can change: ``month`` on the day-of-month
+        anniversary, ``year`` on the birthday, ``boundary`` once, on the day
+        after the date (validity flags).
+        """
+        return [
+            {
+                'model': 'digi.customer.record',
+                'field': 'age',
+                'date_field': 'date_of_birth',
+                'period': 'year',
+                'expression': "EXTRACT(YEAR FROM AGE(%(today)s::date, {col}))::int",
+            },
+            {
+                'model': 'digi.customer.record',
+                'field': 'contract_months',
+                'date_field': 'contract_date',
+                'period': 'month',
+                'expression': CONTRACT_MONTHS_SQL,
+            },
+            {
+                'model': 'digi.visa.document',
+                'field': 'is_valid',
+                'date_field': 'expiry_date',
+                'period': 'boundary',
+                'expression': "{col} >= %(today)s::date",
+            },
+            {
+                'model': 'digi.english.test.score',
+                'field': 'is_valid',
+                'date_field': 'valid_until',
+                'period': 'boundary',
+                'expression': "{col} >= %(today)s::date",
+            },
+        ]
+
+    @api.model
+    def _anniversary_keys(self, period, date_from, date_to):
+        """Return the day keys whose anniversary falls in [date_from, date_to].
+
+        Month keys are days of month, year keys are ``month * 100 + day``.
+        A day of month missing from a shorter month has its anniversary on
+        that month's last day (month ends clamp, as in relativedelta), so
+        the last day also covers the days after it; a missing 29 February
+        has its birthday on 1 March. Contract dates still ahead count up on
+        the day after their anniversary, so the day before ``date_from``
+        adds its month keys too.
+        """
+        keys = set()
+        day = date_from - timedelta(days=1) if period == 'month' else date_from
+        while day <= date_to:
+            if period == 'month':
+                keys.add(day.day)
+                if (day + timedelta(days=1)).day == 1:
+                    keys.update(range(day.day, 32))
+            else:
+                keys.add(day.month * 100 + day.day)
+                if (day.month, day.day) == (3, 1):
+                    keys.add(229)
+            day += timedelta(days=1)
+        return keys
+
+    @api.model
+    def _refresh_rule(self, rule, today, date_from=None):
+        """Rewrite one rule's column for the rows whose value changed; return their ids"""
+        Model = self.env[rule['model']]
+        Model.flush([rule['field'], rule['date_field']])
+        col = '"%s"' % rule['date_field']
+        expression = rule['expression'].format(col=col)
+        params = {'today': today}
+
+        where = [f'{col} IS NOT NULL', f'"{rule["field"]}" IS DISTINCT FROM {expression}']
+        full_scan_days = 28 if rule['period'] == 'month' else 365
+        if date_from and rule['period'] == 'boundary':
+            # Only the dates passed since the last run can flip: a range scan on the date index
+            where.append(f'{col} >= %(date_from)s::date - 1 AND {col} < %(today)s::date')
+            params['date_from'] = date_from
+        elif date_from and (today - date_from).days < full_scan_days:
+            if rule['period'] == 'month':
+                where.append(f'EXTRACT(DAY FROM {col})::int IN %(keys)s')
+            else:
+                where.append(f'(EXTRACT(MONTH FROM {col}) * 100 + EXTRACT(DAY FROM {col}))::int IN %(keys)s')
+            params['keys'] = tuple(self._anniversary_keys(rule['period'], date_from, today))
+
+        self.env.cr.execute(f"""
+            UPDATE "{Model._table}"
+               SET "{rule['field']}" = {expression}
+             WHERE {' AND '.join(where)}
+         RETURNING id
+        """, params)
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        if ids:
+            records = Model.browse(ids)
+            records.invalidate_cache([rule['field']])
+            records.modified([rule['field']])
+            if rule['field'] in PRINTED_FIELDS.get(rule['model'], ()):
+                # write_date is not bumped here: drop the printed reports explicitly
+                self.env['digi.report.cache'].sudo().invalidate(records._report_cache_customer_ids())
+        return ids
+
+    @api.model
+    def refresh(self, today=None):
+        """Recompute every date-relative stored field that changed since the rule's last run"""
+        today = today or fields.Date.today()
+        params = self.env['ir.config_parameter'].sudo()
+        result = {}
+        for rule in self._get_refresh_rules():
+            name = '%s.%s' % (rule['model'], rule['field'])
+            param = '%s.%s' % (self._last_run_param, name)
+            last_run = fields.Date.to_date(params.get_param(param) or False)
+            if last_run and last_run >= today:
+                continue
+            date_from = last_run + timedelta(days=1) if last_run else None
+            ids = self._refresh_rule(rule, today, date_from=date_from)
+            params.set_param(param, fields.Date.to_string(today))
+            result[name] = len(ids)
+            if ids:
+                self.env['digi.dashboard']._touch()
+            _logger.info('Date refresh %s: %d rows updated', name, len(ids))
+        return result
+
+    @api.model
+    def _cron_refresh_date_fields(self):
+        self.refresh()
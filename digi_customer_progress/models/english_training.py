@@ -1,14 +1,29 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from collections import defaultdict
 from datetime import datetime, timedelta
 
+# Customer status field mirrored by each course level
+COURSE_STATUS_FIELDS = {
+    'beginner': 'beginner_status',
+    'foundation': 'foundation_status',
+    'intermediate': 'intermediate_status',
+    'communication': 'communication_status',
+    'interview': 'interview_status',
+}
+
+
+# Courses still to be taken, covered by a partial index
+OPEN_STATUSES = ['not_started', 'in_progress', 'failed']
+
 
 class EnglishTraining(models.Model):
     _name = 'digi.english.training'
     _description = 'Đào Tạo Tiếng Anh'
     _order = 'customer_id, course_level'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['digi.bulk.tracking.mixin', 'mail.thread', 'mail.activity.mixin', 'digi.attachment.mixin',
+                'digi.report.cache.mixin']
     
     # Link to customer
     customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True, ondelete='cascade')
@@ -72,8 +87,17 @@ class EnglishTraining(models.Model):
     textbook = fields.Char(string='Sách Giáo Khoa')
     online_resources = fields.Text(string='Tài Liệu Online')
     
-    # Attachments
-    attachment_count = fields.Integer(string='Số Tài Liệu', compute='_compute_attachment_count')
+    def init(self):
+        super(EnglishTraining, self).init()
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_english_training_customer_level_idx
+                ON "{self._table}" (customer_id, course_level)
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_english_training_open_idx
+                ON "{self._table}" (customer_id, level_sequence)
+             WHERE status IN %s
+        """, (tuple(OPEN_STATUSES),))
     
     @api.depends('course_level')
     def _compute_level_sequence(self):
@@ -117,56 +141,38 @@ class EnglishTraining(models.Model):
             else:
                 record.attendance_rate = 0.0
     
-    def _compute_attachment_count(self):
+    def _sync_customer_status(self):
+        """Mirror the course status on the customers, one write per distinct value"""
+        vals_by_customer = defaultdict(dict)
         for record in self:
-            record.attachment_count = self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', record.id)
-            ])
+            field_name = COURSE_STATUS_FIELDS.get(record.course_level)
+            if field_name:
+                vals_by_customer[record.customer_id.id][field_name] = record.status
+        self.env['digi.customer.record']._write_grouped(vals_by_customer)
     
     def action_start_course(self):
-        """Start the English course"""
-        self.ensure_one()
+        """Start the English courses"""
         self.write({
             'status': 'in_progress',
             'start_date': fields.Date.today(),
             'progress_percentage': 10
         })
-        
-        # Update customer record
-        if self.course_level == 'beginner':
-            self.customer_id.beginner_status = 'in_progress'
-        elif self.course_level == 'foundation':
-            self.customer_id.foundation_status = 'in_progress'
-        elif self.course_level == 'intermediate':
-            self.customer_id.intermediate_status = 'in_progress'
-        elif self.course_level == 'communication':
-            self.customer_id.communication_status = 'in_progress'
-        elif self.course_level == 'interview':
-            self.customer_id.interview_status = 'in_progress'
+        self._sync_customer_status()
     
     def action_complete_course(self):
-        """Complete the English course"""
-        self.ensure_one()
-        status = 'passed' if self.is_passed else 'completed'
-        
-        self.write({
-            'status': status,
-            'actual_end_date': fields.Date.today(),
-            'progress_percentage': 100
-        })
-        
-        # Update customer record
-        if self.course_level == 'beginner':
-            self.customer_id.beginner_status = status
-        elif self.course_level == 'foundation':
-            self.customer_id.foundation_status = status
-        elif self.course_level == 'intermediate':
-            self.customer_id.intermediate_status = status
-        elif self.course_level == 'communication':
-            self.customer_id.communication_status = status
-        elif self.course_level == 'interview':
-            self.customer_id.interview_status = status
+        """Complete the English courses"""
+        passed = self.filtered('is_passed')
+        for courses, status in ((passed, 'passed'), (self - passed, 'completed')):
+            if courses:
+                courses.write({
+                    'status': status,
+                    'actual_end_date': fields.Date.today(),
+                    'progress_percentage': 100
+                })
+        self._sync_customer_status()
+        levels = dict(self._fields['course_level']._description_selection(self.env))
+        self.env['digi.notification.event'].sudo().record(
+            'english_completed', self, {record.id: levels.get(record.course_level) for record in self})
     
     def action_record_attendance(self):
         """Record attendance for a session"""
@@ -194,9 +200,9 @@ class EnglishTraining(models.Model):
         }
     
     @api.model
-    def create_english_courses_for_customer(self, customer_id):
-        """Create all English courses for a new customer"""
-        courses_data = [
+    def _prepare_english_courses(self, customer_id):
+        """Values of the five English courses of one customer"""
+        return [
             {
                 'customer_id': customer_id,
                 'course_level': 'beginner',
@@ -233,13 +239,19 @@ class EnglishTraining(models.Model):
                 'pass_score': 7.5
             }
         ]
-        
-        created_courses = []
-        for course_data in courses_data:
-            course = self.create(course_data)
-            created_courses.append(course)
-        
-        return created_courses
+    
+    @api.model
+    def create_english_courses_for_customers(self, customer_ids):
+        """Create the English courses of many customers with one multi-create"""
+        vals_list = []
+        for customer_id in customer_ids:
+            vals_list.extend(self._prepare_english_courses(customer_id))
+        return self.with_context(mail_create_nolog=True, mail_create_nosubscribe=True).create(vals_list)
+    
+    @api.model
+    def create_english_courses_for_customer(self, customer_id):
+        """Create all English courses for a new customer"""
+        return list(self.create_english_courses_for_customers([customer_id]))
     
     def name_get(self):
         result = []
@@ -254,7 +266,9 @@ class EnglishTestScore(models.Model):
     _name = 'digi.english.test.score'
     _description = 'Điểm Thi Tiếng Anh'
     _order = 'customer_id, test_date desc'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['digi.bulk.tracking.mixin', 'mail.thread', 'mail.activity.mixin', 'digi.attachment.mixin',
+                'digi.report.cache.mixin', 'digi.dashboard.source.mixin']
+    _dashboard_fields = ['customer_id', 'test_type', 'overall_score', 'valid_until']
     
     # Link to customer
     customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True, ondelete='cascade')
@@ -285,14 +299,18 @@ class EnglishTestScore(models.Model):
     
     # Result Details
     certificate_number = fields.Char(string='Số Chứng Chỉ')
-    valid_until = fields.Date(string='Có Hiệu Lực Đến')
+    valid_until = fields.Date(string='Có Hiệu Lực Đến', index=True)
     is_valid = fields.Boolean(string='Còn Hiệu Lực', compute='_compute_is_valid', store=True)
     
     # Notes
     notes = fields.Html(string='Ghi Chú')
     
-    # Attachments (certificate, score report)
-    attachment_count = fields.Integer(string='Số Tài Liệu', compute='_compute_attachment_count')
+    def init(self):
+        super(EnglishTestScore, self).init()
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_english_test_score_customer_date_idx
+                ON "{self._table}" (customer_id, test_date DESC)
+        """)
     
     @api.depends('overall_score', 'target_score')
     def _compute_is_target_achieved(self):
@@ -305,13 +323,6 @@ class EnglishTestScore(models.Model):
         for record in self:
             record.is_valid = record.valid_until >= today if record.valid_until else True
     
-    def _compute_attachment_count(self):
-        for record in self:
-            record.attachment_count = self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', record.id)
-            ])
-    
     @api.model
     def create(self, vals):
         record = super(EnglishTestScore, self).create(vals)
@@ -329,6 +340,8 @@ class EnglishTestScore(models.Model):
             else:
                 customer.ielts_2 = record.overall_score
         
+        self.env['digi.notification.event'].sudo().record(
+            'test_score_recorded', record, {record.id: '%s %s' % (record.test_type.upper(), record.overall_score)})
         return record
     
     def action_view_attachments(self):
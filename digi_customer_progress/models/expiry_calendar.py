@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+
+UPCOMING_HORIZONS = [30, 60, 90]
+
+# One branch per dated artifact; each branch is served by the index on its date column.
+# Ids are spread over the branches so that every row of the view keeps a stable id.
+CALENDAR_SOURCES_SQL = """
+    SELECT d.id * 3 AS id, 'document' AS kind, 'digi.visa.document' AS res_model, d.id AS res_id,
+           d.name AS name, v.customer_id, c.advisor_id, d.expiry_date, d.is_valid
+      FROM digi_visa_document d
+      JOIN digi_visa_process v ON v.id = d.visa_process_id
+      JOIN digi_customer_record c ON c.id = v.customer_id
+     WHERE d.expiry_date IS NOT NULL AND c.active
+ UNION ALL
+    SELECT s.id * 3 + 1, 'test_score', 'digi.english.test.score', s.id,
+           UPPER(s.test_type) || ' ' || s.overall_score, s.customer_id, c.advisor_id, s.valid_until, s.is_valid
+      FROM digi_english_test_score s
+      JOIN digi_customer_record c ON c.id = s.customer_id
+     WHERE s.valid_until IS NOT NULL AND c.active
+ UNION ALL
+    SELECT v.id * 3 + 2, 'visa', 'digi.visa.process', v.id,
+           COALESCE(v.application_number, v.step), v.customer_id, c.advisor_id, v.expiry_date,
+           v.expiry_date >= CURRENT_DATE
+      FROM digi_visa_process v
+      JOIN digi_customer_record c ON c.id = v.customer_id
+     WHERE v.expiry_date IS NOT NULL AND c.active
+"""
+
+
+class ExpiryCalendar(models.Model):
+    _name = 'digi.expiry.calendar'
+    _description = 'Lịch Hết Hạn'
+    _order = 'expiry_date, id'
+    _auto = False
+
+    kind = fields.Selection([
+        ('document', 'Tài Liệu Visa'),
+        ('test_score', 'Điểm Thi Tiếng Anh'),
+        ('visa', 'Visa'),
+    ], string='Loại', readonly=True)
+    res_model = fields.Char(string='Mô Hình', readonly=True)
+    res_id = fields.Many2oneReference(string='Bản Ghi', model_field='res_model', readonly=True)
+    name = fields.Char(string='Tên', readonly=True)
+    customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', readonly=True)
+    advisor_id = fields.Many2one('hr.employee', string='Cố Vấn Viên', readonly=True)
+    expiry_date = fields.Date(string='Ngày Hết Hạn', readonly=True)
+    is_valid = fields.Boolean(string='Còn Hiệu Lực', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f'CREATE OR REPLACE VIEW "{self._table}" AS ({CALENDAR_SOURCES_SQL})')
+
+    @api.model
+    def get_upcoming(self, advisor_ids=None, horizons=None, today=None):
+        """Expiries of the next 30/60/90 days counted per advisor, within the user's record rules.
+
+        Returns ``[{'advisor_id', 'advisor_name', 'within_30', 'within_60',
+        'within_90'}]``; the counts are cumulative.
+        """
+        horizons = sorted(horizons or UPCOMING_HORIZONS)
+        today = fields.Date.to_date(today) or fields.Date.today()
+        domain = [('expiry_date', '>=', today), ('expiry_date', '<=', today + timedelta(days=horizons[-1]))]
+        if advisor_ids:
+            domain.append(('advisor_id', 'in', list(advisor_ids)))
+        self.env['digi.visa.document'].flush(['expiry_date', 'is_valid', 'name'])
+        self.env['digi.english.test.score'].flush(['valid_until', 'is_valid'])
+        self.env['digi.visa.process'].flush(['expiry_date'])
+        query = self._where_calc(domain)
+        self._apply_ir_rules(query, 'read')
+        rows_sql, rows_params = query.select(f'"{self._table}".advisor_id', f'"{self._table}".expiry_date')
+        counts = ', '.join('COUNT(*) FILTER (WHERE r.expiry_date <= %s)' for horizon in horizons)
+        self.env.cr.execute(f"""
+            SELECT r.advisor_id, {counts}
+              FROM ({rows_sql}) AS r
+          GROUP BY r.advisor_id
+        """, [today + timedelta(days=horizon) for horizon in horizons] + rows_params)
+        rows = self.env.cr.fetchall()
+        names = dict(self.env['hr.employee'].sudo().browse([row[0] for row in rows if row[0]]).name_get())
+        return [
+            dict({'advisor_id': row[0], 'advisor_name': names.get(row[0], '')},
+                 **{'within_%s' % horizon: count for horizon, count in zip(horizons, row[1:])})
+            for row in rows
+        ]
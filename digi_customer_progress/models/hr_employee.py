@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+from .customer_access import ACCESS_FIELDS
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    def write(self, vals):
+        result = super(HrEmployee, self).write(vals)
+        if 'user_id' in vals or 'department_id' in vals:
+            self.env['digi.customer.access'].sudo()._refresh_employees(self.ids)
+        return result
+
+    def unlink(self):
+        customer_ids = self.env['digi.customer.record'].sudo().with_context(active_test=False).search(
+            ['|', '|', '|'] + [(name, 'in', self.ids) for name in ACCESS_FIELDS]).ids
+        result = super(HrEmployee, self).unlink()
+        self.env['digi.customer.access'].sudo()._refresh(customer_ids)
+        return result
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+
+from odoo import models
+from odoo.tools.pdf import merge_pdf
+
+from .report_cache import REPORT_NAME
+
+
+class IrActionsReport(models.Model):
+    _inherit = 'ir.actions.report'
+
+    def _split_pdf_by_outline(self, pdf, count):
+        """Split a multi-record PDF at its top-level outline entries, as ``_post_pdf`` does
+
+        The progress report opens each customer with the only ``<h2>`` of
+        its page, so there is one top-level entry per customer. Returns
+        ``count`` PDFs, or None when the outline does not match.
+        """
+        reader = PdfFileReader(io.BytesIO(pdf), strict=False)
+        root = reader.trailer['/Root']
+        if '/Outlines' not in root or '/First' not in root['/Outlines'] or '/Dests' not in root:
+            return None
+        starts = []
+        node = root['/Outlines']['/First']
+        while True:
+            starts.append(root['/Dests'][node['/Dest']][0])
+            if '/Next' not in node:
+                break
+            node = node['/Next']
+        starts = sorted(set(starts))
+        if len(starts) != count or starts[0] != 0:
+            return None
+        pdfs = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else reader.numPages
+            writer = PdfFileWriter()
+            for page in range(start, end):
+                writer.addPage(reader.getPage(page))
+            stream = io.BytesIO()
+            writer.write(stream)
+            pdfs.append(stream.getvalue())
+        return pdfs
+
+    def _render_qweb_pdf(self, res_ids=None, data=None):
+        """Serve the customer progress report from the render cache, printing the changed customers in one run"""
+        if self.report_name != REPORT_NAME or not res_ids or data:
+            return super(IrActionsReport, self)._render_qweb_pdf(res_ids, data)
+        customers = self.env['digi.customer.record'].browse(res_ids)
+        customers.check_access_rights('read')
+        customers.check_access_rule('read')
+        scope = self.env['digi.report.cache']._reader_scope()
+        Cache = self.env['digi.report.cache'].sudo()
+        fingerprints = Cache._fingerprints(customers.ids, scope)
+        pdfs = Cache.lookup(fingerprints)
+        missing = [customer_id for customer_id in customers.ids if customer_id not in pdfs]
+        if missing:
+            # One wkhtmltopdf run for all the misses, cut back into one PDF per customer
+            pdf = super(IrActionsReport, self)._render_qweb_pdf(missing, data)[0]
+            parts = [pdf] if len(missing) == 1 else self._split_pdf_by_outline(pdf, len(missing))
+            if parts is None:
+                parts = [super(IrActionsReport, self)._render_qweb_pdf([customer_id], data)[0]
+                         for customer_id in missing]
+            for customer_id, part in zip(missing, parts):
+                pdfs[customer_id] = part
+                Cache.store(customer_id, fingerprints[customer_id], part)
+        if len(customers) == 1:
+            return pdfs[customers.id], 'pdf'
+        return merge_pdf([pdfs[customer_id] for customer_id in customers.ids]), 'pdf'
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from odoo import models, api
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    def _digi_counter_deltas(self, sign):
+        """Group the attachments by counted model: {res_model: {res_id: delta}}"""
+        counter_mixin = self.pool['digi.attachment.counter.mixin']
+        deltas = defaultdict(lambda: defaultdict(int))
+        for res_model, res_id, res_field in self.sudo().mapped(lambda a: (a.res_model, a.res_id, a.res_field)):
+            if not res_model or not res_id or res_field or res_model not in self.env:
+                continue
+            if not issubclass(self.pool[res_model], counter_mixin):
+                continue
+            deltas[res_model][res_id] += sign
+        return deltas
+
+    def _digi_counter_apply(self, deltas):
+        for res_model, model_deltas in deltas.items():
+            self.env[res_model].sudo()._attachment_counter_adjust(model_deltas)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        attachments = super(IrAttachment, self).create(vals_list)
+        attachments._digi_counter_apply(attachments._digi_counter_deltas(1))
+        return attachments
+
+    def write(self, vals):
+        if not {'res_model', 'res_id', 'res_field'} & set(vals):
+            return super(IrAttachment, self).write(vals)
+        before = self._digi_counter_deltas(-1)
+        result = super(IrAttachment, self).write(vals)
+        self._digi_counter_apply(before)
+        self._digi_counter_apply(self._digi_counter_deltas(1))
+        return result
+
+    def unlink(self):
+        deltas = self._digi_counter_deltas(-1)
+        result = super(IrAttachment, self).unlink()
+        self._digi_counter_apply(deltas)
+        return result
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields
 
 
 class JobCategory(models.Model):
@@ -38,28 +38,34 @@ class JobCategory(models.Model):
     color = fields.Integer(string='Màu Sắc', default=0)
     
     # Statistics
-    customer_count = fields.Integer(string='Số Khách Hàng', compute='_compute_customer_count')
-    avg_completion_days = fields.Float(string='Thời Gian Hoàn Thành TB (Ngày)', compute='_compute_avg_completion')
+    customer_count = fields.Integer(string='Số Khách Hàng', compute='_compute_analytics')
+    avg_completion_days = fields.Float(string='Thời Gian Hoàn Thành TB (Ngày)', compute='_compute_analytics')
+    median_completion_days = fields.Float(string='Trung Vị Hoàn Thành (Ngày)', compute='_compute_analytics')
+    p90_completion_days = fields.Float(string='P90 Hoàn Thành (Ngày)', compute='_compute_analytics')
+    p99_completion_days = fields.Float(string='P99 Hoàn Thành (Ngày)', compute='_compute_analytics')
     
-    @api.depends('customer_ids')
-    def _compute_customer_count(self):
-        for record in self:
-            record.customer_count = len(record.customer_ids.filtered(lambda c: c.job_contract == record.name))
+    avg_theory_days = fields.Float(string='Lý Thuyết TB (Ngày)', compute='_compute_analytics')
+    avg_practical_days = fields.Float(string='Thực Hành TB (Ngày)', compute='_compute_analytics')
+    avg_video_days = fields.Float(string='Video TB (Ngày)', compute='_compute_analytics')
+    avg_internship_days = fields.Float(string='Thực Tập TB (Ngày)', compute='_compute_analytics')
     
-    @api.depends('customer_ids.training_completion_date')
-    def _compute_avg_completion(self):
+    def _compute_analytics(self):
+        analytics = self.env['digi.job.category.analytics'].get_analytics()
         for record in self:
-            customers = record.customer_ids.filtered(
-                lambda c: c.job_contract == record.name and c.training_completion_date
-            )
-            if customers:
-                total_days = sum(
-                    (c.training_completion_date - c.contract_date).days 
-                    for c in customers if c.contract_date
-                )
-                record.avg_completion_days = total_days / len(customers)
-            else:
-                record.avg_completion_days = 0.0
+            values = analytics.get(record.id, {})
+            stage_days = values.get('stage_days', {})
+            record.customer_count = values.get('customer_count', 0)
+            record.avg_completion_days = values.get('avg_completion_days', 0.0)
+            record.median_completion_days = values.get('median_completion_days', 0.0)
+            record.p90_completion_days = values.get('p90_completion_days', 0.0)
+            record.p99_completion_days = values.get('p99_completion_days', 0.0)
+            record.avg_theory_days = stage_days.get('theory', 0.0)
+            record.avg_practical_days = stage_days.get('practical', 0.0)
+            record.avg_video_days = stage_days.get('video', 0.0)
+            record.avg_internship_days = stage_days.get('internship', 0.0)
+    
+    def action_refresh_analytics(self):
+        self.env['digi.job.category.analytics'].get_analytics(force=True)
     
     customer_ids = fields.One2many('digi.customer.record', 'job_category_id', string='Khách Hàng')
     
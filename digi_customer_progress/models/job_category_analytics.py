@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from odoo import models, api
+
+# {(dbname, scope): (computed_at, analytics)}, shared by every request of this
+# process; the scope is the customer query after the record rules, so users
+# with the same rule scope share an entry
+_analytics_cache = {}
+_analytics_cache_lock = threading.Lock()
+
+DEFAULT_TTL = 600
+# Fields the analytics are computed from; writing them drops the cached results
+CUSTOMER_FIELDS = ['job_category_id', 'contract_date', 'training_completion_date', 'active']
+TRAINING_FIELDS = ['customer_id', 'stage', 'start_date', 'actual_end_date']
+
+
+class JobCategoryAnalytics(models.AbstractModel):
+    _name = 'digi.job.category.analytics'
+    _description = 'Phân Tích Ngành Nghề'
+
+    @api.model
+    def _get_ttl(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('digi_customer_progress.job_analytics_ttl')
+        return int(value or DEFAULT_TTL)
+
+    @api.model
+    def _scope(self):
+        """SQL selecting the categorised active customers the user may read"""
+        Customer = self.env['digi.customer.record']
+        query = Customer._where_calc([('active', '=', True), ('job_category_id', '!=', False)])
+        Customer._apply_ir_rules(query, 'read')
+        scope_sql, scope_params = query.select('"%s".id' % Customer._table)
+        return scope_sql, tuple(scope_params)
+
+    @api.model
+    def _compute_analytics(self, scope_sql, scope_params):
+        """Customer count, completion-time distribution and stage durations for every category
+
+        Completion time is training_completion_date - contract_date in days,
+        stage duration is actual_end_date - start_date of digi.training.progress.
+        Only the customers selected by ``scope_sql`` are counted.
+        """
+        self.env['digi.customer.record'].flush(CUSTOMER_FIELDS)
+        self.env['digi.training.progress'].flush(TRAINING_FIELDS)
+        cr = self.env.cr
+
+        analytics = {}
+        cr.execute(f"""
+            SELECT job_category_id,
+                   COUNT(*),
+                   AVG(training_completion_date - contract_date)
+                       FILTER (WHERE training_completion_date IS NOT NULL AND contract_date IS NOT NULL),
+                   PERCENTILE_CONT(ARRAY[0.5, 0.9, 0.99])
+                       WITHIN GROUP (ORDER BY training_completion_date - contract_date)
+                       FILTER (WHERE training_completion_date IS NOT NULL AND contract_date IS NOT NULL)
+              FROM digi_customer_record
+             WHERE id IN ({scope_sql})
+          GROUP BY job_category_id
+        """, scope_params)
+        for category_id, count, mean, percentiles in cr.fetchall():
+            median, p90, p99 = percentiles or (None, None, None)
+            analytics[category_id] = {
+                'customer_count': count,
+                'avg_completion_days': float(mean or 0.0),
+                'median_completion_days': median or 0.0,
+                'p90_completion_days': p90 or 0.0,
+                'p99_completion_days': p99 or 0.0,
+                'stage_days': {},
+            }
+
+        cr.execute(f"""
+            SELECT c.job_category_id, t.stage, AVG(t.actual_end_date - t.start_date)
+              FROM digi_training_progress t
+              JOIN digi_customer_record c ON c.id = t.customer_id
+             WHERE c.id IN ({scope_sql})
+               AND t.start_date IS NOT NULL AND t.actual_end_date IS NOT NULL
+          GROUP BY c.job_category_id, t.stage
+        """, scope_params)
+        for category_id, stage, mean in cr.fetchall():
+            if category_id in analytics:
+                analytics[category_id]['stage_days'][stage] = float(mean or 0.0)
+        return analytics
+
+    @api.model
+    def get_analytics(self, force=False):
+        """Return {job_category_id: analytics} within the user's record rules, recomputed at most once per TTL
+
+        Writes drop the cached results of this process only: the other
+        workers may serve results up to one TTL old.
+        """
+        scope_sql, scope_params = self._scope()
+        key = (self.env.cr.dbname, scope_sql, scope_params)
+        now = time.time()
+        with _analytics_cache_lock:
+            cached = _analytics_cache.get(key)
+            if cached and not force and now - cached[0] < self._get_ttl():
+                return cached[1]
+        analytics = self._compute_analytics(scope_sql, scope_params)
+        with _analytics_cache_lock:
+            _analytics_cache[key] = (now, analytics)
+        return analytics
+
+    @api.model
+    def invalidate(self):
+        dbname = self.env.cr.dbname
+        with _analytics_cache_lock:
+            for key in [key for key in _analytics_cache if key[0] == dbname]:
+                del _analytics_cache[key]
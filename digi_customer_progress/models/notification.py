@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+EVENT_TYPES = [
+    ('training_completed', 'Hoàn Thành Giai Đoạn Đào Tạo'),
+    ('english_completed', 'Hoàn Thành Khóa Tiếng Anh'),
+    ('test_score_recorded', 'Có Điểm Thi Tiếng Anh'),
+    ('visa_step_approved', 'Bước Visa Được Duyệt'),
+    ('visa_step_completed', 'Hoàn Thành Bước Visa'),
+]
+RECIPIENT_ROLES = [
+    ('advisor', 'Cố Vấn Viên'),
+    ('teacher', 'Giáo Viên Tiếng Anh'),
+    ('customer', 'Khách Hàng'),
+]
+# Who hears about each event, besides the customer
+EVENT_STAFF = {
+    'training_completed': ['advisor'],
+    'english_completed': ['advisor', 'teacher'],
+    'test_score_recorded': ['advisor', 'teacher'],
+    'visa_step_approved': ['advisor'],
+    'visa_step_completed': ['advisor'],
+}
+STAFF_FIELDS = {'advisor': 'advisor_id', 'teacher': 'teacher_id'}
+DIGEST_TEMPLATE = 'digi_customer_progress.email_template_progress_digest'
+DEFAULT_RETENTION_DAYS = 30
+
+
+class NotificationEvent(models.Model):
+    """Outbox of progress events, one row per recipient; mailed later as digests"""
+    _name = 'digi.notification.event'
+    _description = 'Sự Kiện Thông Báo Tiến Độ'
+    _order = 'customer_id, event_date, id'
+    _log_access = False
+
+    event_type = fields.Selection(EVENT_TYPES, string='Sự Kiện', required=True, readonly=True)
+    event_date = fields.Datetime(string='Thời Điểm', required=True, readonly=True)
+    customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True, readonly=True,
+                                  ondelete='cascade')
+    res_model = fields.Char(string='Mô Hình', readonly=True)
+    res_id = fields.Many2oneReference(string='Bản Ghi', model_field='res_model', readonly=True)
+    summary = fields.Char(string='Nội Dung', readonly=True)
+
+    recipient_role = fields.Selection(RECIPIENT_ROLES, string='Người Nhận', required=True, readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Đối Tác Nhận', readonly=True, ondelete='cascade')
+    email = fields.Char(string='Email Nhận', readonly=True)
+    digest_id = fields.Many2one('digi.notification.digest', string='Bản Tổng Hợp', readonly=True,
+                                ondelete='cascade')
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_notification_event_pending_idx
+                ON "{self._table}" (partner_id, email, id)
+             WHERE digest_id IS NULL
+        """)
+
+    @api.model
+    def _recipients(self, customer, roles):
+        """(role, partner_id, email) of the people to notify about one customer"""
+        recipients = []
+        for role in roles:
+            employee = customer[STAFF_FIELDS[role]]
+            if employee.user_id.partner_id:
+                recipients.append((role, employee.user_id.partner_id.id, None))
+            elif employee.work_email:
+                recipients.append((role, None, employee.work_email))
+        if customer.email:
+            recipients.append(('customer', None, customer.email))
+        return list(dict.fromkeys(recipients))
+
+    @api.model
+    def record(self, event_type, records, summaries):
+        """Queue ``event_type`` for each record with one INSERT; ``summaries`` maps record id to details"""
+        rows = []
+        now = fields.Datetime.now()
+        label = dict(EVENT_TYPES)[event_type]
+        for record in records:
+            customer = record.customer_id
+            summary = '%s: %s' % (label, summaries[record.id]) if summaries.get(record.id) else label
+            for role, partner_id, email in self._recipients(customer, EVENT_STAFF[event_type]):
+                rows.append((event_type, now, customer.id, record._name, record.id, summary,
+                             role, partner_id, email))
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" (event_type, event_date, customer_id, res_model, res_id, summary,
+                                         recipient_role, partner_id, email)
+            SELECT * FROM UNNEST(%s::varchar[], %s::timestamp[], %s::int[], %s::varchar[], %s::int[],
+                                 %s::varchar[], %s::varchar[], %s::int[], %s::varchar[])
+        """, [list(column) for column in columns])
+
+
+class NotificationDigest(models.Model):
+    _name = 'digi.notification.digest'
+    _description = 'Bản Tổng Hợp Thông Báo'
+    _order = 'create_date desc'
+
+    recipient_role = fields.Selection(RECIPIENT_ROLES, string='Người Nhận', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Đối Tác Nhận', readonly=True)
+    email_to = fields.Char(string='Email Nhận', readonly=True)
+    company_id = fields.Many2one('res.company', string='Công Ty', default=lambda self: self.env.company,
+                                 readonly=True)
+    event_ids = fields.One2many('digi.notification.event', 'digest_id', string='Sự Kiện', readonly=True)
+    event_count = fields.Integer(string='Số Sự Kiện', readonly=True)
+    period_start = fields.Datetime(string='Từ', readonly=True)
+    period_end = fields.Datetime(string='Đến', readonly=True)
+    mail_id = fields.Many2one('mail.mail', string='Email', readonly=True, ondelete='set null')
+
+    @api.model
+    def _create_digests(self):
+        """Group every pending event by recipient into one digest each"""
+        Event = self.env['digi.notification.event']
+        Event.flush()
+        self.env.cr.execute(f"""
+            SELECT MIN(recipient_role), partner_id, email, ARRAY_AGG(id), MIN(event_date), MAX(event_date)
+              FROM "{Event._table}"
+             WHERE digest_id IS NULL
+          GROUP BY partner_id, email
+        """)
+        groups = self.env.cr.fetchall()
+        if not groups:
+            return self
+        digests = self.create([{
+            'recipient_role': role,
+            'partner_id': partner_id,
+            'email_to': email,
+            'event_count': len(event_ids),
+            'period_start': period_start,
+            'period_end': period_end,
+        } for role, partner_id, email, event_ids, period_start, period_end in groups])
+        digest_ids, event_ids = [], []
+        for digest, group in zip(digests, groups):
+            digest_ids.extend([digest.id] * len(group[3]))
+            event_ids.extend(group[3])
+        self.env.cr.execute(f"""
+            UPDATE "{Event._table}" e SET digest_id = d.digest_id
+              FROM UNNEST(%s::int[], %s::int[]) AS d(event_id, digest_id)
+             WHERE e.id = d.event_id
+        """, (event_ids, digest_ids))
+        Event.invalidate_cache(['digest_id'])
+        digests.invalidate_cache(['event_ids'])
+        return digests
+
+    def _send(self):
+        """Render every digest in one batch and queue the mails with one create"""
+        if not self:
+            return
+        template = self.env.ref(DIGEST_TEMPLATE)
+        rendered = template.generate_email(self.ids, ['subject', 'body_html', 'email_from', 'email_to',
+                                                      'partner_to', 'auto_delete'])
+        vals_list = []
+        for digest in self:
+            values = rendered[digest.id]
+            vals_list.append({
+                'subject': values.get('subject'),
+                'body_html': values.get('body_html'),
+                'email_from': values.get('email_from'),
+                'email_to': values.get('email_to'),
+                'recipient_ids': [(4, partner_id) for partner_id in values.get('partner_ids', [])],
+                'auto_delete': values.get('auto_delete', True),
+                'model': self._name,
+                'res_id': digest.id,
+            })
+        mails = self.env['mail.mail'].sudo().create(vals_list)
+        for digest, mail in zip(self, mails):
+            digest.mail_id = mail
+
+    @api.model
+    def _cron_send_digests(self):
+        digests = self._create_digests()
+        digests._send()
+        retention = int(self.env['ir.config_parameter'].sudo().get_param(
+            'digi_customer_progress.notification_retention_days') or DEFAULT_RETENTION_DAYS)
+        # Old digests go with their events
+        self.env.cr.execute(f"""
+            DELETE FROM "{self._table}" WHERE create_date < (NOW() AT TIME ZONE 'UTC') - %s * INTERVAL '1 day'
+        """, (retention,))
+        _logger.info('Progress notifications: %d digests queued for %d events',
+                     len(digests), sum(digests.mapped('event_count')))
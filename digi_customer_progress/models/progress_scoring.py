@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+ENGLISH_COURSE_POINTS = {'passed': 20, 'completed': 15, 'in_progress': 10}
+
+# Weights shipped with the module; version 1 of the scoring rules is created from this table
+DEFAULT_SCORING = {
+    'weights': {'training': 0.4, 'english': 0.3, 'visa': 0.3},
+    'components': {
+        'training': [
+            ('theory_status', {'completed': 25, 'in_progress': 12.5}),
+            ('practical_status', {'completed': 30, 'has_skill': 30, 'in_progress': 15}),
+            ('video_status', {'approved': 20, 'completed': 15, 'in_progress': 10}),
+            ('internship_status', {'completed': 25, 'in_progress': 12.5}),
+        ],
+        'english': [
+            ('beginner_status', ENGLISH_COURSE_POINTS),
+            ('foundation_status', ENGLISH_COURSE_POINTS),
+            ('intermediate_status', ENGLISH_COURSE_POINTS),
+            ('communication_status', ENGLISH_COURSE_POINTS),
+            ('interview_status', ENGLISH_COURSE_POINTS),
+        ],
+        'visa': [
+            (step, {'True': 100.0 / 7})
+            for step in ('checklist', 'job_offer', 'lmia', 'sa', 'sbs', 'nomination', 'visa')
+        ],
+    },
+}
+
+# Stored column written for each component by the mass recompute
+COMPONENT_COLUMNS = {
+    'training': 'training_progress_percentage',
+    'english': 'english_progress_percentage',
+    'visa': 'visa_progress_percentage',
+}
+
+SCORE_CAP = 100.0
+
+# Customer fields each component compute depends on: a rule on any other field would never be recomputed
+COMPONENT_FIELDS = {
+    'training': ['theory_status', 'practical_status', 'video_status', 'internship_status'],
+    'english': ['beginner_status', 'foundation_status', 'intermediate_status', 'communication_status',
+                'interview_status', 'english_overall_status'],
+    'visa': ['checklist', 'job_offer', 'lmia', 'sa', 'sbs', 'nomination', 'visa'],
+}
+
+
+class ProgressScoring(models.Model):
+    _name = 'digi.progress.scoring'
+    _description = 'Quy Tắc Tính Điểm Tiến Độ'
+    _order = 'version desc'
+
+    name = fields.Char(string='Tên Phiên Bản', required=True)
+    version = fields.Integer(string='Phiên Bản', required=True, copy=False, default=1)
+    state = fields.Selection([
+        ('draft', 'Nháp'),
+        ('active', 'Đang Áp Dụng'),
+        ('archived', 'Lưu Trữ')
+    ], string='Trạng Thái', default='draft', required=True, copy=False)
+    date_activated = fields.Datetime(string='Ngày Áp Dụng', readonly=True, copy=False)
+    note = fields.Text(string='Ghi Chú')
+
+    # Overall progress weights
+    weight_training = fields.Float(string='Trọng Số Đào Tạo', default=0.4)
+    weight_english = fields.Float(string='Trọng Số Tiếng Anh', default=0.3)
+    weight_visa = fields.Float(string='Trọng Số Visa', default=0.3)
+
+    line_ids = fields.One2many('digi.progress.scoring.line', 'scoring_id', string='Bảng Điểm', copy=True)
+
+    _sql_constraints = [
+        ('version_unique', 'UNIQUE(version)', 'Số phiên bản phải là duy nhất!')
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ProgressScoring, self).create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super(ProgressScoring, self).write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        if 'active' in self.mapped('state'):
+            raise UserError(_('Không thể xóa phiên bản đang áp dụng.'))
+        result = super(ProgressScoring, self).unlink()
+        self.clear_caches()
+        return result
+
+    @api.model
+    def _create_default_version(self):
+        """Create version 1 from DEFAULT_SCORING if no version exists yet"""
+        if self.search_count([]):
+            return self.browse()
+        lines = []
+        for component, rules in DEFAULT_SCORING['components'].items():
+            for field_name, points_by_value in rules:
+                for value, points in points_by_value.items():
+                    lines.append((0, 0, {
+                        'component': component,
+                        'field_name': field_name,
+                        'value': value,
+                        'points': points,
+                    }))
+        weights = DEFAULT_SCORING['weights']
+        return self.create({
+            'name': _('Mặc Định'),
+            'version': 1,
+            'state': 'active',
+            'date_activated': fields.Datetime.now(),
+            'weight_training': weights['training'],
+            'weight_english': weights['english'],
+            'weight_visa': weights['visa'],
+            'line_ids': lines,
+        })
+
+    @api.model
+    @tools.ormcache()
+    def _get_scoring_table(self):
+        """Return the active scoring rules as a lookup table.
+
+        ``{'weights': {component: weight}, 'components': {component: ((field, {value: points}), ...)}}``
+        Callers must not mutate the result, it is shared through the cache.
+        """
+        scoring = self.sudo().search([('state', '=', 'active')], limit=1)
+        if not scoring:
+            return DEFAULT_SCORING
+        components = {component: {} for component in COMPONENT_COLUMNS}
+        for line in scoring.line_ids:
+            components[line.component].setdefault(line.field_name, {})[line.value] = line.points
+        return {
+            'weights': {
+                'training': scoring.weight_training,
+                'english': scoring.weight_english,
+                'visa': scoring.weight_visa,
+            },
+            'components': {
+                component: tuple(sorted(rules.items()))
+                for component, rules in components.items()
+            },
+        }
+
+    @api.model
+    def _score(self, record, component, table=None):
+        """Evaluate one component for one customer record"""
+        table = table or self._get_scoring_table()
+        total = 0.0
+        for field_name, points_by_value in table['components'][component]:
+            total += points_by_value.get(str(record[field_name]), 0.0)
+        return min(total, SCORE_CAP)
+
+    @api.model
+    def _overall(self, training, english, visa, table=None):
+        weights = (table or self._get_scoring_table())['weights']
+        return training * weights['training'] + english * weights['english'] + visa * weights['visa']
+
+    @api.model
+    def _component_sql(self, component, table):
+        """Build the SQL expression equivalent to _score() for one component"""
+        Customer = self.env['digi.customer.record']
+        terms, params = [], []
+        for field_name, points_by_value in table['components'][component]:
+            field = Customer._fields[field_name]
+            whens = []
+            for value, points in sorted(points_by_value.items()):
+                whens.append('WHEN %s THEN %s')
+                params.extend([value == 'True' if field.type == 'boolean' else value, points])
+            if whens:
+                terms.append(f'(CASE "{field_name}" {" ".join(whens)} ELSE 0 END)')
+        if not terms:
+            return '0', []
+        return 'LEAST(%s, %%s)' % ' + '.join(terms), params + [SCORE_CAP]
+
+    @api.model
+    def recompute_all(self, chunk_size=5000):
+        """Rewrite the four stored percentages of every customer with chunked UPDATEs"""
+        table = self._get_scoring_table()
+        Customer = self.env['digi.customer.record']
+        Customer.flush()
+
+        sets, params, expressions = [], [], {}
+        for component, column in COMPONENT_COLUMNS.items():
+            expression, expression_params = self._component_sql(component, table)
+            expressions[component] = (expression, expression_params)
+            sets.append(f'"{column}" = {expression}')
+            params.extend(expression_params)
+
+        overall_terms = []
+        for component in COMPONENT_COLUMNS:
+            expression, expression_params = expressions[component]
+            overall_terms.append(f'%s * ({expression})')
+            params.extend([table['weights'][component]] + expression_params)
+        sets.append('"overall_progress_percentage" = %s' % ' + '.join(overall_terms))
+
+        self.env.cr.execute(f'SELECT id FROM "{Customer._table}" ORDER BY id')
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        query = f'UPDATE "{Customer._table}" SET {", ".join(sets)} WHERE id IN %s'
+        for chunk in split_every(chunk_size, ids):
+            self.env.cr.execute(query, params + [tuple(chunk)])
+
+        # No modified(): the UPDATE wrote overall as well, and no stored field depends on the four
+        # columns, so the ORM has nothing left to recompute. Their readers are refreshed here.
+        Customer.invalidate_cache(list(COMPONENT_COLUMNS.values()) + ['overall_progress_percentage'])
+        self.env['digi.dashboard.kpi'].rebuild()
+        # The UPDATEs keep write_date, so no report fingerprint sees the new percentages
+        self.env['digi.report.cache'].sudo().purge()
+        self.env['digi.dashboard']._touch()
+        _logger.info('Progress scoring: recomputed %d customers', len(ids))
+        return len(ids)
+
+    def action_activate(self):
+        """Make this version the active one and recompute every customer"""
+        self.ensure_one()
+        self.search([('state', '=', 'active'), ('id', '!=', self.id)]).write({'state': 'archived'})
+        self.write({'state': 'active', 'date_activated': fields.Datetime.now()})
+        self.recompute_all()
+
+    def action_new_version(self):
+        """Copy this version into a new draft"""
+        self.ensure_one()
+        last = self.search([], order='version desc', limit=1)
+        new = self.copy({'version': last.version + 1, 'name': _('%s (bản sao)') % self.name})
+        return {
+            'name': _('Quy Tắc Tính Điểm'),
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'view_mode': 'form',
+            'res_id': new.id,
+        }
+
+    def action_recompute_all(self):
+        self.recompute_all()
+
+
+class ProgressScoringLine(models.Model):
+    _name = 'digi.progress.scoring.line'
+    _description = 'Dòng Quy Tắc Tính Điểm'
+    _order = 'scoring_id, component, field_name, value'
+
+    scoring_id = fields.Many2one('digi.progress.scoring', string='Phiên Bản', required=True, ondelete='cascade')
+    component = fields.Selection([
+        ('training', 'Đào Tạo'),
+        ('english', 'Tiếng Anh'),
+        ('visa', 'Visa')
+    ], string='Thành Phần', required=True)
+    field_name = fields.Char(string='Trường', required=True)
+    value = fields.Char(string='Giá Trị', required=True)
+    points = fields.Float(string='Điểm', required=True)
+
+    _sql_constraints = [
+        ('rule_unique', 'UNIQUE(scoring_id, field_name, value)', 'Mỗi giá trị chỉ được tính điểm một lần!')
+    ]
+
+    @api.constrains('component', 'field_name')
+    def _check_field_name(self):
+        customer_fields = self.env['digi.customer.record']._fields
+        for line in self:
+            field = customer_fields.get(line.field_name)
+            if (not field or field.type not in ('selection', 'boolean')
+                    or line.field_name not in COMPONENT_FIELDS[line.component]):
+                raise ValidationError(_('Trường %s không hợp lệ cho bảng điểm.') % line.field_name)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super(ProgressScoringLine, self).create(vals_list)
+        self.clear_caches()
+        return lines
+
+    def write(self, vals):
+        result = super(ProgressScoringLine, self).write(vals)
+        self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super(ProgressScoringLine, self).unlink()
+        self.clear_caches()
+        return result
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLE = 'digi_progress_snapshot'
+LAST_TABLE = 'digi_progress_snapshot_last'
+BASELINE_PARAM = 'digi_customer_progress.progress_snapshot_baselines'
+# Snapshot column -> customer column; values are stored in hundredths of a percent
+SNAPSHOT_COLUMNS = {
+    'training': 'training_progress_percentage',
+    'english': 'english_progress_percentage',
+    'visa': 'visa_progress_percentage',
+    'overall': 'overall_progress_percentage',
+}
+
+
+class ProgressSnapshot(models.AbstractModel):
+    """Daily progress history of the customers, for trend and cohort charts.
+
+    ``digi_progress_snapshot`` is range-partitioned by month and holds one
+    narrow row (customer, day, four smallint values) per customer and per
+    day on which one of its progress values changed: the value of a
+    customer on any day is its latest row on or before that day. Each
+    monthly partition opens with a baseline row per customer carrying the
+    value of the month before, so that value is always found in the
+    partition of the day: as-of queries read one partition.
+    ``digi_progress_snapshot_last`` holds the latest row of each customer,
+    so that the daily job never reads the history.
+    """
+    _name = 'digi.progress.snapshot'
+    _description = 'Lịch Sử Tiến Độ Hằng Ngày'
+
+    def init(self):
+        columns = ', '.join('%s smallint NOT NULL' % name for name in SNAPSHOT_COLUMNS)
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+                customer_id integer NOT NULL,
+                snapshot_date date NOT NULL,
+                {columns},
+                PRIMARY KEY (customer_id, snapshot_date)
+            ) PARTITION BY RANGE (snapshot_date)
+        """)
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LAST_TABLE} (
+                customer_id integer PRIMARY KEY REFERENCES digi_customer_record(id) ON DELETE CASCADE,
+                snapshot_date date NOT NULL,
+                {columns}
+            )
+        """)
+        # History written before the baselines existed gets them once
+        params = self.env['ir.config_parameter'].sudo()
+        if not params.get_param(BASELINE_PARAM):
+            self.env.cr.execute(f'SELECT MIN(snapshot_date), MAX(snapshot_date) FROM {SNAPSHOT_TABLE}')
+            first, last = self.env.cr.fetchone()
+            if first:
+                self._open_months(first.replace(day=1), last)
+            params.set_param(BASELINE_PARAM, '1')
+
+    @api.model
+    def _ensure_partition(self, day):
+        """Create the monthly partition holding ``day`` if needed"""
+        start = day.replace(day=1)
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE}_{start.strftime('%Y_%m')}
+                PARTITION OF {SNAPSHOT_TABLE} FOR VALUES FROM (%s) TO (%s)
+        """, (start, start + relativedelta(months=1)))
+
+    @api.model
+    def _open_months(self, latest, day):
+        """Create the partitions of the months after ``latest`` up to ``day``, each with its baseline rows.
+
+        The baseline of a month is the latest row of each existing customer
+        in the month before, dated the 1st; months are opened in order, so
+        that row is found in the previous partition alone.
+        """
+        names = ', '.join(SNAPSHOT_COLUMNS)
+        start = latest.replace(day=1) + relativedelta(months=1)
+        while start <= day:
+            self._ensure_partition(start)
+            self.env.cr.execute(f"""
+                INSERT INTO {SNAPSHOT_TABLE} (customer_id, snapshot_date, {names})
+                SELECT DISTINCT ON (customer_id) customer_id, %(start)s, {names}
+                  FROM {SNAPSHOT_TABLE}
+                 WHERE snapshot_date >= %(previous)s AND snapshot_date < %(start)s
+                   AND customer_id IN (SELECT id FROM digi_customer_record)
+              ORDER BY customer_id, snapshot_date DESC
+                ON CONFLICT (customer_id, snapshot_date) DO NOTHING
+            """, {'start': start, 'previous': start - relativedelta(months=1)})
+            start += relativedelta(months=1)
+
+    @api.model
+    def take_snapshot(self, day=None):
+        """Record ``day`` for the active customers whose progress changed since their latest row.
+
+        One statement: the changed customers are inserted into the history
+        and into the latest-row table. Running it again on the same day
+        updates that day's rows. Returns the number of customers recorded.
+        """
+        day = fields.Date.to_date(day) or fields.Date.context_today(self)
+        self.env.cr.execute(f'SELECT MAX(snapshot_date) FROM {LAST_TABLE}')
+        latest = self.env.cr.fetchone()[0]
+        if latest and day < latest:
+            raise UserError(_('Đã có dữ liệu tiến độ đến ngày %s, không thể ghi cho ngày %s.') % (latest, day))
+        self.env['digi.customer.record'].flush(list(SNAPSHOT_COLUMNS.values()) + ['active'])
+        if latest:
+            self._open_months(latest, day)
+        self._ensure_partition(day)
+
+        names = ', '.join(SNAPSHOT_COLUMNS)
+        current = ', '.join('ROUND(COALESCE(c.%s, 0) * 100)::smallint AS %s' % (column, name)
+                            for name, column in SNAPSHOT_COLUMNS.items())
+        changed = ' OR '.join('l.%s <> n.%s' % (name, name) for name in SNAPSHOT_COLUMNS)
+        updates = ', '.join('%s = EXCLUDED.%s' % (name, name) for name in SNAPSHOT_COLUMNS)
+        self.env.cr.execute(f"""
+            WITH changed AS (
+                SELECT n.*
+                  FROM (SELECT c.id AS customer_id, {current} FROM digi_customer_record c WHERE c.active) AS n
+             LEFT JOIN {LAST_TABLE} l ON l.customer_id = n.customer_id
+                 WHERE l.customer_id IS NULL OR {changed}
+            ), history AS (
+                INSERT INTO {SNAPSHOT_TABLE} (customer_id, snapshot_date, {names})
+                SELECT customer_id, %(day)s, {names} FROM changed
+                ON CONFLICT (customer_id, snapshot_date) DO UPDATE SET {updates}
+            )
+            INSERT INTO {LAST_TABLE} (customer_id, snapshot_date, {names})
+            SELECT customer_id, %(day)s, {names} FROM changed
+            ON CONFLICT (customer_id) DO UPDATE SET snapshot_date = EXCLUDED.snapshot_date, {updates}
+        """, {'day': day})
+        recorded = self.env.cr.rowcount
+        if recorded:
+            self.env['digi.dashboard']._touch()
+        _logger.info('Progress snapshot of %s: %d customers recorded', day, recorded)
+        return recorded
+
+    @api.model
+    def _cron_take_snapshot(self):
+        self.take_snapshot()
+
+    @api.model
+    def _scope(self, domain):
+        """SQL selecting the ids of the customers in ``domain`` the user may read"""
+        Customer = self.env['digi.customer.record']
+        query = Customer._where_calc(domain or [])
+        Customer._apply_ir_rules(query, 'read')
+        return query.select('"%s".id' % Customer._table)
+
+    @api.model
+    def get_as_of(self, day, domain=None):
+        """Progress of the customers in ``domain`` as it was on ``day``
+
+        Returns ``{customer_id: {'training': %, 'english': %, 'visa': %, 'overall': %}}``;
+        customers without history on that day are left out. Thanks to the
+        baseline rows only the partition of ``day`` is read.
+        """
+        day = fields.Date.to_date(day)
+        scope_sql, scope_params = self._scope(domain)
+        self.env.cr.execute(f"""
+            SELECT DISTINCT ON (s.customer_id) s.customer_id, {', '.join('s.%s' % name for name in SNAPSHOT_COLUMNS)}
+              FROM {SNAPSHOT_TABLE} s
+             WHERE s.snapshot_date >= %s AND s.snapshot_date <= %s AND s.customer_id IN ({scope_sql})
+          ORDER BY s.customer_id, s.snapshot_date DESC
+        """, [day.replace(day=1), day] + list(scope_params))
+        return {
+            row[0]: {name: value / 100.0 for name, value in zip(SNAPSHOT_COLUMNS, row[1:])}
+            for row in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def get_cohort_curves(self, date_from, date_to, step_days=7, measure='overall', domain=None):
+        """Average ``measure`` of each contract-month cohort, every ``step_days`` from ``date_from`` to ``date_to``
+
+        Returns ``{cohort: [{'day', 'customers', 'average'}]}``, the cohort
+        being the first day of the contract month. The curve is built from
+        the rows of the period plus each customer's latest row before it,
+        found from the month of ``date_from`` on thanks to the baseline
+        rows: only the partitions of the period are read.
+        """
+        if measure not in SNAPSHOT_COLUMNS:
+            raise UserError(_('Chỉ số không hợp lệ: %s') % measure)
+        date_from, date_to = fields.Date.to_date(date_from), fields.Date.to_date(date_to)
+        scope_sql, scope_params = self._scope(domain)
+        self.env.cr.execute(f"""
+            WITH scope AS (
+                SELECT c.id, DATE_TRUNC('month', c.contract_date)::date AS cohort
+                  FROM digi_customer_record c
+                 WHERE c.id IN ({scope_sql})
+            ), points AS (
+                (SELECT DISTINCT ON (s.customer_id) s.customer_id, s.snapshot_date, s.{measure} AS value
+                   FROM {SNAPSHOT_TABLE} s
+                   JOIN scope ON scope.id = s.customer_id
+                  WHERE s.snapshot_date >= %s AND s.snapshot_date <= %s
+               ORDER BY s.customer_id, s.snapshot_date DESC)
+              UNION ALL
+                SELECT s.customer_id, s.snapshot_date, s.{measure}
+                  FROM {SNAPSHOT_TABLE} s
+                  JOIN scope ON scope.id = s.customer_id
+                 WHERE s.snapshot_date > %s AND s.snapshot_date <= %s
+            ), spans AS (
+                -- Each row holds from its day until the next row of the customer
+                SELECT customer_id, value, snapshot_date AS valid_from,
+                       LEAD(snapshot_date, 1, 'infinity'::date) OVER (PARTITION BY customer_id
+                                                                     ORDER BY snapshot_date) AS valid_to
+                  FROM points
+            )
+            SELECT scope.cohort, days.day::date, COUNT(*), AVG(spans.value) / 100.0
+              FROM GENERATE_SERIES(%s::date, %s::date, %s * INTERVAL '1 day') AS days(day)
+              JOIN spans ON spans.valid_from <= days.day AND days.day < spans.valid_to
+              JOIN scope ON scope.id = spans.customer_id
+          GROUP BY scope.cohort, days.day
+          ORDER BY scope.cohort, days.day
+        """, list(scope_params) + [date_from.replace(day=1), date_from, date_from, date_to, date_from, date_to,
+                                   max(int(step_days), 1)])
+        curves = {}
+        for cohort, day, customers, average in self.env.cr.fetchall():
+            curves.setdefault(fields.Date.to_string(cohort), []).append({
+                'day': fields.Date.to_string(day),
+                'customers': customers,
+                'average': round(float(average), 2),
+            })
+        return curves
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+
+from . import english_training, training_progress, visa_process
+
+_logger = logging.getLogger(__name__)
+
+
+def _plan_checks(sample):
+    """(model, domain) pairs of the hot filters, built from one sample customer"""
+    customer_id = sample['customer_id']
+    return [
+        ('digi.customer.record', []),
+        ('digi.customer.record', [('visa_status', '=', 'processing')]),
+        ('digi.customer.record', [('advisor_id', '=', sample['advisor_id'])]),
+        ('digi.customer.record', [('visa_type_id', '=', sample['visa_type_id'])]),
+        ('digi.customer.record', [('job_category_id', '=', sample['job_category_id'])]),
+        ('digi.customer.record', [('contract_date', '>=', sample['contract_date'])]),
+        ('digi.customer.access', [('access_key', '=', 'user:%s' % sample['advisor_user_id'])]),
+        ('digi.training.progress', [('customer_id', '=', customer_id)]),
+        ('digi.training.progress', [('customer_id', '=', customer_id),
+                                    ('status', 'in', training_progress.OPEN_STATUSES)]),
+        ('digi.english.training', [('customer_id', '=', customer_id)]),
+        ('digi.english.training', [('customer_id', '=', customer_id),
+                                   ('status', 'in', english_training.OPEN_STATUSES)]),
+        ('digi.english.test.score', [('customer_id', '=', customer_id)]),
+        ('digi.visa.process', [('customer_id', '=', customer_id)]),
+        ('digi.visa.process', [('customer_id', '=', customer_id),
+                               ('status', 'in', visa_process.OPEN_STATUSES)]),
+        ('digi.visa.document', [('visa_process_id', '=', sample['visa_process_id'])]),
+        ('digi.visa.process', [('missing_document_type_ids', '=', sample['document_type_id'])]),
+    ]
+
+
+class QueryPlanCheck(models.AbstractModel):
+    _name = 'digi.query.plan.check'
+    _description = 'Kiểm Tra Kế Hoạch Truy Vấn'
+
+    @api.model
+    def _get_sample(self):
+        self.env['digi.customer.record'].flush()
+        self.env.cr.execute("""
+            SELECT c.id, c.advisor_id, c.visa_type_id, c.job_category_id, c.contract_date,
+                   e.user_id, (SELECT MIN(v.id) FROM digi_visa_process v WHERE v.customer_id = c.id),
+                   (SELECT MIN(t.id) FROM digi_visa_document_type t)
+              FROM digi_customer_record c
+         LEFT JOIN hr_employee e ON e.id = c.advisor_id
+             WHERE c.active
+          ORDER BY c.advisor_id IS NULL, c.job_category_id IS NULL, c.id
+             LIMIT 1
+        """)
+        row = self.env.cr.fetchone()
+        if not row:
+            raise UserError(_('Cần có dữ liệu khách hàng để kiểm tra kế hoạch truy vấn.'))
+        keys = ['customer_id', 'advisor_id', 'visa_type_id', 'job_category_id', 'contract_date',
+                'advisor_user_id', 'visa_process_id', 'document_type_id']
+        return dict(zip(keys, row))
+
+    @api.model
+    def _seq_scans(self, plan, tables):
+        """Tables of ``tables`` read by a sequential scan anywhere in an EXPLAIN JSON plan"""
+        found = []
+        if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in tables:
+            found.append(plan['Relation Name'])
+        for child in plan.get('Plans', []):
+            found.extend(self._seq_scans(child, tables))
+        return found
+
+    @api.model
+    def check_query_plans(self, raise_on_failure=True, limit=80):
+        """EXPLAIN the module's hot domains and report the ones that need a sequential scan.
+
+        Sequential scans are disabled for the check, so the planner only falls
+        back to one when no index can serve the query; the result therefore
+        does not depend on the size of the dataset. Run by the module tests
+        (``tests/test_query_plans.py``), or from ``odoo shell`` after loading
+        data: ``env['digi.query.plan.check'].check_query_plans()``
+        """
+        checks = _plan_checks(self._get_sample())
+        tables = {self.env[model]._table for model, domain in checks}
+        failures = []
+        self.env.cr.execute('SET LOCAL enable_seqscan = off')
+        try:
+            for model, domain in checks:
+                Model = self.env[model].sudo()
+                query = Model._search(domain, limit=limit)
+                sql, params = query.select()
+                self.env.cr.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = self.env.cr.fetchone()[0][0]['Plan']
+                scans = self._seq_scans(plan, tables)
+                if scans:
+                    failures.append({'model': model, 'domain': domain, 'seq_scans': scans})
+                    _logger.warning('Sequential scan on %s for %s %s', ', '.join(scans), model, domain)
+        finally:
+            self.env.cr.execute('RESET enable_seqscan')
+        if failures and raise_on_failure:
+            raise UserError(_('Truy vấn cần quét tuần tự:\n%s') % '\n'.join(
+                '%s %s: %s' % (failure['model'], failure['domain'], ', '.join(failure['seq_scans']))
+                for failure in failures))
+        return failures
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from PyPDF2 import PdfFileMerger
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+REPORT_XMLID = 'digi_customer_progress.action_report_customer_progress'
+DEFAULT_WORKERS = 4
+# First key of the session advisory lock held while a job runs, the job id being the second
+RUN_LOCK_KEY = 20200
+# Files merged at once by the PyPDF2 fallback, which keeps its inputs open until it writes
+MERGE_FAN_IN = 32
+
+
+class ReportBatch(models.Model):
+    _name = 'digi.report.batch'
+    _description = 'Tác Vụ In Báo Cáo Hàng Loạt'
+    _order = 'create_date desc'
+
+    name = fields.Char(string='Tên', required=True, default=lambda self: _('Báo cáo tiến độ %s') % fields.Date.today())
+    state = fields.Selection([
+        ('draft', 'Nháp'),
+        ('queued', 'Chờ Xử Lý'),
+        ('running', 'Đang Chạy'),
+        ('done', 'Hoàn Thành'),
+        ('failed', 'Thất Bại')
+    ], string='Trạng Thái', default='draft', required=True, readonly=True)
+
+    output_format = fields.Selection([
+        ('zip', 'Tệp ZIP (mỗi khách hàng một PDF)'),
+        ('pdf', 'Một Tệp PDF Gộp')
+    ], string='Định Dạng', default='zip', required=True)
+    domain = fields.Char(string='Điều Kiện Khách Hàng', default="[('active', '=', True)]")
+    chunk_size = fields.Integer(string='Số Khách Hàng Mỗi Lô', default=50)
+
+    # Checkpoint: customers are printed by increasing id, committed with each chunk
+    last_customer_id = fields.Integer(string='Khách Hàng Cuối Đã In', readonly=True)
+    customer_count = fields.Integer(string='Tổng Số Khách Hàng', readonly=True)
+    customers_done = fields.Integer(string='Số Khách Hàng Đã In', readonly=True)
+    progress = fields.Float(string='Tiến Độ (%)', compute='_compute_progress')
+
+    attachment_id = fields.Many2one('ir.attachment', string='Tệp Kết Quả', readonly=True)
+    last_error = fields.Text(string='Lỗi Gần Nhất', readonly=True)
+    date_start = fields.Datetime(string='Bắt Đầu', readonly=True)
+    date_end = fields.Datetime(string='Kết Thúc', readonly=True)
+
+    @api.depends('customers_done', 'customer_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = 100.0 * job.customers_done / job.customer_count if job.customer_count else 0.0
+
+    @api.model
+    def _commit(self):
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.model
+    def _get_workers(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('digi_customer_progress.report_workers')
+        return max(int(value or DEFAULT_WORKERS), 1)
+
+    def _workdir(self):
+        """Spool directory of the job: one PDF per customer (ZIP) or per chunk (merged PDF)"""
+        self.ensure_one()
+        path = os.path.join(tools.config.filestore(self.env.cr.dbname), 'digi_report_batch', str(self.id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _print_pdf(self, report_id, path, bodies, header, footer, paperformat_args):
+        """Run wkhtmltopdf for one customer and spool the result; called from the worker threads"""
+        if getattr(threading.current_thread(), 'testing', False):
+            report = self.env['ir.actions.report'].browse(report_id)
+            pdf = report._run_wkhtmltopdf(bodies, header=header, footer=footer,
+                                          specific_paperformat_args=paperformat_args)
+        else:
+            with self.pool.cursor() as cr:
+                report = self.env(cr=cr)['ir.actions.report'].browse(report_id)
+                pdf = report._run_wkhtmltopdf(bodies, header=header, footer=footer,
+                                              specific_paperformat_args=paperformat_args)
+        with open(path, 'wb') as f:
+            f.write(pdf)
+        return path
+
+    def _render_chunk(self, report, customers, workdir):
+        """Render the HTML of a chunk from one prefetch, then run wkhtmltopdf on it in parallel.
+
+        Customers whose cached report is still current are copied from the render cache.
+        """
+        scope = self.env['digi.report.cache']._reader_scope()
+        Cache = self.env['digi.report.cache'].sudo()
+        fingerprints = Cache._fingerprints(customers.ids, scope)
+        cached = Cache.lookup(fingerprints)
+        values = self.env['report.%s' % report.report_name]._get_report_values(customers.ids)
+        paths, jobs, printed = [], [], {}
+        for sequence, customer in enumerate(customers, start=self.customers_done + 1):
+            path = os.path.join(workdir, '%07d_%s.pdf' % (sequence, customer.customer_code or customer.id))
+            paths.append(path)
+            if customer.id in cached:
+                with open(path, 'wb') as f:
+                    f.write(cached[customer.id])
+                continue
+            html = report._render_template(report.report_name, dict(values, doc_ids=customer.ids, docs=customer))
+            bodies, res_ids, header, footer, paperformat_args = report._prepare_html(html)
+            jobs.append((report.id, path, bodies, header, footer, paperformat_args))
+            printed[path] = customer.id
+        with ThreadPoolExecutor(max_workers=self._get_workers()) as executor:
+            list(executor.map(lambda job: self._print_pdf(*job), jobs))
+        for path, customer_id in printed.items():
+            with open(path, 'rb') as f:
+                Cache.store(customer_id, fingerprints[customer_id], f.read())
+        if self.output_format == 'pdf':
+            self._merge_pdfs(paths, os.path.join(workdir, 'chunk_%07d.pdf' % (self.customers_done + 1)))
+
+    @api.model
+    def _fold_pdfs(self, paths, target):
+        """Merge a few PDFs with PyPDF2, closing every input once written"""
+        with ExitStack() as stack:
+            merger = PdfFileMerger(strict=False)
+            for path in paths:
+                merger.append(stack.enter_context(open(path, 'rb')))
+            merger.write(target)
+            merger.close()
+        return target
+
+    @api.model
+    def _merge_pdfs(self, paths, target):
+        """Merge the PDFs at ``paths`` into ``target`` and delete them
+
+        qpdf copies the pages file by file, with bounded memory and few open
+        files. Without it PyPDF2 merges ``MERGE_FAN_IN`` files at a time into
+        intermediate files, level by level: the open files stay bounded, but
+        the last level holds the pages of the whole output. The inputs are
+        only deleted once ``target`` is written, so a failed merge can be
+        run again.
+        """
+        try:
+            qpdf = tools.find_in_path('qpdf')
+        except IOError:
+            qpdf = None
+        if qpdf:
+            # One input per line: thousands of paths do not fit a command line
+            listing = target + '.pages'
+            with open(listing, 'w') as f:
+                f.write('\n'.join(paths))
+            process = subprocess.run([qpdf, '--empty', '--pages', '@%s' % listing, '--', target],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # Exit code 3 means the output was written with warnings
+            if process.returncode not in (0, 3):
+                raise UserError(_('Không thể gộp tệp PDF: %s') % process.stderr.decode(errors='replace'))
+            for path in paths + [listing]:
+                os.remove(path)
+            return target
+        inputs, level = list(paths), 0
+        while len(paths) > MERGE_FAN_IN:
+            level += 1
+            paths = [self._fold_pdfs(group, '%s.%d_%05d' % (target, level, index))
+                     for index, group in enumerate(split_every(MERGE_FAN_IN, paths))]
+            inputs += paths
+        self._fold_pdfs(paths, target)
+        for path in inputs:
+            os.remove(path)
+        return target
+
+    def _attach_file(self, path, file_name, mimetype):
+        """Attach the file at ``path`` to the job, moving it into the filestore without loading it"""
+        self.ensure_one()
+        Attachment = self.env['ir.attachment']
+        vals = {'name': file_name, 'mimetype': mimetype, 'res_model': self._name, 'res_id': self.id}
+        if Attachment._storage() != 'file':
+            # Database storage needs the content in memory
+            with open(path, 'rb') as f:
+                return Attachment.create(dict(vals, raw=f.read()))
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        checksum = sha.hexdigest()
+        store_fname = '%s/%s' % (checksum[:2], checksum)
+        full_path = Attachment._full_path(store_fname)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            shutil.move(path, full_path)
+            # Collected by the filestore GC if this transaction is rolled back
+            Attachment._mark_for_gc(store_fname)
+        return Attachment.create(dict(vals, store_fname=store_fname, checksum=checksum,
+                                      file_size=os.path.getsize(full_path)))
+
+    def _assemble(self, workdir):
+        """Stream the spooled files into the final ZIP or PDF and attach it to the job
+
+        The ZIP is written file by file and the result is moved into the
+        filestore, so memory stays bounded. The chunk PDFs are merged by
+        ``_merge_pdfs``, bounded in memory when qpdf is installed.
+        """
+        self.ensure_one()
+        if self.output_format == 'zip':
+            file_name, mimetype = '%s.zip' % self.name, 'application/zip'
+            target = os.path.join(workdir, 'output.zip')
+            with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(n for n in os.listdir(workdir) if n[0].isdigit()):
+                    archive.write(os.path.join(workdir, name), name.split('_', 1)[1])
+        else:
+            file_name, mimetype = '%s.pdf' % self.name, 'application/pdf'
+            target = os.path.join(workdir, 'output.pdf')
+            self._merge_pdfs([os.path.join(workdir, name)
+                              for name in sorted(n for n in os.listdir(workdir) if n.startswith('chunk_'))], target)
+        self.attachment_id = self._attach_file(target, file_name, mimetype)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def _lock(self):
+        """Take the run lock of the job; it outlives the chunk commits and dies with the connection"""
+        self.env.cr.execute('SELECT pg_try_advisory_lock(%s, %s)', (RUN_LOCK_KEY, self.id))
+        return self.env.cr.fetchone()[0]
+
+    def _unlock(self):
+        self.env.cr.execute('SELECT pg_advisory_unlock(%s, %s)', (RUN_LOCK_KEY, self.id))
+
+    def _run(self):
+        """Run the job unless another worker is running it; see ``_run_locked``"""
+        self.ensure_one()
+        if not self._lock():
+            _logger.info('Report batch %s is already running in another worker', self.id)
+            return False
+        try:
+            return self._run_locked()
+        finally:
+            self._unlock()
+
+    def _run_locked(self):
+        """Print the remaining customers chunk by chunk, committing the checkpoint after each one"""
+        self.ensure_one()
+        report = self.env.ref(REPORT_XMLID)
+        Customer = self.env['digi.customer.record']
+        domain = safe_eval(self.domain or '[]')
+        vals = {'state': 'running', 'date_start': self.date_start or fields.Datetime.now(), 'last_error': False}
+        if not self.customer_count:
+            vals['customer_count'] = Customer.search_count(domain)
+        self.write(vals)
+        self._commit()
+        try:
+            workdir = self._workdir()
+            chunk_size = max(self.chunk_size, 1)
+            while True:
+                customers = Customer.search(domain + [('id', '>', self.last_customer_id)], order='id', limit=chunk_size)
+                if not customers:
+                    break
+                self._render_chunk(report, customers, workdir)
+                self.write({
+                    'last_customer_id': customers[-1].id,
+                    'customers_done': self.customers_done + len(customers),
+                })
+                self._commit()
+                # The prefetched chunk is not needed any more
+                self.env['base'].invalidate_cache()
+                _logger.info('Report batch %s: %d/%d customers printed', self.id, self.customers_done,
+                             self.customer_count)
+            self._assemble(workdir)
+        except Exception as e:
+            self.env.cr.rollback()
+            self.invalidate_cache()
+            self.write({'state': 'failed', 'last_error': str(e)})
+            self._commit()
+            _logger.exception('Report batch %s failed after %d customers', self.id, self.customers_done)
+            return False
+        self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+        self._commit()
+        return True
+
+    def action_queue(self):
+        self.filtered(lambda job: job.state in ('draft', 'failed')).write({'state': 'queued'})
+
+    def action_run(self):
+        """Run the job now, resuming from the last committed chunk"""
+        for job in self:
+            if job.state == 'done':
+                continue
+            job._run()
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % self.attachment_id.id,
+            'target': 'self',
+        }
+
+    def unlink(self):
+        for job in self:
+            shutil.rmtree(os.path.join(tools.config.filestore(self.env.cr.dbname), 'digi_report_batch',
+                                       str(job.id)), ignore_errors=True)
+        return super(ReportBatch, self).unlink()
+
+    @api.model
+    def _cron_process_queue(self):
+        """Run the queued jobs, and resume the running ones whose worker died (their run lock is free)"""
+        for job in self.search([('state', 'in', ('queued', 'running'))], order='create_date'):
+            job._run()
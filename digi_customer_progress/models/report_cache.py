@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+import logging
+
+from odoo import models, fields, api
+
+from ..reports.customer_progress_report import CUSTOMER_FIELDS, REPORT_CHILDREN
+
+_logger = logging.getLogger(__name__)
+
+REPORT_NAME = 'digi_customer_progress.customer_progress_template'
+TEMPLATE_KEYS = 'digi_customer_progress.customer_progress%'
+DEFAULT_MAX_MB = 200
+DEFAULT_MAX_DAYS = 30
+
+# Children printed on the progress report; their row count and latest write
+# date are folded into the fingerprint, so added, edited and removed rows all
+# change it.
+FINGERPRINT_TABLES = ['digi_training_progress', 'digi_english_training', 'digi_visa_process',
+                      'digi_english_test_score']
+
+# Fields printed on the report, per model: writing other fields keeps the cached entry
+PRINTED_FIELDS = {model: set(field_names) for model, order, field_names in REPORT_CHILDREN.values()}
+PRINTED_FIELDS['digi.customer.record'] = set(CUSTOMER_FIELDS) | {'active'}
+
+
+class ReportCacheMixin(models.AbstractModel):
+    """Drop the cached progress report of the customers a write touches
+
+    Staleness is decided by the fingerprint, which covers every write;
+    this only frees the entries early, on writes of printed fields.
+    """
+    _name = 'digi.report.cache.mixin'
+    _description = 'Làm Mới Bộ Đệm Báo Cáo'
+
+    # Field pointing to the customer; False on the customer model itself
+    _report_cache_customer_field = 'customer_id'
+
+    def _report_cache_customer_ids(self):
+        if not self._report_cache_customer_field:
+            return self.ids
+        return self.mapped(self._report_cache_customer_field).ids
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ReportCacheMixin, self).create(vals_list)
+        self.env['digi.report.cache'].sudo().invalidate(records._report_cache_customer_ids())
+        return records
+
+    def write(self, vals):
+        if PRINTED_FIELDS.get(self._name, set()).isdisjoint(vals):
+            return super(ReportCacheMixin, self).write(vals)
+        customer_ids = self._report_cache_customer_ids()
+        result = super(ReportCacheMixin, self).write(vals)
+        self.env['digi.report.cache'].sudo().invalidate(customer_ids + self._report_cache_customer_ids())
+        return result
+
+    def unlink(self):
+        customer_ids = self._report_cache_customer_ids()
+        result = super(ReportCacheMixin, self).unlink()
+        self.env['digi.report.cache'].sudo().invalidate(customer_ids)
+        return result
+
+
+class ReportCache(models.Model):
+    _name = 'digi.report.cache'
+    _description = 'Bộ Đệm Báo Cáo Tiến Độ'
+    _order = 'last_access desc'
+    _log_access = False
+
+    customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True,
+                                  index=True, ondelete='cascade')
+    fingerprint = fields.Char(string='Dấu Vân Tay', required=True)
+    pdf_data = fields.Binary(string='PDF', attachment=False)
+    size = fields.Integer(string='Dung Lượng (Byte)')
+    hit_count = fields.Integer(string='Số Lần Dùng Lại')
+    created_at = fields.Datetime(string='Tạo Lúc')
+    last_access = fields.Datetime(string='Truy Cập Lần Cuối', index=True)
+
+    _sql_constraints = [
+        ('customer_unique', 'UNIQUE(customer_id, fingerprint)',
+         'Mỗi khách hàng chỉ có một báo cáo trong bộ đệm cho mỗi dấu vân tay!')
+    ]
+
+    @api.model
+    def _reader_scope(self):
+        """Key of the printed child rows the current user may read
+
+        A print only shows the child rows the printing user's access rights
+        and record rules let through, so an entry is served back only to
+        users with the same rights and rules. Call it without sudo.
+        """
+        if self.env.su:
+            return 'su'
+        scope = []
+        for model, order, field_names in REPORT_CHILDREN.values():
+            if self.env[model].check_access_rights('read', raise_exception=False):
+                scope.append((model, self.env['ir.rule']._compute_domain(model, 'read')))
+            else:
+                scope.append((model, False))
+        return hashlib.sha1(repr(scope).encode()).hexdigest()
+
+    @api.model
+    def _fingerprints(self, customer_ids, scope):
+        """{customer_id: fingerprint} of the data, reader scope, language and template a print would render"""
+        if not customer_ids:
+            return {}
+        self.env['digi.customer.record'].flush()
+        for model in ('digi.training.progress', 'digi.english.training', 'digi.visa.process',
+                      'digi.english.test.score'):
+            self.env[model].flush()
+        children = ', '.join(
+            f"(SELECT COUNT(*) || '@' || COALESCE(MAX(write_date)::text, '') FROM {table} WHERE customer_id = c.id)"
+            for table in FINGERPRINT_TABLES)
+        self.env.cr.execute(f"""
+            SELECT c.id, concat_ws('|', c.write_date, {children})
+              FROM digi_customer_record c
+             WHERE c.id IN %s
+        """, (tuple(customer_ids),))
+        rows = self.env.cr.fetchall()
+        # Editing the report templates changes every fingerprint
+        self.env.cr.execute('SELECT MAX(write_date) FROM ir_ui_view WHERE key LIKE %s', (TEMPLATE_KEYS,))
+        context = '|'.join(str(value) for value in (self.env.cr.fetchone()[0], scope, self.env.lang,
+                                                     self.env.company.id))
+        return {
+            customer_id: hashlib.sha1(('%s|%s' % (data, context)).encode()).hexdigest()
+            for customer_id, data in rows
+        }
+
+    @api.model
+    def lookup(self, fingerprints):
+        """{customer_id: pdf bytes} of the cached reports still matching ``fingerprints``"""
+        if not fingerprints:
+            return {}
+        hits = self.search([('customer_id', 'in', list(fingerprints)),
+                            ('fingerprint', 'in', list(fingerprints.values()))])
+        hits = hits.filtered(lambda entry: entry.fingerprint == fingerprints[entry.customer_id.id])
+        if hits:
+            self.env.cr.execute(f"""
+                UPDATE "{self._table}"
+                   SET hit_count = hit_count + 1, last_access = NOW() AT TIME ZONE 'UTC'
+                 WHERE id IN %s
+            """, (tuple(hits.ids),))
+        self.env['digi.report.cache.stat']._count(hits=len(hits), misses=len(fingerprints) - len(hits))
+        return {entry.customer_id.id: base64.b64decode(entry.pdf_data) for entry in hits}
+
+    @api.model
+    def store(self, customer_id, fingerprint, pdf):
+        now = fields.Datetime.now()
+        vals = {
+            'fingerprint': fingerprint,
+            'pdf_data': base64.b64encode(pdf),
+            'size': len(pdf),
+            'hit_count': 0,
+            'created_at': now,
+            'last_access': now,
+        }
+        try:
+            with self.env.cr.savepoint():
+                entry = self.search([('customer_id', '=', customer_id), ('fingerprint', '=', fingerprint)])
+                if entry:
+                    entry.write(vals)
+                else:
+                    self.create(dict(vals, customer_id=customer_id))
+        except Exception:
+            # Stored concurrently by another print: keep that one
+            _logger.debug('Report cache entry of customer %s not stored', customer_id, exc_info=True)
+
+    @api.model
+    def _invalidate_entries(self):
+        """Forget the cached values of this model only, after SQL changes"""
+        self.invalidate_cache(list(self._fields))
+
+    @api.model
+    def invalidate(self, customer_ids):
+        """Drop the entries of ``customer_ids``; SQL updates of printed values bypass the fingerprint and must call it"""
+        if customer_ids:
+            self.env.cr.execute(f'DELETE FROM "{self._table}" WHERE customer_id IN %s', (tuple(set(customer_ids)),))
+            if self.env.cr.rowcount:
+                self._invalidate_entries()
+
+    @api.model
+    def purge(self):
+        """Drop every entry, after SQL updates of the printed values of all customers"""
+        self.env.cr.execute(f'DELETE FROM "{self._table}"')
+        if self.env.cr.rowcount:
+            self._invalidate_entries()
+
+    @api.model
+    def _get_limits(self):
+        params = self.env['ir.config_parameter'].sudo()
+        max_mb = int(params.get_param('digi_customer_progress.report_cache_max_mb') or DEFAULT_MAX_MB)
+        max_days = int(params.get_param('digi_customer_progress.report_cache_max_days') or DEFAULT_MAX_DAYS)
+        return max_mb * 1024 * 1024, max_days
+
+    @api.model
+    def evict(self):
+        """Drop the entries unused for ``max_days``, then the least recently used ones beyond ``max_mb``"""
+        max_bytes, max_days = self._get_limits()
+        self.flush()
+        self.env.cr.execute(f"""
+            DELETE FROM "{self._table}"
+             WHERE last_access < (NOW() AT TIME ZONE 'UTC') - %s * INTERVAL '1 day'
+        """, (max_days,))
+        expired = self.env.cr.rowcount
+        self.env.cr.execute(f"""
+            DELETE FROM "{self._table}"
+             WHERE id IN (SELECT id
+                            FROM (SELECT id, SUM(size) OVER (ORDER BY last_access DESC, id DESC) AS used
+                                    FROM "{self._table}") AS entries
+                           WHERE used > %s)
+        """, (max_bytes,))
+        evicted = expired + self.env.cr.rowcount
+        if evicted:
+            self._invalidate_entries()
+        self.env['digi.report.cache.stat']._count(evictions=evicted)
+        return evicted
+
+    @api.model
+    def get_metrics(self, days=30):
+        """Cache size and hit ratio of the last ``days`` days, for administrators"""
+        self.flush()
+        self.env.cr.execute(f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM "{self._table}"')
+        entries, size = self.env.cr.fetchone()
+        stats = self.env['digi.report.cache.stat'].search_read(
+            [('day', '>=', fields.Date.subtract(fields.Date.today(), days=days))], ['day', 'hits', 'misses', 'evictions'])
+        hits = sum(stat['hits'] for stat in stats)
+        misses = sum(stat['misses'] for stat in stats)
+        return {
+            'entries': entries,
+            'size_mb': round(size / 1024.0 / 1024.0, 2),
+            'hits': hits,
+            'misses': misses,
+            'evictions': sum(stat['evictions'] for stat in stats),
+            'hit_ratio': round(100.0 * hits / (hits + misses), 1) if hits + misses else 0.0,
+            'daily': stats,
+        }
+
+    @api.model
+    def _cron_evict(self):
+        self.evict()
+
+
+class ReportCacheStat(models.Model):
+    _name = 'digi.report.cache.stat'
+    _description = 'Thống Kê Bộ Đệm Báo Cáo'
+    _order = 'day desc'
+    _log_access = False
+
+    day = fields.Date(string='Ngày', required=True, readonly=True)
+    hits = fields.Integer(string='Dùng Lại', readonly=True)
+    misses = fields.Integer(string='Phải In Mới', readonly=True)
+    evictions = fields.Integer(string='Bị Loại Bỏ', readonly=True)
+    hit_ratio = fields.Float(string='Tỷ Lệ Dùng Lại (%)', compute='_compute_hit_ratio')
+
+    _sql_constraints = [
+        ('day_unique', 'UNIQUE(day)', 'Mỗi ngày chỉ có một dòng thống kê!')
+    ]
+
+    @api.depends('hits', 'misses')
+    def _compute_hit_ratio(self):
+        for stat in self:
+            total = stat.hits + stat.misses
+            stat.hit_ratio = 100.0 * stat.hits / total if total else 0.0
+
+    @api.model
+    def _count(self, hits=0, misses=0, evictions=0):
+        if not (hits or misses or evictions):
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO "{self._table}" (day, hits, misses, evictions)
+            VALUES (CURRENT_DATE, %s, %s, %s)
+            ON CONFLICT (day) DO UPDATE
+               SET hits = "{self._table}".hits + EXCLUDED.hits,
+                   misses = "{self._table}".misses + EXCLUDED.misses,
+                   evictions = "{self._table}".evictions + EXCLUDED.evictions
+        """, (hits, misses, evictions))
+        self.invalidate_cache(['hits', 'misses', 'evictions', 'hit_ratio'])
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class TimelineMixin(models.AbstractModel):
+    """Windowed loading of Gantt bars.
+
+    Bars run from ``_timeline_date_start`` to the first set field of
+    ``_timeline_date_stop``; a GiST index on that date range lets a window
+    query read only the bars it shows.
+    """
+    _name = 'digi.timeline.mixin'
+    _description = 'Dòng Thời Gian Theo Cửa Sổ'
+
+    _timeline_date_start = 'start_date'
+    _timeline_date_stop = []
+    _timeline_group_field = 'customer_id'
+    _timeline_fields = []
+
+    def _timeline_range_sql(self, alias):
+        """Date range of a bar; a missing or earlier stop collapses to the start day"""
+        start = f'{alias}."{self._timeline_date_start}"'
+        stop = ', '.join(f'{alias}."{name}"' for name in self._timeline_date_stop + [self._timeline_date_start])
+        return f"daterange({start}, GREATEST({start}, COALESCE({stop})), '[]')"
+
+    def init(self):
+        super(TimelineMixin, self).init()
+        if self._abstract:
+            return
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS {self._table}_timeline_range_idx
+                ON "{self._table}" USING gist ({self._timeline_range_sql(f'"{self._table}"')})
+             WHERE "{self._timeline_date_start}" IS NOT NULL
+        """)
+
+    @api.model
+    def _timeline_query(self, date_from, date_to, domain):
+        """Search query of the bars intersecting [date_from, date_to], with record rules applied"""
+        self.flush([self._timeline_date_start, self._timeline_group_field] + self._timeline_date_stop)
+        query = self._where_calc(domain or [])
+        self._apply_ir_rules(query, 'read')
+        table = f'"{self._table}"'
+        query.add_where(f'{table}."{self._timeline_date_start}" IS NOT NULL')
+        query.add_where(f"{self._timeline_range_sql(table)} && daterange(%s, %s, '[]')", [date_from, date_to])
+        return query
+
+    @api.model
+    def get_timeline_window(self, date_from, date_to, domain=None, offset=0, limit=50, exclude_ids=None):
+        """Rows and bars of one visible window of the timeline.
+
+        Only groups (customers by default) with a bar in [date_from, date_to]
+        are paged with ``offset``/``limit``; for those groups only the bars in
+        the window are read, and only the columns in ``_timeline_fields``.
+        When scrolling, pass the ids already loaded as ``exclude_ids``.
+        """
+        date_from, date_to = fields.Date.to_date(date_from), fields.Date.to_date(date_to)
+        group_field = self._timeline_group_field
+        Group = self.env[self._fields[group_field].comodel_name]
+        query = self._timeline_query(date_from, date_to, domain)
+        groups_sql, groups_params = query.select(f'DISTINCT "{self._table}"."{group_field}"')
+
+        self.env.cr.execute(f'SELECT COUNT(*) FROM ({groups_sql}) AS g', groups_params)
+        group_count = self.env.cr.fetchone()[0]
+        group_order = Group._generate_order_by(None, Group._where_calc([])).replace('ORDER BY ', '')
+        self.env.cr.execute(f"""
+            SELECT g.{group_field}
+              FROM ({groups_sql}) AS g
+              JOIN "{Group._table}" ON "{Group._table}".id = g.{group_field}
+          ORDER BY {group_order}
+             LIMIT %s OFFSET %s
+        """, groups_params + [limit, offset])
+        group_ids = [row[0] for row in self.env.cr.fetchall()]
+
+        records = []
+        if group_ids:
+            query.add_where(f'"{self._table}"."{group_field}" IN %s', [tuple(group_ids)])
+            if exclude_ids:
+                query.add_where(f'"{self._table}".id NOT IN %s', [tuple(exclude_ids)])
+            bars_sql, bars_params = query.select(f'"{self._table}".id')
+            self.env.cr.execute(bars_sql, bars_params)
+            bar_ids = [row[0] for row in self.env.cr.fetchall()]
+            records = self.browse(bar_ids).read(self._timeline_fields)
+
+        return {
+            'groups': [{'id': group_id, 'name': name} for group_id, name in Group.sudo().browse(group_ids).name_get()],
+            'group_count': group_count,
+            'records': records,
+            'window': [fields.Date.to_string(date_from), fields.Date.to_string(date_to)],
+        }
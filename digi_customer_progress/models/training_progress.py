@@ -1,14 +1,33 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from collections import defaultdict
 from datetime import datetime, timedelta
 
+from .job_category_analytics import TRAINING_FIELDS as ANALYTICS_FIELDS
+
+# Customer status field mirrored by each training stage
+STAGE_STATUS_FIELDS = {
+    'theory': 'theory_status',
+    'practical': 'practical_status',
+    'video': 'video_status',
+    'internship': 'internship_status',
+}
+
+# Stages still to be worked on, covered by a partial index
+OPEN_STATUSES = ['not_started', 'in_progress', 'waiting', 'failed']
+
 
 class TrainingProgress(models.Model):
     _name = 'digi.training.progress'
     _description = 'Tiến Độ Đào Tạo'
     _order = 'customer_id, stage_sequence'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['digi.bulk.tracking.mixin', 'mail.thread', 'mail.activity.mixin', 'digi.attachment.mixin',
+                'digi.timeline.mixin', 'digi.report.cache.mixin']
+    _timeline_date_stop = ['actual_end_date', 'planned_end_date']
+    _timeline_fields = ['customer_id', 'stage', 'status', 'progress_percentage', 'start_date',
+                        'planned_end_date', 'actual_end_date', 'trainer_id']
     
     # Link to customer
     customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True, ondelete='cascade')
@@ -82,9 +101,6 @@ class TrainingProgress(models.Model):
     feedback = fields.Html(string='Phản Hồi Từ Giảng Viên')
     student_feedback = fields.Html(string='Phản Hồi Từ Học Viên')
     
-    # Attachments
-    attachment_count = fields.Integer(string='Số Tài Liệu', compute='_compute_attachment_count')
-    
     # Dependencies
     depends_on_ids = fields.Many2many(
         'digi.training.progress', 
@@ -102,7 +118,19 @@ class TrainingProgress(models.Model):
         string='Đang Chặn'
     )
     
-    can_start = fields.Boolean(string='Có Thể Bắt Đầu', compute='_compute_can_start')
+    can_start = fields.Boolean(string='Có Thể Bắt Đầu', compute='_compute_can_start', store=True, index=True)
+    
+    def init(self):
+        super(TrainingProgress, self).init()
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_training_progress_customer_sequence_idx
+                ON "{self._table}" (customer_id, stage_sequence)
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_training_progress_open_idx
+                ON "{self._table}" (customer_id, stage_sequence)
+             WHERE status IN %s
+        """, (tuple(OPEN_STATUSES),))
     
     @api.depends('stage')
     def _compute_stage_sequence(self):
@@ -145,57 +173,49 @@ class TrainingProgress(models.Model):
             else:
                 record.can_start = True
     
-    def _compute_attachment_count(self):
+    def write(self, vals):
+        result = super(TrainingProgress, self).write(vals)
+        if any(name in vals for name in ANALYTICS_FIELDS):
+            self.env['digi.job.category.analytics'].invalidate()
+        return result
+    
+    def _sync_customer_status(self, status):
+        """Mirror the stage status on the customers, one write per distinct value"""
+        vals_by_customer = defaultdict(dict)
         for record in self:
-            record.attachment_count = self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', record.id)
-            ])
+            field_name = STAGE_STATUS_FIELDS.get(record.stage)
+            if field_name:
+                vals_by_customer[record.customer_id.id][field_name] = status
+        self.env['digi.customer.record']._write_grouped(vals_by_customer)
     
     def action_start(self):
-        """Start the training stage"""
-        self.ensure_one()
-        if not self.can_start:
-            raise UserError(_('Không thể bắt đầu vì chưa hoàn thành các điều kiện tiên quyết.'))
+        """Start the training stages"""
+        blocked = self.filtered(lambda r: not r.can_start)
+        if blocked:
+            raise UserError(_('Không thể bắt đầu vì chưa hoàn thành các điều kiện tiên quyết: %s')
+                            % ', '.join(blocked.mapped('display_name')))
         
         self.write({
             'status': 'in_progress',
             'start_date': fields.Date.today(),
             'progress_percentage': 10
         })
-        
-        # Update customer record
-        if self.stage == 'theory':
-            self.customer_id.theory_status = 'in_progress'
-        elif self.stage == 'practical':
-            self.customer_id.practical_status = 'in_progress'
-        elif self.stage == 'video':
-            self.customer_id.video_status = 'in_progress'
-        elif self.stage == 'internship':
-            self.customer_id.internship_status = 'in_progress'
+        self._sync_customer_status('in_progress')
     
     def action_complete(self):
-        """Complete the training stage"""
-        self.ensure_one()
+        """Complete the training stages"""
         self.write({
             'status': 'completed',
             'actual_end_date': fields.Date.today(),
             'progress_percentage': 100
         })
-        
-        # Update customer record
-        if self.stage == 'theory':
-            self.customer_id.theory_status = 'completed'
-        elif self.stage == 'practical':
-            self.customer_id.practical_status = 'completed'
-        elif self.stage == 'video':
-            self.customer_id.video_status = 'completed'
-        elif self.stage == 'internship':
-            self.customer_id.internship_status = 'completed'
+        self._sync_customer_status('completed')
+        stages = dict(self._fields['stage']._description_selection(self.env))
+        self.env['digi.notification.event'].sudo().record(
+            'training_completed', self, {record.id: stages.get(record.stage) for record in self})
     
     def action_reset(self):
-        """Reset the training stage"""
-        self.ensure_one()
+        """Reset the training stages"""
         self.write({
             'status': 'not_started',
             'start_date': False,
@@ -219,53 +239,81 @@ class TrainingProgress(models.Model):
         }
     
     @api.model
-    def create_training_stages_for_customer(self, customer_id):
-        """Create all training stages for a new customer"""
-        customer = self.env['digi.customer.record'].browse(customer_id)
+    def _prepare_training_stages(self, customer):
+        """Values of the four training stages of one customer, in chain order"""
         job_category = customer.job_category_id
-        
-        stages_data = [
+        return [
             {
-                'customer_id': customer_id,
+                'customer_id': customer.id,
                 'stage': 'theory',
                 'planned_hours': job_category.theory_hours if job_category else 40,
                 'pass_criteria': 5.0,
                 'assessment_method': 'test'
             },
             {
-                'customer_id': customer_id,
+                'customer_id': customer.id,
                 'stage': 'practical',
                 'planned_hours': job_category.practical_hours if job_category else 120,
                 'pass_criteria': 6.0,
                 'assessment_method': 'practical'
             },
             {
-                'customer_id': customer_id,
+                'customer_id': customer.id,
                 'stage': 'video',
                 'planned_hours': job_category.video_hours if job_category else 20,
                 'pass_criteria': 7.0,
                 'assessment_method': 'presentation'
             },
             {
-                'customer_id': customer_id,
+                'customer_id': customer.id,
                 'stage': 'internship',
                 'planned_hours': (job_category.internship_weeks * 40) if job_category else 160,
                 'pass_criteria': 6.0,
                 'assessment_method': 'portfolio'
             }
         ]
+    
+    @api.model
+    def _link_stage_chains(self, stages):
+        """Make each stage depend on the previous stage of the same customer, in one INSERT"""
+        field = self._fields['depends_on_ids']
+        previous = {}
+        dependent_ids, prerequisite_ids = [], []
+        for stage in stages:
+            prerequisite_id = previous.get(stage.customer_id.id)
+            if prerequisite_id:
+                dependent_ids.append(stage.id)
+                prerequisite_ids.append(prerequisite_id)
+            previous[stage.customer_id.id] = stage.id
+        if not dependent_ids:
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO "{field.relation}" ("{field.column1}", "{field.column2}")
+            SELECT UNNEST(%s), UNNEST(%s)
+            ON CONFLICT DO NOTHING
+        """, (dependent_ids, prerequisite_ids))
+        stages.invalidate_cache(['depends_on_ids', 'blocking_ids'])
+        # The relation was written in SQL: recompute readiness of the linked stages
+        self.browse(dependent_ids).modified(['depends_on_ids'])
+    
+    @api.model
+    def create_training_stages_for_customers(self, customer_ids):
+        """Create the training stages of many customers with one multi-create"""
+        customers = self.env['digi.customer.record'].browse(customer_ids)
+        vals_list = []
+        for customer in customers:
+            vals_list.extend(self._prepare_training_stages(customer))
         
-        # Create dependencies
-        created_stages = []
-        for stage_data in stages_data:
-            stage = self.create(stage_data)
-            created_stages.append(stage)
+        stages = self.with_context(mail_create_nolog=True, mail_create_nosubscribe=True).create(vals_list)
         
         # Set up dependencies (theory -> practical -> video -> internship)
-        for i in range(1, len(created_stages)):
-            created_stages[i].depends_on_ids = [(4, created_stages[i-1].id)]
-        
-        return created_stages
+        self._link_stage_chains(stages)
+        return stages
+    
+    @api.model
+    def create_training_stages_for_customer(self, customer_id):
+        """Create all training stages for a new customer"""
+        return list(self.create_training_stages_for_customers([customer_id]))
     
     def name_get(self):
         result = []
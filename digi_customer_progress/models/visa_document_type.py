@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+
+
+class VisaDocumentType(models.Model):
+    _name = 'digi.visa.document.type'
+    _description = 'Danh Mục Tài Liệu Visa'
+    _order = 'step, sequence, name'
+
+    name = fields.Char(string='Tên Tài Liệu', required=True)
+    code = fields.Char(string='Mã Tài Liệu', required=True)
+    step = fields.Selection(selection=lambda self: self.env['digi.visa.process']._fields['step'].selection,
+                            string='Bước Visa', required=True, index=True)
+    sequence = fields.Integer(string='Thứ Tự', default=10)
+    document_type = fields.Selection(selection=lambda self: self.env['digi.visa.document']._fields['document_type'].selection,
+                                     string='Loại Tài Liệu', required=True, default='other')
+    is_required = fields.Boolean(string='Bắt Buộc', default=True)
+    active = fields.Boolean(string='Hoạt Động', default=True)
+
+    missing_customer_count = fields.Integer(string='Số Khách Hàng Còn Thiếu', compute='_compute_missing_customer_count')
+
+    _sql_constraints = [
+        ('code_unique', 'UNIQUE(code)', 'Mã tài liệu phải là duy nhất!')
+    ]
+
+    def _compute_missing_customer_count(self):
+        counts = {}
+        if self.ids:
+            self.env['digi.visa.process'].flush(['missing_document_type_ids', 'customer_id'])
+            self.env.cr.execute("""
+                SELECT r.type_id, COUNT(DISTINCT v.customer_id)
+                  FROM visa_missing_document_rel r
+                  JOIN digi_visa_process v ON v.id = r.visa_process_id
+                 WHERE r.type_id IN %s
+              GROUP BY r.type_id
+            """, (tuple(self.ids),))
+            counts = dict(self.env.cr.fetchall())
+        for record in self:
+            record.missing_customer_count = counts.get(record.id, 0)
+
+    @api.model
+    def _document_vals_by_step(self):
+        """{step: [document values]} of the active catalog, read once per provisioning"""
+        result = {}
+        for doc_type in self.search([]):
+            result.setdefault(doc_type.step, []).append({
+                'type_id': doc_type.id,
+                'name': doc_type.name,
+                'sequence': doc_type.sequence,
+                'document_type': doc_type.document_type,
+                'is_required': doc_type.is_required,
+            })
+        return result
+
+    def action_view_missing_customers(self):
+        """Customers with an open requirement on one of these document types"""
+        return {
+            'name': _('Khách Hàng Còn Thiếu Tài Liệu'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'digi.customer.record',
+            'view_mode': 'tree,form',
+            'domain': [('visa_process_ids.missing_document_type_ids', 'in', self.ids)],
+        }
@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import UserError
+from collections import defaultdict
 from datetime import datetime, timedelta
 
+# Steps not completed yet (is_completed is False), covered by a partial index
+OPEN_STATUSES = ['not_started', 'in_progress', 'submitted', 'under_review', 'rejected', 'expired', 'cancelled']
+# Free-text document lists of the steps without checklist rows, kept by init() until ensure_document_rows
+LEGACY_DOCUMENTS_TABLE = 'digi_visa_process_legacy_documents'
 
 class VisaProcess(models.Model):
     _name = 'digi.visa.process'
     _description = 'Quy Trình Xử Lý Visa'
     _order = 'customer_id, step_sequence'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['digi.bulk.tracking.mixin', 'mail.thread', 'mail.activity.mixin', 'digi.attachment.mixin',
+                'digi.timeline.mixin', 'digi.report.cache.mixin', 'digi.dashboard.source.mixin']
+    _dashboard_fields = ['customer_id', 'step', 'application_number', 'expiry_date']
+    _timeline_date_stop = ['actual_completion_date', 'planned_completion_date']
+    _timeline_fields = ['customer_id', 'step', 'status', 'progress_percentage', 'start_date',
+                        'planned_completion_date', 'actual_completion_date']
     
     # Link to customer
     customer_id = fields.Many2one('digi.customer.record', string='Khách Hàng', required=True, ondelete='cascade')
@@ -40,16 +51,19 @@ class VisaProcess(models.Model):
     ], string='Trạng Thái', default='not_started', required=True, tracking=True)
     
     is_completed = fields.Boolean(string='Đã Hoàn Thành', compute='_compute_is_completed', store=True)
+    forecast_recorded = fields.Boolean(string='Đã Ghi Nhận Dự Báo', readonly=True, copy=False)
     progress_percentage = fields.Float(string='Tiến Độ (%)', default=0.0, tracking=True)
     
     # Dates and Timeline
     start_date = fields.Date(string='Ngày Bắt Đầu', tracking=True)
     planned_completion_date = fields.Date(string='Ngày Kế Hoạch Hoàn Thành')
+    planned_by_forecast = fields.Boolean(string='Kế Hoạch Theo Dự Báo', readonly=True, copy=False,
+                                         help='Ngày kế hoạch do dự báo điền, được cập nhật lại theo dự báo')
     actual_completion_date = fields.Date(string='Ngày Thực Tế Hoàn Thành', tracking=True)
     
     submission_date = fields.Date(string='Ngày Nộp Hồ Sơ', tracking=True)
     decision_date = fields.Date(string='Ngày Có Quyết Định', tracking=True)
-    expiry_date = fields.Date(string='Ngày Hết Hạn')
+    expiry_date = fields.Date(string='Ngày Hết Hạn', index=True)
     
     # Duration tracking
     estimated_days = fields.Integer(string='Số Ngày Ước Tính')
@@ -69,9 +83,16 @@ class VisaProcess(models.Model):
     currency_id = fields.Many2one('res.currency', string='Tiền Tệ', default=lambda self: self.env.company.currency_id)
     
     # Requirements and Documents
-    required_documents = fields.Text(string='Tài Liệu Yêu Cầu')
-    submitted_documents = fields.Text(string='Tài Liệu Đã Nộp')
-    missing_documents = fields.Text(string='Tài Liệu Còn Thiếu', compute='_compute_missing_documents')
+    # Derived from the checklist rows; the text fields keep the former free-text layout
+    required_documents = fields.Text(string='Tài Liệu Yêu Cầu', compute='_compute_document_status', store=True)
+    submitted_documents = fields.Text(string='Tài Liệu Đã Nộp', compute='_compute_document_status', store=True)
+    missing_documents = fields.Text(string='Tài Liệu Còn Thiếu', compute='_compute_document_status', store=True)
+    missing_document_count = fields.Integer(string='Số Tài Liệu Còn Thiếu', compute='_compute_document_status',
+                                            store=True, index=True)
+    # Reverse index: every step still missing a given document type
+    missing_document_type_ids = fields.Many2many('digi.visa.document.type', 'visa_missing_document_rel',
+                                                 'visa_process_id', 'type_id', string='Loại Tài Liệu Còn Thiếu',
+                                                 compute='_compute_document_status', store=True)
     
     document_checklist_ids = fields.One2many('digi.visa.document', 'visa_process_id', string='Danh Sách Tài Liệu')
     
@@ -118,9 +139,6 @@ class VisaProcess(models.Model):
     internal_notes = fields.Html(string='Ghi Chú Nội Bộ')
     client_communication = fields.Html(string='Giao Tiếp Với Khách Hàng')
     
-    # Attachments
-    attachment_count = fields.Integer(string='Số Tài Liệu', compute='_compute_attachment_count')
-    
     # Dependencies
     depends_on_ids = fields.Many2many(
         'digi.visa.process', 
@@ -138,7 +156,50 @@ class VisaProcess(models.Model):
         string='Đang Chặn'
     )
     
-    can_start = fields.Boolean(string='Có Thể Bắt Đầu', compute='_compute_can_start')
+    can_start = fields.Boolean(string='Có Thể Bắt Đầu', compute='_compute_can_start', store=True, index=True)
+    
+    # Critical path: a step starts once its last prerequisite is projected to end
+    projected_start_date = fields.Date(string='Ngày Bắt Đầu Dự Kiến', compute='_compute_projected_dates',
+                                       store=True, recursive=True)
+    projected_end_date = fields.Date(string='Ngày Hoàn Thành Dự Kiến', compute='_compute_projected_dates',
+                                     store=True, recursive=True, index=True)
+    
+    def init(self):
+        # Before the new stored columns are computed from the (missing) rows,
+        # which rewrites the text lists of the whole compute group
+        self._stash_legacy_documents()
+        super(VisaProcess, self).init()
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_visa_process_customer_sequence_idx
+                ON "{self._table}" (customer_id, step_sequence)
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS digi_visa_process_open_idx
+                ON "{self._table}" (customer_id, step_sequence)
+             WHERE status IN %s
+        """, (tuple(OPEN_STATUSES),))
+    
+    def _stash_legacy_documents(self):
+        """Copy the document lists of the steps without checklist rows, for ensure_document_rows"""
+        self.env.cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LEGACY_DOCUMENTS_TABLE} (
+                id integer PRIMARY KEY,
+                required_documents text,
+                submitted_documents text
+            )
+        """)
+        without_rows = ''
+        if tools.table_exists(self.env.cr, 'digi_visa_document'):
+            without_rows = 'AND NOT EXISTS (SELECT 1 FROM digi_visa_document d WHERE d.visa_process_id = p.id)'
+        # A copy left by an interrupted upgrade holds the original lists: keep it
+        self.env.cr.execute(f"""
+            INSERT INTO {LEGACY_DOCUMENTS_TABLE} (id, required_documents, submitted_documents)
+            SELECT p.id, p.required_documents, p.submitted_documents
+              FROM "{self._table}" p
+             WHERE (COALESCE(p.required_documents, '') <> '' OR COALESCE(p.submitted_documents, '') <> '')
+                   {without_rows}
+            ON CONFLICT (id) DO NOTHING
+        """)
     
     @api.depends('step')
     def _compute_step_sequence(self):
@@ -174,16 +235,17 @@ class VisaProcess(models.Model):
             else:
                 record.days_remaining = 0
     
-    @api.depends('required_documents', 'submitted_documents')
-    def _compute_missing_documents(self):
+    @api.depends('document_checklist_ids.name', 'document_checklist_ids.type_id',
+                 'document_checklist_ids.is_required', 'document_checklist_ids.is_submitted')
+    def _compute_document_status(self):
         for record in self:
-            if record.required_documents and record.submitted_documents:
-                required = set(line.strip() for line in record.required_documents.split('\n') if line.strip())
-                submitted = set(line.strip() for line in record.submitted_documents.split('\n') if line.strip())
-                missing = required - submitted
-                record.missing_documents = '\n'.join(sorted(missing))
-            else:
-                record.missing_documents = record.required_documents or ''
+            documents = record.document_checklist_ids
+            missing = documents.filtered(lambda d: d.is_required and not d.is_submitted)
+            record.required_documents = '\n'.join(documents.filtered('is_required').mapped('name'))
+            record.submitted_documents = '\n'.join(documents.filtered('is_submitted').mapped('name'))
+            record.missing_documents = '\n'.join(missing.mapped('name'))
+            record.missing_document_count = len(missing)
+            record.missing_document_type_ids = missing.type_id
     
     @api.depends('depends_on_ids.is_completed')
     def _compute_can_start(self):
@@ -194,68 +256,102 @@ class VisaProcess(models.Model):
             else:
                 record.can_start = True
     
-    def _compute_attachment_count(self):
+    @api.depends('start_date', 'actual_completion_date', 'estimated_days', 'is_completed',
+                 'depends_on_ids.projected_end_date')
+    def _compute_projected_dates(self):
+        """Longest path through the prerequisites; open steps cannot end before today"""
+        today = fields.Date.today()
+        for record in self:
+            if record.is_completed:
+                end = record.actual_completion_date or record.start_date or today
+                record.projected_start_date = record.start_date or end
+                record.projected_end_date = end
+                continue
+            prerequisite_ends = [date for date in record.depends_on_ids.mapped('projected_end_date') if date]
+            start = record.start_date or max(prerequisite_ends + [today])
+            record.projected_start_date = start
+            record.projected_end_date = max(start + timedelta(days=record.estimated_days or 0), today)
+    
+    @api.model
+    def _cron_refresh_projections(self):
+        """Move the projections that today has overtaken; their chains follow through the dependencies"""
+        today = fields.Date.today()
+        stale = self.search([
+            ('is_completed', '=', False),
+            '|', ('projected_end_date', '<', today),
+            '&', ('start_date', '=', False), ('projected_start_date', '<', today),
+        ])
+        stale.modified(['estimated_days'])
+        stale.flush()
+    
+    def _sync_customer_step(self, value):
+        """Set the matching visa step flag on the customers, one write per distinct value"""
+        Customer = self.env['digi.customer.record']
+        vals_by_customer = defaultdict(dict)
         for record in self:
-            record.attachment_count = self.env['ir.attachment'].search_count([
-                ('res_model', '=', self._name),
-                ('res_id', '=', record.id)
-            ])
+            if record.step in Customer._fields:
+                vals_by_customer[record.customer_id.id][record.step] = value
+        Customer._write_grouped(vals_by_customer)
     
     def action_start(self):
-        """Start the visa process step"""
-        self.ensure_one()
-        if not self.can_start:
-            raise UserError(_('Không thể bắt đầu vì chưa hoàn thành các bước tiên quyết.'))
+        """Start the visa process steps"""
+        blocked = self.filtered(lambda r: not r.can_start)
+        if blocked:
+            raise UserError(_('Không thể bắt đầu vì chưa hoàn thành các bước tiên quyết: %s')
+                            % ', '.join(blocked.mapped('display_name')))
         
         self.write({
             'status': 'in_progress',
             'start_date': fields.Date.today(),
             'progress_percentage': 10
         })
-        
-        # Update customer record
-        if hasattr(self.customer_id, self.step):
-            setattr(self.customer_id, self.step, True)
+        self._sync_customer_step(True)
     
     def action_submit(self):
-        """Submit the application for this step"""
-        self.ensure_one()
+        """Submit the applications for these steps"""
         self.write({
             'status': 'submitted',
             'submission_date': fields.Date.today(),
             'progress_percentage': 60
         })
     
+    def write(self, vals):
+        if 'planned_completion_date' in vals and 'planned_by_forecast' not in vals:
+            # A date set by hand is kept by the forecast
+            vals = dict(vals, planned_by_forecast=False)
+        result = super(VisaProcess, self).write(vals)
+        if 'status' in vals or 'actual_completion_date' in vals or 'start_date' in vals:
+            self.env['digi.visa.step.forecast'].sudo().record_steps(self)
+        return result
+    
     def action_approve(self):
-        """Approve this step"""
-        self.ensure_one()
+        """Approve these steps"""
         self.write({
             'status': 'approved',
             'decision_date': fields.Date.today(),
             'actual_completion_date': fields.Date.today(),
             'progress_percentage': 100
         })
-        
-        # Update customer record
-        if hasattr(self.customer_id, self.step):
-            setattr(self.customer_id, self.step, True)
+        self._sync_customer_step(True)
+        self._notify_progress('visa_step_approved')
     
     def action_complete(self):
-        """Complete this step"""
-        self.ensure_one()
+        """Complete these steps"""
         self.write({
             'status': 'completed',
             'actual_completion_date': fields.Date.today(),
             'progress_percentage': 100
         })
-        
-        # Update customer record
-        if hasattr(self.customer_id, self.step):
-            setattr(self.customer_id, self.step, True)
+        self._sync_customer_step(True)
+        self._notify_progress('visa_step_completed')
+    
+    def _notify_progress(self, event_type):
+        steps = dict(self._fields['step']._description_selection(self.env))
+        self.env['digi.notification.event'].sudo().record(
+            event_type, self, {record.id: steps.get(record.step) for record in self})
     
     def action_reject(self):
-        """Reject this step"""
-        self.ensure_one()
+        """Reject these steps"""
         self.write({
             'status': 'rejected',
             'decision_date': fields.Date.today(),
@@ -263,8 +359,7 @@ class VisaProcess(models.Model):
         })
     
     def action_reset(self):
-        """Reset this step"""
-        self.ensure_one()
+        """Reset these steps"""
         self.write({
             'status': 'not_started',
             'start_date': False,
@@ -273,10 +368,7 @@ class VisaProcess(models.Model):
             'actual_completion_date': False,
             'progress_percentage': 0
         })
-        
-        # Update customer record
-        if hasattr(self.customer_id, self.step):
-            setattr(self.customer_id, self.step, False)
+        self._sync_customer_step(False)
     
     def action_view_attachments(self):
         self.ensure_one()
@@ -293,65 +385,157 @@ class VisaProcess(models.Model):
         }
     
     @api.model
-    def create_visa_steps_for_customer(self, customer_id):
-        """Create all visa process steps for a new customer"""
-        customer = self.env['digi.customer.record'].browse(customer_id)
-        
-        steps_data = [
+    def _prepare_visa_steps(self, customer_id):
+        """Values of the seven visa steps of one customer, in chain order"""
+        return [
             {
                 'customer_id': customer_id,
                 'step': 'checklist',
-                'estimated_days': 7,
-                'required_documents': 'Passport\nEducation Certificates\nWork Experience\nEnglish Test Results'
+                'estimated_days': 7
             },
             {
                 'customer_id': customer_id,
                 'step': 'job_offer',
-                'estimated_days': 30,
-                'required_documents': 'Job Offer Letter\nEmployer Details\nSalary Package\nJob Description'
+                'estimated_days': 30
             },
             {
                 'customer_id': customer_id,
                 'step': 'lmia',
-                'estimated_days': 90,
-                'required_documents': 'LMIA Application\nJob Advertisement Proof\nLabour Market Information'
+                'estimated_days': 90
             },
             {
                 'customer_id': customer_id,
                 'step': 'sa',
-                'estimated_days': 60,
-                'required_documents': 'Skills Assessment Application\nQualifications\nWork Experience Evidence'
+                'estimated_days': 60
             },
             {
                 'customer_id': customer_id,
                 'step': 'sbs',
-                'estimated_days': 45,
-                'required_documents': 'State Nomination Application\nCommitment Statement\nSettlement Funds'
+                'estimated_days': 45
             },
             {
                 'customer_id': customer_id,
                 'step': 'nomination',
-                'estimated_days': 30,
-                'required_documents': 'Nomination Application\nSupporting Documents\nState Requirements'
+                'estimated_days': 30
             },
             {
                 'customer_id': customer_id,
                 'step': 'visa',
-                'estimated_days': 120,
-                'required_documents': 'Visa Application\nHealth Checks\nCharacter Checks\nAll Supporting Documents'
+                'estimated_days': 120
             }
         ]
+    
+    @api.model
+    def _link_step_chains(self, steps):
+        """Make each step depend on the previous step of the same customer, in one INSERT"""
+        field = self._fields['depends_on_ids']
+        previous = {}
+        dependent_ids, prerequisite_ids = [], []
+        for step in steps:
+            prerequisite_id = previous.get(step.customer_id.id)
+            if prerequisite_id:
+                dependent_ids.append(step.id)
+                prerequisite_ids.append(prerequisite_id)
+            previous[step.customer_id.id] = step.id
+        if not dependent_ids:
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO "{field.relation}" ("{field.column1}", "{field.column2}")
+            SELECT UNNEST(%s), UNNEST(%s)
+            ON CONFLICT DO NOTHING
+        """, (dependent_ids, prerequisite_ids))
+        steps.invalidate_cache(['depends_on_ids', 'blocking_ids'])
+        # The relation was written in SQL: recompute readiness and projections of the linked steps
+        self.browse(dependent_ids).modified(['depends_on_ids'])
+    
+    @api.model
+    def create_visa_steps_for_customers(self, customer_ids):
+        """Create the visa steps of many customers with one multi-create"""
+        vals_list = []
+        for customer_id in customer_ids:
+            vals_list.extend(self._prepare_visa_steps(customer_id))
+        self._apply_forecast_estimates(vals_list)
+        documents = self.env['digi.visa.document.type'].sudo()._document_vals_by_step()
+        for vals in vals_list:
+            vals['document_checklist_ids'] = [(0, 0, doc_vals) for doc_vals in documents.get(vals['step'], [])]
         
-        created_steps = []
-        for step_data in steps_data:
-            step = self.create(step_data)
-            created_steps.append(step)
+        steps = self.with_context(mail_create_nolog=True, mail_create_nosubscribe=True).create(vals_list)
         
         # Set up dependencies (each step depends on the previous one)
-        for i in range(1, len(created_steps)):
-            created_steps[i].depends_on_ids = [(4, created_steps[i-1].id)]
+        self._link_step_chains(steps)
+        self._plan_from_projection(steps.ids)
+        return steps
+    
+    @api.model
+    def _apply_forecast_estimates(self, vals_list):
+        """Replace the default estimated_days by the historical forecast where there is one"""
+        customers = self.env['digi.customer.record'].browse({vals['customer_id'] for vals in vals_list})
+        visa_types = {customer.id: customer.visa_type_id.id for customer in customers}
+        keys = {(visa_types[vals['customer_id']], vals['step'], None) for vals in vals_list}
+        forecasts = self.env['digi.visa.step.forecast'].sudo().forecast_days(keys)
+        for vals in vals_list:
+            days = forecasts.get((visa_types[vals['customer_id']], vals['step'], None))
+            if days is not None:
+                vals['estimated_days'] = days
+    
+    @api.model
+    def _plan_from_projection(self, step_ids=None):
+        """Set the planned completion date of open steps to their projected end
+
+        Only the steps without a planned date, or whose date came from the
+        forecast, are planned; dates set by hand are kept. The dates go
+        through ``write``, one per distinct date, so tracking, write_date
+        and the report cache follow.
+        """
+        if step_ids is not None and not step_ids:
+            return
+        self.flush(['planned_completion_date', 'planned_by_forecast', 'projected_end_date', 'is_completed'])
+        query = """
+            SELECT projected_end_date, ARRAY_AGG(id)
+              FROM digi_visa_process
+             WHERE NOT is_completed AND (planned_completion_date IS NULL OR planned_by_forecast)
+               AND projected_end_date IS NOT NULL
+               AND planned_completion_date IS DISTINCT FROM projected_end_date
+        """
+        if step_ids is None:
+            self.env.cr.execute(query + ' GROUP BY projected_end_date')
+        else:
+            self.env.cr.execute(query + ' AND id IN %s GROUP BY projected_end_date', (tuple(step_ids),))
+        for planned_date, ids in self.env.cr.fetchall():
+            self.browse(ids).write({'planned_completion_date': planned_date, 'planned_by_forecast': True})
+    
+    @api.model
+    def ensure_document_rows(self):
+        """Give the steps created before the catalog their checklist rows.
         
-        return created_steps
+        Names of the former free-text lists, as copied by init() before the
+        upgrade recomputed them, become rows (catalog entries where the name
+        matches) and are marked submitted when they were listed as
+        submitted. Steps that already have rows are left alone.
+        """
+        texts = {}
+        if tools.table_exists(self.env.cr, LEGACY_DOCUMENTS_TABLE):
+            self.env.cr.execute(f'SELECT id, required_documents, submitted_documents FROM {LEGACY_DOCUMENTS_TABLE}')
+            texts = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        steps = self.search([('document_checklist_ids', '=', False)])
+        catalog = self.env['digi.visa.document.type'].sudo()._document_vals_by_step()
+        vals_list = []
+        for step in steps:
+            required_text, submitted_text = texts.get(step.id, (None, None))
+            by_name = {vals['name']: vals for vals in catalog.get(step.step, [])}
+            names = [line.strip() for line in (required_text or '').split('\n') if line.strip()] or list(by_name)
+            submitted = {line.strip() for line in (submitted_text or '').split('\n') if line.strip()}
+            for position, name in enumerate(dict.fromkeys(names), start=1):
+                vals = dict(by_name.get(name) or {'name': name, 'sequence': position * 10, 'document_type': 'other'})
+                vals.update(visa_process_id=step.id, is_submitted=name in submitted)
+                vals_list.append(vals)
+        self.env['digi.visa.document'].create(vals_list)
+        self.env.cr.execute(f'DROP TABLE IF EXISTS {LEGACY_DOCUMENTS_TABLE}')
+    
+    @api.model
+    def create_visa_steps_for_customer(self, customer_id):
+        """Create all visa process steps for a new customer"""
+        return list(self.create_visa_steps_for_customers([customer_id]))
     
     def name_get(self):
         result = []
@@ -366,8 +550,12 @@ class VisaDocument(models.Model):
     _name = 'digi.visa.document'
     _description = 'Tài Liệu Visa'
     _order = 'visa_process_id, sequence, name'
+    _inherit = ['digi.dashboard.source.mixin']
+    _dashboard_fields = ['visa_process_id', 'name', 'expiry_date']
     
-    visa_process_id = fields.Many2one('digi.visa.process', string='Quy Trình Visa', required=True, ondelete='cascade')
+    visa_process_id = fields.Many2one('digi.visa.process', string='Quy Trình Visa', required=True,
+                                      index=True, ondelete='cascade')
+    type_id = fields.Many2one('digi.visa.document.type', string='Danh Mục', index=True, ondelete='restrict')
     
     name = fields.Char(string='Tên Tài Liệu', required=True)
     description = fields.Text(string='Mô Tả')
@@ -393,7 +581,7 @@ class VisaDocument(models.Model):
     document_number = fields.Char(string='Số Tài Liệu')
     issued_by = fields.Char(string='Cấp Bởi')
     issue_date = fields.Date(string='Ngày Cấp')
-    expiry_date = fields.Date(string='Ngày Hết Hạn')
+    expiry_date = fields.Date(string='Ngày Hết Hạn', index=True)
     
     is_valid = fields.Boolean(string='Còn Hiệu Lực', compute='_compute_is_valid', store=True)
     
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import math
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Upper edges (days) of the duration histogram buckets; the last bucket is open-ended
+BUCKET_EDGES = [1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 150, 180, 270, 365, 540, 730]
+QUANTILES = {'p50_days': 0.5, 'p80_days': 0.8, 'p90_days': 0.9}
+DEFAULT_MIN_SAMPLES = 5
+
+
+def _bucket_index(days):
+    for index, edge in enumerate(BUCKET_EDGES):
+        if days < edge:
+            return index
+    return len(BUCKET_EDGES)
+
+
+def _histogram_quantile(histogram, quantile):
+    """Quantile of a bucketed histogram, interpolated linearly inside the bucket"""
+    total = sum(histogram)
+    if not total:
+        return 0.0
+    target = quantile * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            low = BUCKET_EDGES[index - 1] if index else 0
+            high = BUCKET_EDGES[index] if index < len(BUCKET_EDGES) else BUCKET_EDGES[-1] * 1.5
+            return low + (high - low) * (target - cumulative) / count
+        cumulative += count
+    return float(BUCKET_EDGES[-1])
+
+
+class VisaStepForecast(models.Model):
+    _name = 'digi.visa.step.forecast'
+    _description = 'Dự Báo Thời Gian Bước Visa'
+    _order = 'step, visa_type_id, case_officer_id'
+    _log_access = False
+
+    # Empty visa type / case officer rows aggregate every value: they are the fallback levels
+    visa_type_id = fields.Many2one('digi.visa.type', string='Loại Visa', readonly=True, ondelete='cascade')
+    step = fields.Selection(selection=lambda self: self.env['digi.visa.process']._fields['step'].selection,
+                            string='Bước', required=True, readonly=True)
+    case_officer_id = fields.Many2one('hr.employee', string='Nhân Viên Phụ Trách', readonly=True,
+                                      ondelete='cascade')
+
+    sample_count = fields.Integer(string='Số Mẫu', readonly=True)
+    total_days = fields.Float(string='Tổng Số Ngày', readonly=True)
+    mean_days = fields.Float(string='Trung Bình (Ngày)', compute='_compute_mean_days')
+    histogram = fields.Text(string='Phân Phối', readonly=True, default='[]')
+    p50_days = fields.Float(string='P50 (Ngày)', readonly=True)
+    p80_days = fields.Float(string='P80 (Ngày)', readonly=True)
+    p90_days = fields.Float(string='P90 (Ngày)', readonly=True)
+    updated_at = fields.Datetime(string='Cập Nhật Lúc', readonly=True)
+
+    def init(self):
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS digi_visa_step_forecast_key_uniq
+                ON "{self._table}" (step, COALESCE(visa_type_id, 0), COALESCE(case_officer_id, 0))
+        """)
+
+    @api.depends('sample_count', 'total_days')
+    def _compute_mean_days(self):
+        for record in self:
+            record.mean_days = record.total_days / record.sample_count if record.sample_count else 0.0
+
+    @api.model
+    def _keys_of(self, visa_type_id, step, case_officer_id):
+        """Every level a completed step counts towards, most specific first"""
+        levels = [(visa_type_id, step, case_officer_id), (visa_type_id, step, None), (None, step, None)]
+        return list(dict.fromkeys(levels))
+
+    @api.model
+    def _add_samples(self, samples):
+        """Fold {key: [days]} into the stored histograms; only the touched rows are read and locked
+
+        Rows are locked in the order of the unique index, so concurrent
+        transactions sharing the fallback rows cannot deadlock.
+        """
+        if not samples:
+            return
+        cr = self.env.cr
+        self.flush()
+        ordered = sorted(samples.items(), key=lambda item: (item[0][1], item[0][0] or 0, item[0][2] or 0))
+        for (visa_type_id, step, case_officer_id), durations in ordered:
+            cr.execute(f"""
+                INSERT INTO "{self._table}" (visa_type_id, step, case_officer_id, sample_count, total_days, histogram)
+                VALUES (%s, %s, %s, 0, 0, '[]')
+                ON CONFLICT (step, COALESCE(visa_type_id, 0), COALESCE(case_officer_id, 0)) DO NOTHING
+            """, (visa_type_id, step, case_officer_id))
+            cr.execute(f"""
+                SELECT id, sample_count, total_days, histogram FROM "{self._table}"
+                 WHERE step = %s AND COALESCE(visa_type_id, 0) = %s AND COALESCE(case_officer_id, 0) = %s
+                   FOR UPDATE
+            """, (step, visa_type_id or 0, case_officer_id or 0))
+            row_id, count, total, histogram = cr.fetchone()
+            histogram = json.loads(histogram or '[]') or [0] * (len(BUCKET_EDGES) + 1)
+            for days in durations:
+                histogram[_bucket_index(days)] += 1
+            values = {name: _histogram_quantile(histogram, quantile) for name, quantile in QUANTILES.items()}
+            cr.execute(f"""
+                UPDATE "{self._table}"
+                   SET sample_count = %s, total_days = %s, histogram = %s,
+                       p50_days = %s, p80_days = %s, p90_days = %s, updated_at = NOW() AT TIME ZONE 'UTC'
+                 WHERE id = %s
+            """, (count + len(durations), total + sum(durations), json.dumps(histogram),
+                  values['p50_days'], values['p80_days'], values['p90_days'], row_id))
+        self.invalidate_cache()
+
+    @api.model
+    def record_steps(self, steps):
+        """Count newly completed steps once, at every fallback level"""
+        steps = steps.filtered(lambda s: s.is_completed and not s.forecast_recorded
+                               and s.start_date and s.actual_completion_date)
+        if not steps:
+            return
+        samples = defaultdict(list)
+        for step in steps:
+            for key in self._keys_of(step.customer_id.visa_type_id.id, step.step, step.case_officer_id.id or None):
+                samples[key].append(step.actual_days)
+        self._add_samples(samples)
+        steps.write({'forecast_recorded': True})
+
+    @api.model
+    def rebuild(self):
+        """Start over from every completed step; used once to seed the statistics"""
+        Step = self.env['digi.visa.process']
+        Step.flush()
+        self.env.cr.execute(f'DELETE FROM "{self._table}"')
+        self.env.cr.execute('UPDATE digi_visa_process SET forecast_recorded = FALSE')
+        Step.invalidate_cache(['forecast_recorded'])
+        steps = Step.search([('is_completed', '=', True), ('start_date', '!=', False),
+                             ('actual_completion_date', '!=', False)])
+        self.record_steps(steps)
+        _logger.info('Visa step forecasts rebuilt from %d completed steps', len(steps))
+
+    @api.model
+    def _get_min_samples(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('digi_customer_progress.forecast_min_samples')
+        return int(value or DEFAULT_MIN_SAMPLES)
+
+    @api.model
+    def forecast_days(self, keys):
+        """{(visa_type_id, step, case_officer_id): median days} from the most specific level with enough samples"""
+        steps = list({key[1] for key in keys})
+        rows = self.search_read([('step', 'in', steps), ('sample_count', '>=', self._get_min_samples())],
+                                ['visa_type_id', 'step', 'case_officer_id', 'p50_days'])
+        by_key = {
+            (row['visa_type_id'] and row['visa_type_id'][0] or None, row['step'],
+             row['case_officer_id'] and row['case_officer_id'][0] or None): row['p50_days']
+            for row in rows
+        }
+        result = {}
+        for key in keys:
+            for level in self._keys_of(*key):
+                if level in by_key:
+                    result[key] = int(math.ceil(by_key[level]))
+                    break
+        return result
+
+    @api.model
+    def apply_to_open_steps(self):
+        """Forecast estimated_days of the steps not started yet, then their planned completion date"""
+        Step = self.env['digi.visa.process']
+        steps = Step.search([('is_completed', '=', False), ('start_date', '=', False)])
+        keys = {
+            step.id: (step.customer_id.visa_type_id.id, step.step, step.case_officer_id.id or None)
+            for step in steps
+        }
+        forecasts = self.forecast_days(set(keys.values()))
+        ids_by_days = defaultdict(list)
+        for step in steps:
+            days = forecasts.get(keys[step.id])
+            if days is not None and days != step.estimated_days:
+                ids_by_days[days].append(step.id)
+        for days, step_ids in ids_by_days.items():
+            Step.browse(step_ids).write({'estimated_days': days})
+        Step._plan_from_projection()
+
+    @api.model
+    def _cron_apply_forecasts(self):
+        self.apply_to_open_steps()
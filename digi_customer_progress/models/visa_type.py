@@ -35,23 +35,48 @@ class VisaType(models.Model):
     color = fields.Integer(string='Màu Sắc', default=0)
     
     # Statistics
-    customer_count = fields.Integer(string='Số Khách Hàng', compute='_compute_customer_count')
-    success_rate = fields.Float(string='Tỷ Lệ Thành Công (%)', compute='_compute_success_rate')
+    customer_count = fields.Integer(string='Số Khách Hàng', compute='_compute_statistics')
+    success_rate = fields.Float(string='Tỷ Lệ Thành Công (%)', compute='_compute_statistics')
+    refusal_rate = fields.Float(string='Tỷ Lệ Từ Chối (%)', compute='_compute_statistics')
+    processing_rate = fields.Float(string='Tỷ Lệ Đang Xử Lý (%)', compute='_compute_statistics')
     
-    @api.depends('customer_ids')
-    def _compute_customer_count(self):
-        for record in self:
-            record.customer_count = len(record.customer_ids)
+    stat_ids = fields.One2many('digi.visa.type.stat', 'visa_type_id', string='Thống Kê Theo Quý')
+    
+    @api.model
+    def _get_statistics(self, visa_type_ids):
+        """Customer counts by visa result for many visa types, in one grouped query
+        
+        Returns {visa_type_id: {'total', 'granted', 'refused', 'processing'}}.
+        """
+        stats = {
+            visa_type_id: {'total': 0, 'granted': 0, 'refused': 0, 'processing': 0}
+            for visa_type_id in visa_type_ids
+        }
+        if not stats:
+            return stats
+        groups = self.env['digi.customer.record'].read_group(
+            [('visa_type_id', 'in', list(stats))],
+            ['visa_type_id', 'visa_result'],
+            ['visa_type_id', 'visa_result'],
+            lazy=False
+        )
+        for group in groups:
+            counts = stats[group['visa_type_id'][0]]
+            counts['total'] += group['__count']
+            if group['visa_result'] in counts:
+                counts[group['visa_result']] += group['__count']
+        return stats
     
     @api.depends('customer_ids.visa_result')
-    def _compute_success_rate(self):
+    def _compute_statistics(self):
+        stats = self._get_statistics([vt_id for vt_id in self.ids if isinstance(vt_id, int)])
         for record in self:
-            customers = record.customer_ids
-            if customers:
-                granted = customers.filtered(lambda c: c.visa_result == 'granted')
-                record.success_rate = (len(granted) / len(customers)) * 100
-            else:
-                record.success_rate = 0.0
+            counts = stats.get(record.id, {'total': 0})
+            total = counts['total']
+            record.customer_count = total
+            record.success_rate = (counts['granted'] / total) * 100 if total else 0.0
+            record.refusal_rate = (counts['refused'] / total) * 100 if total else 0.0
+            record.processing_rate = (counts['processing'] / total) * 100 if total else 0.0
     
     customer_ids = fields.One2many('digi.customer.record', 'visa_type_id', string='Khách Hàng')
     
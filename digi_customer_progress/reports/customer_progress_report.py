@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from odoo import models, api
+
+# Customer columns printed on the progress report
+CUSTOMER_FIELDS = ['customer_code', 'name', 'visa_type_id', 'advisor_id', 'contract_date', 'visa_status',
+                   'training_progress_percentage', 'english_progress_percentage', 'visa_progress_percentage',
+                   'overall_progress_percentage', 'projected_visa_completion_date']
+
+# Child rows shown on the progress report, read once per batch of customers
+REPORT_CHILDREN = {
+    'training': ('digi.training.progress', 'stage_sequence',
+                 ['customer_id', 'stage', 'status', 'progress_percentage', 'start_date', 'planned_end_date',
+                  'actual_end_date', 'score']),
+    'english': ('digi.english.training', 'level_sequence',
+                ['customer_id', 'course_level', 'status', 'progress_percentage', 'start_date', 'actual_end_date',
+                 'average_score']),
+    'test_scores': ('digi.english.test.score', 'test_date desc',
+                    ['customer_id', 'test_type', 'test_date', 'overall_score', 'target_score', 'valid_until',
+                     'is_valid']),
+    'visa': ('digi.visa.process', 'step_sequence',
+             ['customer_id', 'step', 'status', 'start_date', 'planned_completion_date', 'actual_completion_date',
+              'missing_documents']),
+}
+
+
+class CustomerProgressReport(models.AbstractModel):
+    _name = 'report.digi_customer_progress.customer_progress_template'
+    _description = 'Báo Cáo Tiến Độ Khách Hàng'
+
+    @api.model
+    def _prefetch_children(self, customer_ids):
+        """{customer_id: {section: [rows]}} with one query per child model, selections as labels"""
+        children = defaultdict(lambda: {section: [] for section in REPORT_CHILDREN})
+        for section, (model, order, field_names) in REPORT_CHILDREN.items():
+            Model = self.env[model]
+            labels = {
+                name: dict(Model._fields[name]._description_selection(self.env))
+                for name in field_names if Model._fields[name].type == 'selection'
+            }
+            for row in Model.search_read([('customer_id', 'in', customer_ids)], field_names,
+                                         order='customer_id, %s' % order):
+                for name, selection in labels.items():
+                    row[name] = selection.get(row[name], '')
+                children[row['customer_id'][0]][section].append(row)
+        return children
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        docs = self.env['digi.customer.record'].browse(docids)
+        # Read the customer columns of the whole batch at once as well
+        docs.read(CUSTOMER_FIELDS)
+        return {
+            'doc_ids': docids,
+            'doc_model': 'digi.customer.record',
+            'docs': docs,
+            'children': self._prefetch_children(docs.ids),
+        }
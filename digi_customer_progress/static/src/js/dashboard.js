@@ -0,0 +1,162 @@
+odoo.define('digi_customer_progress.dashboard', function (require) {
+'use strict';
+
+var AbstractAction = require('web.AbstractAction');
+var core = require('web.core');
+
+var _t = core._t;
+
+var DATA_URL = '/digi_customer_progress/dashboard/data';
+var REFRESH_INTERVAL = 60000;
+
+/**
+ * Progress dashboard: every widget is filled from one request to the
+ * dashboard data endpoint. The browser revalidates it with the ETag, so a
+ * refresh of an unchanged dashboard costs a 304 and no rendering.
+ */
+var ProgressDashboard = AbstractAction.extend({
+    events: {
+        'click .o_digi_dashboard_refresh': '_onRefresh',
+    },
+
+    init: function () {
+        this._super.apply(this, arguments);
+        this.etag = null;
+    },
+
+    willStart: function () {
+        var self = this;
+        return Promise.all([this._super.apply(this, arguments), this._fetch()]).then(function (results) {
+            self.data = results[1];
+        });
+    },
+
+    start: function () {
+        var self = this;
+        return this._super.apply(this, arguments).then(function () {
+            self._render();
+            self.timer = setInterval(self._refresh.bind(self), REFRESH_INTERVAL);
+        });
+    },
+
+    destroy: function () {
+        clearInterval(this.timer);
+        this._super.apply(this, arguments);
+    },
+
+    //--------------------------------------------------------------------------
+    // Private
+    //--------------------------------------------------------------------------
+
+    /**
+     * @returns {Promise<Object|null>} the payload, or null when it did not change
+     */
+    _fetch: function () {
+        var self = this;
+        return fetch(DATA_URL, {credentials: 'same-origin', cache: 'no-cache'}).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            var etag = response.headers.get('ETag');
+            if (etag && etag === self.etag) {
+                return null;
+            }
+            self.etag = etag;
+            return response.json();
+        });
+    },
+
+    _refresh: function () {
+        var self = this;
+        return this._fetch().then(function (data) {
+            if (data) {
+                self.data = data;
+                self._render();
+            }
+        });
+    },
+
+    _render: function () {
+        var data = this.data;
+        var kpi = data.kpi || {};
+        var $root = $('<div class="o_digi_dashboard"/>');
+        $root.append($('<div class="o_digi_dashboard_header"/>').append(
+            $('<h2/>').text(_t('Dashboard Tiến Độ Khách Hàng')),
+            $('<button class="btn btn-secondary o_digi_dashboard_refresh"/>').text(_t('Làm Mới'))
+        ));
+
+        var $cards = $('<div class="o_digi_dashboard_cards"/>');
+        [
+            [_t('Khách Hàng'), kpi.customer_count || 0],
+            [_t('Tiến Độ Đào Tạo TB'), this._percent(kpi.avg_training_progress_percentage)],
+            [_t('Tiến Độ Tiếng Anh TB'), this._percent(kpi.avg_english_progress_percentage)],
+            [_t('Tiến Độ Visa TB'), this._percent(kpi.avg_visa_progress_percentage)],
+            [_t('Tiến Độ Tổng Thể TB'), this._percent(kpi.avg_overall_progress_percentage)],
+            [_t('Visa Đã Cấp'), kpi.count_visa_granted || 0],
+        ].forEach(function (card) {
+            $cards.append($('<div class="o_digi_dashboard_card"/>').append(
+                $('<span class="o_digi_dashboard_value"/>').text(card[1]),
+                $('<span class="o_digi_dashboard_label"/>').text(card[0])
+            ));
+        });
+        $root.append($cards);
+
+        var $widgets = $('<div class="o_digi_dashboard_widgets"/>');
+        $widgets.append(this._table(_t('Tiến Độ Tổng Thể'), [_t('Khoảng'), _t('Khách Hàng')],
+            (data.facets.overall_progress || []).map(function (bucket) {
+                return [bucket.from + '% - ' + bucket.to + '%', bucket.count];
+            })));
+        $widgets.append(this._table(_t('Giấy Tờ Sắp Hết Hạn'),
+            [_t('Cố Vấn Viên'), _t('30 Ngày'), _t('60 Ngày'), _t('90 Ngày')],
+            data.expiries.map(function (row) {
+                return [row.advisor_name || _t('Chưa Phân Công'), row.within_30, row.within_60, row.within_90];
+            })));
+        $widgets.append(this._table(_t('Tỷ Lệ Thành Công Visa'),
+            [_t('Loại Visa'), _t('Quý'), _t('Nộp'), _t('Thành Công (%)')],
+            data.visa_trend.map(function (row) {
+                return [row.visa_type_id && row.visa_type_id[1], row.quarter, row.submitted_count,
+                        row.success_rate.toFixed(1)];
+            })));
+        $widgets.append(this._table(_t('Tiến Độ Theo Đợt Ký Hợp Đồng'),
+            [_t('Đợt'), _t('Ngày'), _t('Khách Hàng'), _t('Tổng Thể TB (%)')],
+            _.map(data.cohorts, function (points, cohort) {
+                var last = points[points.length - 1];
+                return [cohort, last.day, last.customers, last.average.toFixed(1)];
+            })));
+        $root.append($widgets);
+        this.$el.empty().append($root);
+    },
+
+    _percent: function (value) {
+        return (value || 0).toFixed(1) + '%';
+    },
+
+    _table: function (title, headers, rows) {
+        var $table = $('<table class="table table-sm"/>');
+        $table.append($('<thead/>').append($('<tr/>').append(headers.map(function (header) {
+            return $('<th/>').text(header);
+        }))));
+        var $body = $('<tbody/>');
+        rows.forEach(function (row) {
+            $body.append($('<tr/>').append(row.map(function (cell) {
+                return $('<td/>').text(cell === undefined || cell === false ? '' : cell);
+            })));
+        });
+        return $('<div class="o_digi_dashboard_widget"/>').append($('<h4/>').text(title), $table.append($body));
+    },
+
+    //--------------------------------------------------------------------------
+    // Handlers
+    //--------------------------------------------------------------------------
+
+    _onRefresh: function (ev) {
+        ev.preventDefault();
+        this._refresh();
+    },
+});
+
+core.action_registry.add('digi_progress_dashboard', ProgressDashboard);
+
+return ProgressDashboard;
+
+});
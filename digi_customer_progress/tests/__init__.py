@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_query_plans
+from . import test_visa_step_forecast
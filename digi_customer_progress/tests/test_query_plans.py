@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestQueryPlans(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestQueryPlans, cls).setUpClass()
+        cls.env['digi.dataset.generator'].generate(count=200, seed=42, chunk_size=100, commit=False)
+        cls.env.cr.execute('ANALYZE')
+
+    def test_hot_domains_use_indexes(self):
+        failures = self.env['digi.query.plan.check'].check_query_plans(raise_on_failure=False)
+        self.assertEqual(failures, [], 'Hot domains need a sequential scan: %s' % failures)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests.common import BaseCase
+
+from ..models.visa_step_forecast import BUCKET_EDGES, _bucket_index, _histogram_quantile
+
+
+class TestForecastHistogram(BaseCase):
+
+    def _histogram(self, **counts):
+        histogram = [0] * (len(BUCKET_EDGES) + 1)
+        for index, count in counts.items():
+            histogram[int(index[1:])] = count
+        return histogram
+
+    def test_bucket_index(self):
+        self.assertEqual(_bucket_index(0), 0)
+        self.assertEqual(_bucket_index(0.5), 0)
+        # Upper edges are exclusive
+        self.assertEqual(_bucket_index(1), 1)
+        self.assertEqual(_bucket_index(729), len(BUCKET_EDGES) - 1)
+        # The last bucket is open-ended
+        self.assertEqual(_bucket_index(730), len(BUCKET_EDGES))
+        self.assertEqual(_bucket_index(10000), len(BUCKET_EDGES))
+
+    def test_quantile_of_empty_histogram(self):
+        self.assertEqual(_histogram_quantile([], 0.5), 0.0)
+        self.assertEqual(_histogram_quantile(self._histogram(), 0.9), 0.0)
+
+    def test_quantile_interpolates_inside_bucket(self):
+        # Four samples in [1, 2): the median is halfway through the bucket
+        self.assertAlmostEqual(_histogram_quantile(self._histogram(b1=4), 0.5), 1.5)
+        self.assertAlmostEqual(_histogram_quantile(self._histogram(b0=2), 0.5), 0.5)
+        # Half of the samples in [1, 2) and half in [7, 10): p80 is 60% through the second bucket
+        self.assertAlmostEqual(_histogram_quantile(self._histogram(b1=5, b5=5), 0.8), 8.8)
+        # The median ends the first bucket; the empty buckets after it do not count
+        self.assertAlmostEqual(_histogram_quantile(self._histogram(b1=5, b5=5), 0.5), 2.0)
+
+    def test_quantile_of_last_open_bucket(self):
+        # The open bucket is taken as [730, 1095)
+        histogram = self._histogram(**{'b%d' % len(BUCKET_EDGES): 2})
+        self.assertAlmostEqual(_histogram_quantile(histogram, 0.5), 912.5)
+        self.assertAlmostEqual(_histogram_quantile(histogram, 1.0), 1095.0)
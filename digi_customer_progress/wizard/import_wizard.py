@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, _
+
+
+class CustomerImportWizard(models.TransientModel):
+    _name = 'digi.customer.import.wizard'
+    _description = 'Nhập Khách Hàng Từ Tệp'
+
+    file_data = fields.Binary(string='Tệp CSV/XLSX', required=True)
+    file_name = fields.Char(string='Tên Tệp')
+    chunk_size = fields.Integer(string='Số Dòng Mỗi Lô', default=500)
+    run_now = fields.Boolean(string='Chạy Ngay', help='Bỏ chọn để tác vụ chạy nền qua cron')
+
+    def action_import(self):
+        self.ensure_one()
+        job = self.env['digi.customer.import.job'].create({
+            'name': self.file_name or _('Nhập khách hàng'),
+            'file_data': self.file_data,
+            'file_name': self.file_name,
+            'chunk_size': self.chunk_size,
+            'state': 'queued',
+        })
+        if self.run_now:
+            job.action_run()
+        return {
+            'name': _('Tác Vụ Nhập Khách Hàng'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'digi.customer.import.job',
+            'view_mode': 'form',
+            'res_id': job.id,
+        }